@@ -0,0 +1,37 @@
+"""
+Times the prefix lookups behind inline-query autocomplete on a large timetable.
+
+Usage:
+    python -m benchmarks.bench_autocomplete [--trains N]
+"""
+import argparse
+import time
+from datetime import date
+
+from benchmarks.synthetic import generate_rows
+from timetable import Timetable
+
+QUERIES = ["1", "19", "192", "1921", "w", "war", "warszawa z", "grodz", "lotnisko", "zyr"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trains', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    timetable = Timetable(generate_rows(args.trains))
+    today = date.today()
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            if query.isdigit():
+                results = timetable.complete_train_numbers(query, today)
+            else:
+                results = timetable.stations.complete(query)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{query!r:>14}: {elapsed * 1e6:8.1f} us ({len(results)} results)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares loading the timetable CSV into SQLite through DatabaseManager's string INSERTs
+(convert_to_inserts_with_date_splitting + insert_data, one execute per statement) with the
+parameterized bulk load (load_csv, executemany in chunked transactions).
+
+Usage:
+    python -m benchmarks.bench_db_load [csv_path] [--trains N] [--chunk-size N]
+
+Without csv_path a synthetic timetable with --trains rows is generated in a temp directory.
+
+At 100k trains (191,649 rows), three runs took 6.3-8.2 s with the string INSERTs and 4.3-5.6 s
+with the bulk load (1.3-1.6x). Both paths write into the indexed, keyed schema. The bulk load
+splits into about 1.6 s reading and expanding the CSV, 0.5 s hashing the content keys and
+2.3 s for executemany. What it saves over the string path is mainly compiling one statement per row.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_timetable_csv
+from db_actions import BULK_CHUNK_SIZE, DatabaseManager
+
+
+def load_with_inserts(csv_path: str, db_path: str) -> int:
+    """The string path: build every INSERT statement, then execute them one by one."""
+    db_manager = DatabaseManager(db_path)
+    inserts = db_manager.convert_to_inserts_with_date_splitting(csv_path)
+    db_manager.insert_data(inserts)
+    db_manager.close()
+    return len(inserts)
+
+
+def load_with_bulk_insert(csv_path: str, db_path: str, chunk_size: int) -> int:
+    """The bulk path: stream parameter tuples into executemany."""
+    db_manager = DatabaseManager(db_path)
+    row_count = db_manager.load_csv(csv_path, chunk_size)
+    db_manager.close()
+    return row_count
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path', nargs='?')
+    parser.add_argument('--trains', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = args.csv_path or write_timetable_csv(os.path.join(tmp_dir, 'timetable.csv'), args.trains)
+
+        insert_count, insert_time = timed(load_with_inserts, csv_path, os.path.join(tmp_dir, 'inserts.db'))
+        bulk_count, bulk_time = timed(load_with_bulk_insert, csv_path, os.path.join(tmp_dir, 'bulk.db'),
+                                      args.chunk_size)
+
+    print(f"Rows:            {bulk_count:,} (string path {insert_count:,})")
+    print(f"String INSERTs:  {insert_time:.2f} s ({insert_time / insert_count * 1e6:.1f} us/row)")
+    print(f"Bulk load:       {bulk_time:.2f} s ({bulk_time / bulk_count * 1e6:.1f} us/row)")
+    print(f"Speedup:         {insert_time / bulk_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
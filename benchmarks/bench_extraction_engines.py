@@ -0,0 +1,117 @@
+"""
+Compares the text and the words extraction engine of convert_pdfs_to_csv on the same PDFs:
+extraction time per engine and a row-level diff of what each engine extracted.
+
+Rows are matched by train number (in page order for repeated numbers). The report counts
+identical rows, rows whose cells differ and rows only one engine found, and prints examples.
+Without --pdf-dir a synthetic timetable PDF is generated, whose true rows are known, so the
+report also shows how many rows each engine got exactly right.
+
+Usage:
+    python -m benchmarks.bench_extraction_engines [--trains N] [--examples N]
+    python -m benchmarks.bench_extraction_engines --pdf-dir data/pdf
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.synthetic import generate_rows, table_row, write_timetable_pdf
+from convert_pdfs_to_csv import ENGINES, extract_rows_from_pdf, list_pdf_files
+
+
+def extract_all(pdf_paths: list, engine: str):
+    """Return every PDF's rows extracted with the engine and the seconds it took."""
+    start = time.perf_counter()
+    rows_per_pdf = {pdf_path: list(extract_rows_from_pdf(pdf_path, engine)) for pdf_path in pdf_paths}
+    return rows_per_pdf, time.perf_counter() - start
+
+
+def keyed_rows(rows: list) -> dict:
+    """Key rows by train number, numbering repeated train numbers in order of appearance."""
+    seen = Counter()
+    keyed = {}
+    for row in rows:
+        train_nr = row[0] if row else ''
+        keyed[(train_nr, seen[train_nr])] = row
+        seen[train_nr] += 1
+    return keyed
+
+
+def diff_rows(left: list, right: list) -> dict:
+    """
+    Compares two extractions of the same PDF row by row.
+
+    Returns:
+        dict: "identical" count and lists of "changed" (key, left row, right row),
+        "only_left" and "only_right" rows.
+    """
+    left_keyed, right_keyed = keyed_rows(left), keyed_rows(right)
+    diff = {"identical": 0, "changed": [], "only_left": [], "only_right": []}
+    for key, row in left_keyed.items():
+        other = right_keyed.get(key)
+        if other is None:
+            diff["only_left"].append(row)
+        elif other == row:
+            diff["identical"] += 1
+        else:
+            diff["changed"].append((key, row, other))
+    diff["only_right"] = [row for key, row in right_keyed.items() if key not in left_keyed]
+    return diff
+
+
+def print_diff(diff: dict, left_name: str, right_name: str, examples: int):
+    print(f"Identical rows:        {diff['identical']}")
+    print(f"Rows with differences: {len(diff['changed'])}")
+    print(f"Only in {left_name + ':':14} {len(diff['only_left'])}")
+    print(f"Only in {right_name + ':':14} {len(diff['only_right'])}")
+
+    for (train_nr, _), left, right in diff["changed"][:examples]:
+        print(f"\n  {train_nr}:")
+        for column in range(max(len(left), len(right))):
+            left_cell = left[column] if column < len(left) else None
+            right_cell = right[column] if column < len(right) else None
+            if left_cell != right_cell:
+                print(f"    column {column}: {left_name} {left_cell!r} != {right_name} {right_cell!r}")
+    for name, rows in ((left_name, diff["only_left"]), (right_name, diff["only_right"])):
+        for row in rows[:examples]:
+            print(f"\n  only {name}: {row}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdf-dir', help='compare the engines on these PDFs instead of a synthetic one')
+    parser.add_argument('--trains', type=int, default=2000, help='rows of the synthetic PDF')
+    parser.add_argument('--examples', type=int, default=5, help='differences printed per kind')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        expected = None
+        if args.pdf_dir:
+            pdf_paths = list_pdf_files(args.pdf_dir)
+        else:
+            rows = generate_rows(args.trains)
+            pdf_paths = [write_timetable_pdf(os.path.join(work_dir, 'timetable.pdf'), rows)]
+            expected = [table_row(row) for row in rows]
+
+        results = {engine: extract_all(pdf_paths, engine) for engine in ENGINES}
+
+        for engine, (rows_per_pdf, seconds) in results.items():
+            row_count = sum(len(rows) for rows in rows_per_pdf.values())
+            print(f"{engine:>5} engine: {seconds:8.3f} s, {row_count} rows, {row_count / seconds:,.0f} rows/s")
+
+        text_rows, words_rows = results['text'][0], results['words'][0]
+        for pdf_path in pdf_paths:
+            print(f"\n== {os.path.basename(pdf_path)}: text vs words ==")
+            print_diff(diff_rows(text_rows[pdf_path], words_rows[pdf_path]), 'text', 'words', args.examples)
+
+        if expected is not None:
+            print("\n== Rows matching the generated timetable ==")
+            for engine, (rows_per_pdf, _) in results.items():
+                diff = diff_rows(expected, rows_per_pdf[pdf_paths[0]])
+                print(f"{engine:>5} engine: {diff['identical']} of {len(expected)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Compares the throughput (lines/sec) of extract_table_from_pdf_page with the previous parser.
+
+Usage:
+    python -m benchmarks.bench_page_parser [--pages N] [--rows-per-page N]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.legacy_parser import legacy_extract_table_from_pdf_page
+from benchmarks.synthetic import generate_page_text
+from convert_pdfs_to_csv import extract_table_from_pdf_page
+
+
+def lines_per_second(parse, pages, line_count) -> float:
+    start = time.perf_counter()
+    for page_text in pages:
+        parse(page_text)
+    return line_count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--rows-per-page', type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [generate_page_text(rng, args.rows_per_page) for _ in range(args.pages)]
+    line_count = sum(page_text.count("\n") + 1 for page_text in pages)
+
+    legacy = lines_per_second(legacy_extract_table_from_pdf_page, pages, line_count)
+    current = lines_per_second(extract_table_from_pdf_page, pages, line_count)
+
+    print(f"Pages: {len(pages)}, lines: {line_count}")
+    print(f"Previous parser:      {legacy:12,.0f} lines/s")
+    print(f"State-machine parser: {current:12,.0f} lines/s ({current / legacy:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Times "next departure" queries against the station-pair index at several timetable sizes.
+
+Usage:
+    python -m benchmarks.bench_station_lookup [--sizes 1000,10000,100000] [--queries N]
+"""
+import argparse
+import random
+import time
+from datetime import date
+
+from benchmarks.synthetic import generate_rows
+from timetable import Timetable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--queries', type=int, default=10000)
+    args = parser.parse_args()
+
+    today = date.today()
+    for size in [int(size) for size in args.sizes.split(',')]:
+        timetable = Timetable(generate_rows(size))
+        pairs = list(timetable.by_station_pair)
+        rng = random.Random(0)
+        queries = [(*rng.choice(pairs), rng.randrange(4 * 60, 24 * 60)) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        found = 0
+        for departure_station, arrival_station, minutes in queries:
+            if timetable.find_departures(departure_station, arrival_station, minutes, today):
+                found += 1
+        elapsed = time.perf_counter() - start
+
+        print(f"{size:>7} rows: {elapsed / len(queries) * 1e6:6.2f} us/query ({found}/{len(queries)} found)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Compares train-number lookups through the in-memory Timetable index with the CSV scan
+that km_bot used to do for every message.
+
+Usage:
+    python -m benchmarks.bench_train_lookup [csv_path] [--trains N] [--queries N]
+
+Without csv_path a synthetic timetable with --trains rows is generated in a temp directory.
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+import km_bot
+from benchmarks.legacy_dates import legacy_is_valid_date_range
+from benchmarks.synthetic import write_timetable_csv
+from timetable import Timetable, TimetableStore, expand_train_numbers
+
+
+def scan_lookup(csv_path: str, train_nr: str):
+    """The pre-index lookup: open the CSV and scan it row by row with the old date check."""
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.reader(csvfile, delimiter=';'):
+            curr_train_nr = row[0]
+            row_sliced = None
+
+            if len(curr_train_nr) > 5:
+                if curr_train_nr[:4] == train_nr[:4] and curr_train_nr[6] == train_nr[4]:
+                    row_sliced = curr_train_nr[:4] + curr_train_nr[6:]
+                elif curr_train_nr[:5] == train_nr:
+                    row_sliced = curr_train_nr[:5]
+            elif curr_train_nr == train_nr:
+                row_sliced = curr_train_nr
+
+            if row_sliced is not None:
+                row[0] = row_sliced
+                if legacy_is_valid_date_range(row[7]):
+                    return km_bot.format_train_info(row)
+    return None
+
+
+def index_lookup(store: TimetableStore, train_nr: str):
+    """The indexed lookup km_bot does now, including the per-call mtime check."""
+    timetable = store.get()
+    today = date.today()
+    for row_id, row in timetable.find_by_number(train_nr):
+        if timetable.runs_on(row_id, today):
+            return km_bot.format_train_info(row)
+    return None
+
+
+def time_queries(lookup, queries) -> float:
+    start = time.perf_counter()
+    for train_nr in queries:
+        try:
+            lookup(train_nr)
+        except (ValueError, KeyError, AttributeError):
+            pass  # the old date check raises on some formats, as it did in the bot
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path', nargs='?')
+    parser.add_argument('--trains', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = args.csv_path or write_timetable_csv(os.path.join(tmp_dir, 'timetable.csv'), args.trains)
+
+        start = time.perf_counter()
+        timetable = Timetable.from_csv(csv_path)
+        build_time = time.perf_counter() - start
+
+        numbers = [nr for row in timetable.rows for nr in expand_train_numbers(row[0])]
+        rng = random.Random(0)
+        queries = [rng.choice(numbers) for _ in range(args.queries)] + ['99999'] * (args.queries // 10)
+
+        store = TimetableStore(csv_path)
+        store.get()
+
+        scan_time = time_queries(lambda nr: scan_lookup(csv_path, nr), queries)
+        index_time = time_queries(lambda nr: index_lookup(store, nr), queries)
+
+    print(f"Timetable rows:  {len(timetable.rows)}")
+    print(f"Index build:     {build_time * 1000:.1f} ms")
+    print(f"CSV scan:        {scan_time / len(queries) * 1e6:.1f} us/query")
+    print(f"Index lookup:    {index_time / len(queries) * 1e6:.1f} us/query")
+    print(f"Speedup:         {scan_time / index_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
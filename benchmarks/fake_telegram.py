@@ -0,0 +1,285 @@
+"""
+Offline stand-in for the Telegram Bot API to compare km_bot's polling and webhook modes.
+
+Starts a fake Bot API server, launches km_bot.py against it (TELEGRAM_BASE_URL) on a synthetic
+timetable and feeds it synthetic updates: served through getUpdates in polling mode, POSTed to the
+bot's webhook in webhook mode. Latency is measured from sending an update to receiving the bot's
+sendMessage call; throughput from a burst of updates sent at once.
+
+Usage:
+    python -m benchmarks.fake_telegram --mode webhook [--updates 500] [--sequential 50]
+    python -m benchmarks.fake_telegram --mode polling
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from benchmarks.synthetic import generate_rows, write_timetable_csv
+from timetable import expand_train_numbers
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_TOKEN = '123456:FAKE'
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "KM Bot", "username": "kmkobot"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """A minimal Bot API: getMe, getUpdates (long polling), setWebhook/deleteWebhook and sendMessage."""
+
+    daemon_threads = True
+    # The listen backlog; the default of 5 overflows under a webhook burst and the bot's
+    # sendMessage connections then wait on SYN retransmits, which is not what we measure
+    request_queue_size = 1024
+
+    def __init__(self, port: int):
+        super().__init__(('127.0.0.1', port), FakeBotApiHandler)
+        self.condition = threading.Condition()
+        self.pending_updates = []
+        self.sent_at = {}
+        self.replied_at = {}
+        self.polled = threading.Event()
+        self.webhook_set = threading.Event()
+        self.webhook_url = None
+        self.webhook_secret = None
+
+    def queue_update(self, update: dict):
+        with self.condition:
+            self.sent_at[update["update_id"]] = time.perf_counter()
+            self.pending_updates.append(update)
+            self.condition.notify_all()
+
+    def get_updates(self, offset: int, timeout: float) -> list:
+        self.polled.set()
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.pending_updates = [update for update in self.pending_updates if update["update_id"] >= offset]
+            while not self.pending_updates and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return list(self.pending_updates)
+
+    def record_reply(self, chat_id: int):
+        with self.condition:
+            self.replied_at.setdefault(chat_id, time.perf_counter())
+            self.condition.notify_all()
+
+    def wait_for_replies(self, update_ids, timeout: float = 60) -> bool:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not all(update_id in self.replied_at for update_id in update_ids):
+                if time.monotonic() >= deadline:
+                    return False
+                self.condition.wait(deadline - time.monotonic())
+        return True
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> dict:
+        params = dict(parse_qsl(urlparse(self.path).query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if body:
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body.decode('utf-8')))
+        return params
+
+    def _reply(self, result):
+        payload = json.dumps({"ok": True, "result": result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        method = urlparse(self.path).path.rsplit('/', 1)[-1]
+        params = self._params()
+        server: FakeBotApi = self.server
+
+        if method == 'getMe':
+            self._reply(BOT_USER)
+        elif method == 'getUpdates':
+            self._reply(server.get_updates(int(params.get('offset') or 0), float(params.get('timeout') or 0)))
+        elif method == 'setWebhook':
+            server.webhook_url = params.get('url')
+            server.webhook_secret = params.get('secret_token')
+            server.webhook_set.set()
+            self._reply(True)
+        elif method in ('sendMessage', 'sendPhoto'):
+            chat_id = int(params['chat_id'])
+            server.record_reply(chat_id)
+            self._reply({"message_id": chat_id, "date": int(time.time()),
+                         "chat": {"id": chat_id, "type": "private"}, "text": params.get('text', '')})
+        else:
+            self._reply(True)
+
+
+def make_update(update_id: int, text: str) -> dict:
+    user = {"id": update_id, "is_bot": False, "first_name": "Bench", "username": "bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": update_id, "type": "private", "username": "bench"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def post_update(api: FakeBotApi, update: dict):
+    request = urllib.request.Request(api.webhook_url, data=json.dumps(update).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    if api.webhook_secret:
+        request.add_header('X-Telegram-Bot-Api-Secret-Token', api.webhook_secret)
+    with api.condition:
+        api.sent_at[update["update_id"]] = time.perf_counter()
+    urllib.request.urlopen(request, timeout=30).read()
+
+
+def start_bot(mode: str, api_port: int, work_dir: str) -> subprocess.Popen:
+    webhook_port = free_port()
+    env = dict(os.environ,
+               TELEGRAM_API_TOKEN=FAKE_TOKEN,
+               TELEGRAM_BASE_URL=f'http://127.0.0.1:{api_port}/bot',
+               BOT_MODE=mode,
+               WEBHOOK_LISTEN='127.0.0.1',
+               WEBHOOK_PORT=str(webhook_port),
+               WEBHOOK_URL=f'http://127.0.0.1:{webhook_port}/telegram',
+               WEBHOOK_SECRET='benchmark-secret')
+    return subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'km_bot.py')], cwd=work_dir, env=env,
+                            stdout=subprocess.DEVNULL)
+
+
+def wait_until_ready(api: FakeBotApi, mode: str, timeout: float = 30):
+    ready = api.webhook_set if mode == 'webhook' else api.polled
+    if not ready.wait(timeout):
+        raise RuntimeError(f"km_bot did not start in {mode} mode within {timeout} seconds")
+    if mode == 'webhook':
+        port = urlparse(api.webhook_url).port
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("km_bot's webhook server is not accepting connections")
+
+
+def send(api: FakeBotApi, mode: str, updates: list, concurrency: int):
+    if mode == 'polling':
+        for update in updates:
+            api.queue_update(update)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda update: post_update(api, update), updates))
+
+
+def latencies(api: FakeBotApi, update_ids) -> list:
+    return [(api.replied_at[update_id] - api.sent_at[update_id]) * 1000 for update_id in update_ids]
+
+
+def run(mode: str, updates: int = 500, sequential: int = 30, concurrency: int = 32, trains: int = 5000,
+        timeout: float = 120) -> dict:
+    """
+    Starts km_bot against the fake Bot API in the given mode and measures it.
+
+    Returns:
+        dict: The reply latencies in ms of the "sequential" and the "burst" updates, and the
+            "elapsed" seconds until every update of the burst was answered.
+
+    Raises:
+        RuntimeError: If the bot doesn't start or an update isn't answered within timeout seconds.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_timetable_csv(os.path.join(work_dir, 'data', 'csv', 'KM_table_current.csv'), trains)
+        numbers = [nr for row in generate_rows(trains) for nr in expand_train_numbers(row[0])]
+
+        api_port = free_port()
+        api = FakeBotApi(api_port)
+        threading.Thread(target=api.serve_forever, daemon=True).start()
+        bot = start_bot(mode, api_port, work_dir)
+        try:
+            wait_until_ready(api, mode)
+
+            # Latency: one update at a time, waiting for each reply
+            sequential_ids = []
+            for i in range(sequential):
+                update_id = i + 1
+                send(api, mode, [make_update(update_id, numbers[i % len(numbers)])], 1)
+                if not api.wait_for_replies([update_id]):
+                    raise RuntimeError(f"No reply to update {update_id}")
+                sequential_ids.append(update_id)
+
+            # Throughput: a burst of updates at once
+            burst = [make_update(sequential + i + 1, numbers[(i * 31) % len(numbers)]) for i in range(updates)]
+            start = time.perf_counter()
+            send(api, mode, burst, concurrency)
+            if not api.wait_for_replies([update["update_id"] for update in burst], timeout=timeout):
+                raise RuntimeError("Not every update in the burst was answered")
+            elapsed = time.perf_counter() - start
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+            api.shutdown()
+            api.server_close()
+
+    return {
+        "sequential": latencies(api, sequential_ids),
+        "burst": latencies(api, [update["update_id"] for update in burst]),
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['polling', 'webhook'], required=True)
+    parser.add_argument('--updates', type=int, default=500, help='updates in the throughput burst')
+    parser.add_argument('--sequential', type=int, default=30, help='updates sent one by one for latency')
+    parser.add_argument('--concurrency', type=int, default=32, help='parallel webhook POSTs in the burst')
+    parser.add_argument('--trains', type=int, default=5000)
+    args = parser.parse_args()
+
+    results = run(args.mode, args.updates, args.sequential, args.concurrency, args.trains)
+
+    sequential = results["sequential"]
+    burst_latencies = results["burst"]
+    print(f"Mode:               {args.mode}")
+    print(f"Sequential latency: p50 {statistics.median(sequential):.1f} ms, max {max(sequential):.1f} ms")
+    print(f"Burst latency:      p50 {statistics.median(burst_latencies):.1f} ms, max {max(burst_latencies):.1f} ms")
+    print(f"Burst throughput:   {len(burst_latencies) / results['elapsed']:.0f} updates/s "
+          f"({len(burst_latencies)} updates)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+The date check km_bot ran on every scanned row before service calendars, kept verbatim as the
+baseline for bench_train_lookup.
+"""
+from datetime import datetime
+
+MONTH_ROMAN_NUMERALS = {
+    'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6,
+    'VII': 7, 'VIII': 8, 'IX': 9, 'X': 10, 'XI': 11, 'XII': 12
+}
+WORKDAYS = [0, 1, 2, 3, 4]
+HOLIDAYS = {
+    '1.01': 'Nowy Rok', '6.01': 'Trzech Króli', '1.05': 'Święto Pracy',
+    '3.05': 'Święto Konstytucji 3 Maja', '15.08': 'Wniebowzięcie Najświętszej Maryi Panny',
+    '1.11': 'Wszystkich Świętych', '11.11': 'Święto Niepodległości', '25.12': 'Boże Narodzenie',
+    '26.12': 'Boże Narodzenie'
+}
+today = datetime.now().date()
+year = datetime.now().year
+
+
+def legacy_is_valid_date_range(date_range):
+    if '(' in date_range:
+        date_range, additional_info = date_range.split("(", 1)[0].strip(), date_range.split("(", 1)[1].split(")")[
+            0].strip()
+    else:
+        additional_info = None
+
+    if process_additional_info(additional_info):
+        if 'i' in date_range:
+            date_ranges = date_range.split('i').trim()
+            for dr in date_ranges:
+                return legacy_is_valid_date_range(dr)
+
+        if ',' in date_range:
+            date_ranges = date_range.split(',')
+            for dr in date_ranges:
+                if '-' in dr:
+                    start_date, end_date = dr.split('-')
+                    if ' ' in start_date:
+                        day = start_date.split(' ')[0]
+                        month = start_date.split(' ')[1]
+                        start_date = parse_date(day, year, month)
+                    elif ' ' in end_date:
+                        day = end_date.split(' ')[0]
+                        month = end_date.split(' ')[1]
+                        end_date = parse_date(day, year, month)
+                    else:
+                        day = end_date
+                        month = date_range.split(' ')[1]
+                        end_date = parse_date(day, year, month)
+
+                    if start_date <= today <= end_date:
+                        return True
+                else:
+                    if (' ' in dr) and (dr.split(' ')[0].isdigit()):
+                        day = dr.split(' ')[0]
+                        month = dr.split(' ')[1]
+                        date = parse_date(day, year, month)
+                    else:
+                        day = dr
+                        month = date_range.split(' ')[1]
+                        date = parse_date(day, year, month)
+                    if date == today:
+                        return True
+        elif '-' in date_range:
+            start_date, end_date = date_range.split('-')
+
+            start_date = split_and_parse_date(start_date, date_range)
+            end_date = split_and_parse_date(end_date, date_range)
+
+            if start_date <= today <= end_date:
+                return True
+        else:
+            date = parse_date(date_range.strip(), year)
+            if date == today:
+                return True
+
+    return False
+
+
+def split_and_parse_date(date_str, date_range):
+    if ' ' in date_str:
+        day = date_str.split(' ')[0]
+        month = date_str.split(' ')[1]
+        parsed_date = parse_date(day, year, month)
+    else:
+        day = date_str
+        month = date_range.split(' ')[1]
+        parsed_date = parse_date(day, year, month)
+
+    return parsed_date
+
+
+def parse_date(date_str, year, month=None):
+    if ' ' in date_str:
+        day, month_from_roman = date_str.split(' ')
+        month_from_roman = MONTH_ROMAN_NUMERALS[month_from_roman]
+        day = int(day)
+        date = datetime(year, month_from_roman, day).date()
+    else:
+        day = int(date_str)
+        month_from_roman = MONTH_ROMAN_NUMERALS[month]
+        date = datetime(year, month_from_roman, day).date()
+
+    return date
+
+
+def process_additional_info(additional_info):
+    today_without_year = today.strftime('%d.%m')  # remove year from today's date
+    if additional_info is None:
+        return True
+
+    if additional_info == 'A':  # runs on workdays
+        return today.weekday() in WORKDAYS
+    if additional_info == 'B':  # runs on workdays and sundays
+        return today.weekday() in WORKDAYS or today.weekday() == 6
+    if additional_info == 'C':  # runs on weekends and holidays
+        return today.weekday() == 5 or today.weekday() == 6 or today_without_year in HOLIDAYS
+    if additional_info == 'D':  # runs on workdays but not on holidays
+        return today.weekday() in WORKDAYS and today_without_year not in HOLIDAYS
+    if additional_info == 'E':  # runs on workdays and saturdays but not on holidays
+        return (today.weekday() in WORKDAYS or today.weekday() == 5) and today_without_year not in HOLIDAYS
+    if additional_info == '+':  # runs on holidays
+        return today_without_year in HOLIDAYS
+    if additional_info.isdigit():  # runs on specified day of the week
+        return today.weekday() == int(additional_info) - 1
+    if '-' in additional_info:  # runs on specified days of the week
+        start_day, end_day = additional_info.split('-')
+        return int(start_day) - 1 <= today.weekday() <= int(end_day) - 1
+
+
+    return False
@@ -0,0 +1,122 @@
+"""
+The page parser as it was before the state-machine engine, kept verbatim as the baseline for
+bench_page_parser and for regenerating the golden fixtures in tests/fixtures.
+"""
+import re
+
+
+def legacy_extract_table_from_pdf_page(page_text: str) -> list:
+    """
+    Extracts table rows from the provided PDF page text by processing each line.
+    Lines containing specific keywords are skipped to ensure only relevant data is captured.
+
+    The keywords "odj." and "przyj." are handled with an optional period,
+    allowing for matches with both "odj" and "odj." (and similarly for "przyj").
+
+    Parameters:
+        page_text (str): The plain text extracted from a PDF page.
+
+    Returns:
+        list: A list of rows, where each row is a list of strings representing table data.
+    """
+    raw_keywords = [
+        "okres", "nr poc", "relacja", "handlowa", "zestawienie", "termin", "kursowania",
+        "z", "odj\\.?", "do", "przyj\\.?", "typ", "taboru", "ilość", "legenda"
+    ]
+    keywords_pattern = [re.compile(r'\b' + keyword + r'\b', re.IGNORECASE) for keyword in raw_keywords]
+
+    train_number_pattern = re.compile(r'^\d{5}(/\d+)?$')  # (e.g. 12345 or 12345/6)
+
+    rows = []
+    row = []
+    lines = page_text.splitlines()
+    column_counter = 1
+
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+
+        if not line:
+            continue
+
+        if any(pattern.search(line) for pattern in keywords_pattern):
+            continue
+
+        if column_counter < 9:
+            if ("PERON" in line or "LOTNISKO" in line) and i < len(lines):
+                next_line = lines[i].strip()
+                line = line + " " + next_line
+                i += 1
+
+            if column_counter == 7:
+                next_line = lines[i].strip() if i < len(lines) else ""
+
+                # Special handling for EU47 trains to properly parse units and dates
+                if lines[i - 2].strip().startswith("EU47"):
+                    different_units_count = len(lines[i - 2].strip().split(", "))
+                    line_parts = line.split(" ")
+                    units_counts = line_parts[:different_units_count]
+                    dates_part_1 = line_parts[different_units_count:]
+                    dates_part_1 = " ".join(dates_part_1)
+
+                    if i < len(lines) and not train_number_pattern.match(next_line):
+                        dates = dates_part_1 + " " + next_line
+                        lines[i] = dates
+
+                    line = " ".join(units_counts)
+
+                # if 8th column is a train number don't append that row, start new one
+                # that's because 8th column is date and for some reason (KM moment) it is sometimes empty, making the row invalid (at least I assumed that from manually checking if these trains exist)
+                if train_number_pattern.match(next_line):
+                    column_counter = 0
+                    row = []
+                    continue
+
+            if column_counter == 8:
+                next_line = lines[i].strip() if i < len(lines) else ""
+                # We need to keep checking if next line is not a train number (new row) or phrase to skip.
+                # If it's neither of those, we need to append it to the current line because it's a part of the date.
+                # If it's a train number or phrase to skip, we need to start a new row, because we reached the end of the current one.
+
+                while (not train_number_pattern.match(next_line) and not any(
+                        pattern.search(next_line) for pattern in keywords_pattern)) and i < len(lines):
+                    line = line + " " + next_line
+                    i += 1
+                    next_line = lines[i].strip() if i < len(lines) else ""
+            row.append(line)
+            column_counter += 1
+        else:
+            rows.append(row)
+            row = [line]
+            column_counter = 2
+
+    if row:
+        rows.append(row)
+
+    return rows
+
+
+
+def write_golden_fixtures(path: str, page_count: int = 40, rows_per_page: int = 12, seed: int = 14):
+    """Write page texts with the rows this parser extracts from them, for the equivalence tests."""
+    import json
+    import random
+
+    from benchmarks.synthetic import generate_page_text
+
+    rng = random.Random(seed)
+    fixtures = []
+    for page_num in range(page_count):
+        page_text = generate_page_text(rng, rows_per_page)
+        fixtures.append({"name": f"synthetic-{page_num}", "page_text": page_text,
+                         "rows": legacy_extract_table_from_pdf_page(page_text)})
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(fixtures, file, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    import sys
+
+    write_golden_fixtures(sys.argv[1] if len(sys.argv) > 1 else 'tests/fixtures/parser_golden.json')
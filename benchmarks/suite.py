@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark suite: times every stage from the timetable PDFs to the bot's answers
+on synthetic "Zestawienie pociągów KM" PDFs at several scales, and records the results so
+they can be compared between commits.
+
+Stages per scale (number of trains):
+    extract_text, extract_words  rows extracted from all PDFs with each engine (serial)
+    write_csv                    process_dates + write_rows_to_csv
+    db_convert, db_insert        DatabaseManager building the INSERTs and running them on SQLite
+    db_bulk_load                 DatabaseManager.load_csv, the same rows with executemany
+    db_diff_reload               DatabaseManager.load_csv_diff of the unchanged CSV over the bulk load
+    timetable_load               Timetable.from_csv, what km_bot does without a snapshot
+    snapshot_write, snapshot_load  the converter writing the binary snapshot, km_bot mapping it
+    lookup_number                km_bot lookup by train number, per query
+    lookup_stations              km_bot lookup by stations and time, per query
+    lookup_db_number             DatabaseManager.find_train on the bulk loaded database, per query
+    lookup_db_stations           DatabaseManager.find_departures on the bulk loaded database, per query
+
+Results are written as JSON to data/benchmarks/<commit>.json (or --output); --compare prints
+each stage next to an earlier result.
+
+Usage:
+    python -m benchmarks.suite [--scales 1000 10000 100000] [--compare data/benchmarks/abc1234.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime
+
+import km_bot
+from benchmarks.synthetic import write_timetable_pdfs
+from convert_pdfs_to_csv import extract_rows_from_all_pdfs, process_dates, write_rows_to_csv
+from db_actions import DatabaseManager
+from snapshot import load_snapshot, write_snapshot
+from timetable import Timetable, TimetableStore, expand_train_numbers, parse_time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join('data', 'benchmarks')
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+
+def timed(func, *args):
+    """Run func(*args) and return its result and the seconds it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def time_per_query(lookup, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        lookup(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def run_scale(train_count: int, work_dir: str, trains_per_pdf: int = 5000, queries: int = 2000) -> dict:
+    """
+    Runs every stage on a synthetic timetable of train_count trains.
+
+    Returns:
+        dict: The seconds each stage took (per query for the lookups), plus the row counts.
+    """
+    source_dir = os.path.join(work_dir, 'pdf')
+    csv_path = os.path.join(work_dir, 'KM_table_current.csv')
+    db_path = os.path.join(work_dir, 'km_bot.db')
+    results = {}
+
+    _, results['generate_pdfs'] = timed(write_timetable_pdfs, source_dir, train_count, trains_per_pdf)
+    text_rows, results['extract_text'] = timed(extract_rows_from_all_pdfs, source_dir)
+    rows, results['extract_words'] = timed(extract_rows_from_all_pdfs, source_dir, None, None, 'words')
+    _, results['write_csv'] = timed(lambda: write_rows_to_csv(process_dates(rows), csv_path))
+
+    db_manager = DatabaseManager(db_path)
+    inserts, results['db_convert'] = timed(db_manager.convert_to_inserts_with_date_splitting, csv_path)
+    _, results['db_insert'] = timed(db_manager.insert_data, inserts)
+    db_manager.close()
+
+    bulk_db_path = os.path.join(work_dir, 'km_bot_bulk.db')
+    db_manager = DatabaseManager(bulk_db_path)
+    _, results['db_bulk_load'] = timed(db_manager.load_csv, csv_path)
+    _, results['db_diff_reload'] = timed(db_manager.load_csv_diff, csv_path)
+    db_manager.close()
+
+    timetable, results['timetable_load'] = timed(Timetable.from_csv, csv_path)
+    _, results['snapshot_write'] = timed(write_snapshot, timetable, csv_path)
+    _, results['snapshot_load'] = timed(load_snapshot, csv_path)
+
+    rng = random.Random(0)
+    numbers = [train_nr for row in timetable.rows for train_nr in expand_train_numbers(row[0])]
+    number_queries = [rng.choice(numbers) for _ in range(queries)]
+    station_queries = []
+    for _ in range(queries):
+        row = rng.choice(timetable.rows)
+        station_queries.append(km_bot.normalize_query(f"{row[1]}, {row[3]}, {row[2]}"))
+
+    store = TimetableStore(csv_path)
+    store.get()
+    previous_store, km_bot.timetable_store = km_bot.timetable_store, store
+    try:
+        results['lookup_number'] = time_per_query(km_bot.lookup_response, number_queries)
+        results['lookup_stations'] = time_per_query(km_bot.lookup_response, station_queries)
+    finally:
+        km_bot.timetable_store = previous_store
+
+    today = date.today()
+    departure_rows = [rng.choice(timetable.rows) for _ in range(queries)]
+    db_manager = DatabaseManager(bulk_db_path)
+    results['lookup_db_number'] = time_per_query(lambda train_nr: db_manager.find_train(train_nr, today),
+                                                 number_queries)
+    results['lookup_db_stations'] = time_per_query(
+        lambda row: db_manager.find_departures(row[1], row[3], parse_time(row[2]) or 0, today), departure_rows)
+    db_manager.close()
+
+    results['rows_text'] = len(text_rows)
+    results['rows_words'] = len(rows)
+    results['inserts'] = len(inserts)
+    return results
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def format_value(stage: str, value) -> str:
+    if stage.startswith(('rows_', 'inserts')):
+        return f"{value:,}"
+    if stage.startswith('lookup_'):
+        return f"{value * 1e6:,.1f} us"
+    return f"{value:,.3f} s"
+
+
+def print_results(record: dict, previous: dict = None):
+    for scale, results in record["scales"].items():
+        previous_results = (previous or {}).get("scales", {}).get(scale, {})
+        header = f"\n== {int(scale):,} trains"
+        if previous:
+            header += f" (vs {previous.get('commit', '?')})"
+        print(header + " ==")
+        for stage, value in results.items():
+            line = f"  {stage:18} {format_value(stage, value):>14}"
+            previous_value = previous_results.get(stage)
+            if previous_value is not None:
+                line += f"  was {format_value(stage, previous_value):>14}"
+                if previous_value and not stage.startswith(('rows_', 'inserts')):
+                    line += f"  {value / previous_value:6.2f}x"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='numbers of trains')
+    parser.add_argument('--trains-per-pdf', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000, help='lookups timed per kind')
+    parser.add_argument('--output', help='where to write the results (default data/benchmarks/<commit>.json)')
+    parser.add_argument('--compare', help='an earlier results file to compare with')
+    args = parser.parse_args()
+
+    commit = current_commit()
+    record = {
+        "commit": commit,
+        "time": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scales": {},
+    }
+    for train_count in args.scales:
+        with tempfile.TemporaryDirectory() as work_dir:
+            print(f"Running {train_count:,} trains...")
+            record["scales"][str(train_count)] = run_scale(train_count, work_dir, args.trains_per_pdf, args.queries)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    output_dir = os.path.dirname(output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(record, file, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            previous = json.load(file)
+    print_results(record, previous)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import csv
+import os
+import random
+
+import pymupdf
+
+# In the KM PDFs "PERON" and "LOTNISKO" are always followed by the rest of the name on the next line,
+# which is what the text engine joins, so no station here ends with either word.
+STATIONS = [
+    "WARSZAWA ZACHODNIA", "WARSZAWA WSCHODNIA", "WARSZAWA CENTRALNA", "GRODZISK MAZ.", "SKIERNIEWICE",
+    "ŁOWICZ GŁÓWNY", "SIEDLCE", "MIŃSK MAZ.", "OTWOCK", "PILAWA", "DĘBLIN", "RADOM", "WARKA",
+    "GÓRA KALWARIA", "DZIAŁDOWO", "NASIELSK", "NOWY DWÓR MAZ.", "MODLIN", "TŁUSZCZ", "OSTROŁĘKA",
+    "SOCHACZEW", "KUTNO", "MALKINIA", "SIERPC", "WARSZAWA LOTNISKO CHOPINA", "WARSZAWA ZACHODNIA PERON 8",
+    "ŻYRARDÓW", "PIASECZNO", "CZACHÓWEK POŁUDNIOWY", "LEGIONOWO", "WOŁOMIN", "SULEJÓWEK MIŁOSNA",
+]
+TRAIN_MODELS = [
+    "ER75", "ER160", "45WEkm", "EN76", "SA135", "SA222", "Vt627", "111Eb", "EU47",
+    "EN57wKM", "EN57AKMw1", "EN57ALwKM", "EN71KM", "SN82", "EN76, EN57wKM",
+]
+MONTHS = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII"]
+ANNOTATIONS = ["", "", "", "(A)", "(B)", "(C)", "(D)", "(E)", "(+)", "(6)", "(1-5)", "(5-6)"]
+
+
+def random_dates(rng: random.Random) -> str:
+    """Return a date expression in the format written by format_date_strings (e.g. "2, 4 - 9 XII")."""
+    month = rng.randrange(12)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"{rng.randint(1, 28)} {MONTHS[month]}"
+    if kind == 1:
+        start = rng.randint(1, 20)
+        return f"{start} - {rng.randint(start + 1, 28)} {MONTHS[month]}"
+    if kind == 2:
+        days = sorted(rng.sample(range(1, 29), 3))
+        return ", ".join(str(day) for day in days[:-1]) + f", {days[-1]} {MONTHS[month]}"
+    end_month = (month + rng.randint(1, 3)) % 12
+    return f"{rng.randint(1, 28)} {MONTHS[month]} - {rng.randint(1, 28)} {MONTHS[end_month]}"
+
+
+def generate_rows(train_count: int, seed: int = 0) -> list:
+    """
+    Generates synthetic timetable rows shaped like the rows convert_pdfs_to_csv produces.
+
+    Parameters:
+        train_count (int): The number of rows to generate.
+        seed (int): The random seed, so the same arguments always produce the same timetable.
+
+    Returns:
+        list: A list of 9-column rows.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(train_count):
+        train_nr = str(10000 + (i * 7) % 90000)
+        if rng.random() < 0.2:
+            train_nr += f"/{(int(train_nr[-1]) + 1) % 10}"
+        departure_station, arrival_station = rng.sample(STATIONS, 2)
+        departure = rng.randrange(4 * 60, 24 * 60)
+        arrival = (departure + rng.randint(10, 180)) % (24 * 60)
+        train_model = rng.choice(TRAIN_MODELS)
+        count = ", ".join("1" for _ in train_model.split(", "))
+        rows.append([
+            train_nr,
+            departure_station,
+            f"{departure // 60}:{departure % 60:02d}",
+            arrival_station,
+            f"{arrival // 60}:{arrival % 60:02d}",
+            train_model,
+            count,
+            random_dates(rng),
+            rng.choice(ANNOTATIONS),
+        ])
+    return rows
+
+
+def write_timetable_csv(csv_path: str, train_count: int, seed: int = 0) -> str:
+    """Write a synthetic timetable CSV with train_count rows and return its path."""
+    output_dir = os.path.dirname(csv_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file, delimiter=";")
+        writer.writerows(generate_rows(train_count, seed))
+    return csv_path
+
+
+PAGE_HEADER = [
+    "Zestawienie pociągów KM kursujących w okresie", "nr poc.", "relacja handlowa", "z", "odj.",
+    "do", "przyj.", "typ taboru", "ilość", "termin kursowania",
+]
+PAGE_LEGEND = [
+    "Legenda:", "(A) - kursuje od poniedziałku do piątku z wyjątkiem świąt",
+    "(+) - kursuje w niedziele i święta z wyjątkiem 25 XII",
+]
+TWO_LINE_STATIONS = [("WARSZAWA", "LOTNISKO CHOPINA"), ("MODLIN", "LOTNISKO"), ("WARSZAWA ZACHODNIA PERON", "8")]
+
+
+def generate_page_text(rng: random.Random, row_count: int) -> str:
+    """
+    Generates the text layer of one timetable page as page.get_text("text") returns it:
+    one cell per line, with two-line station names, EU47 rows whose count line also holds the
+    first part of the dates, dates spread over several lines, rows without dates and blank lines.
+    """
+    lines = list(PAGE_HEADER)
+    for i in range(row_count):
+        train_nr = str(rng.randint(10000, 99999))
+        if rng.random() < 0.2:
+            train_nr += f"/{rng.randint(0, 9)}"
+        lines.append(train_nr)
+
+        for _ in range(2):
+            if rng.random() < 0.15:
+                lines.extend(rng.choice(TWO_LINE_STATIONS))
+            else:
+                lines.append(rng.choice(STATIONS))
+            lines.append(f"{rng.randint(4, 23)}:{rng.randint(0, 59):02d}")
+
+        dates = random_dates(rng) + (" " + rng.choice(ANNOTATIONS) if rng.random() < 0.5 else "")
+        date_parts = dates.split(", ")
+
+        if rng.random() < 0.2:
+            units = rng.choice([["EU47"], ["EU47", "EU47"], ["EU47", "EN57wKM"]])
+            lines.append(", ".join(units))
+            lines.append(" ".join("1" for _ in units) + " " + date_parts[0])
+            date_parts = date_parts[1:]
+        else:
+            lines.append(rng.choice(TRAIN_MODELS))
+            lines.append(", ".join("1" for _ in lines[-1].split(", ")))
+
+        if rng.random() < 0.05:
+            continue  # no dates: the parser drops this row
+        if date_parts:
+            split_at = rng.randint(1, len(date_parts))
+            lines.append(", ".join(date_parts[:split_at]))
+            if split_at < len(date_parts):
+                lines.append(", ".join(date_parts[split_at:]))
+        if rng.random() < 0.1:
+            lines.append("")
+
+    lines.extend(PAGE_LEGEND)
+    return "\n".join(lines)
+
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape
+FONT_SIZE = 6
+LINE_HEIGHT = 7
+ROW_GAP = 2
+TABLE_TOP = 80
+# Where each of the eight table columns starts
+COLUMN_X = [20, 60, 190, 225, 355, 390, 470, 500]
+HEADER_CELLS = [
+    (20, 40, "Zestawienie pociągów KM kursujących w okresie"), (60, 53, "relacja handlowa"),
+    (20, 60, "nr poc."), (60, 60, "z"), (190, 60, "odj."), (225, 60, "do"), (355, 60, "przyj."),
+    (390, 60, "typ"), (390, 67, "taboru"), (470, 60, "ilość"), (500, 60, "termin"), (500, 67, "kursowania"),
+]
+DATES_PER_LINE = 2
+
+
+def station_lines(station: str) -> list:
+    """Wrap a station name after "PERON" or "LOTNISKO" when more words follow, like the KM PDFs do."""
+    words = station.split()
+    for i, word in enumerate(words[:-1]):
+        if word in ("PERON", "LOTNISKO"):
+            return [" ".join(words[:i + 1]), " ".join(words[i + 1:])]
+    return [station]
+
+
+def dates_lines(dates: str) -> list:
+    """Wrap a date expression after every DATES_PER_LINE comma-separated items."""
+    parts = dates.split(", ")
+    return [", ".join(parts[i:i + DATES_PER_LINE]) + ("," if i + DATES_PER_LINE < len(parts) else "")
+            for i in range(0, len(parts), DATES_PER_LINE)]
+
+
+def table_row(row: list) -> list:
+    """Return the 8 table cells of a 9-column row, with the annotation back in the dates as in the PDFs."""
+    dates = f"{row[7]} {row[8]}".strip() if len(row) > 8 else row[7]
+    return row[:7] + [dates]
+
+
+def write_timetable_pdf(pdf_path: str, rows: list, repeat_header: bool = True) -> str:
+    """
+    Write rows as a timetable PDF laid out like the "Zestawienie pociągów KM" PDFs and return its path.
+
+    Every cell line is a separate text line at its column's x-position, written row by row, so both
+    the text and the words engine of convert_pdfs_to_csv can read it. Station names wrap after
+    "PERON"/"LOTNISKO", long date lists wrap over several lines and the legend ends the last page.
+
+    Parameters:
+        pdf_path (str): Where to save the PDF.
+        rows (list): 9-column rows as returned by generate_rows.
+        repeat_header (bool): Whether every page repeats the table header or only the first one has it.
+    """
+    output_dir = os.path.dirname(pdf_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # The built-in CJK font covers the Polish letters; subset_fonts() keeps only the glyphs used.
+    # Each page's text is written as one raw content stream of glyph ids, which is orders of
+    # magnitude faster than an insert_text() call per cell line and extracts the same way.
+    font = pymupdf.Font("cjk")
+    glyph_ids = {}
+
+    def show_text(x: float, y: float, text: str) -> str:
+        glyphs = []
+        for char in text:
+            glyph = glyph_ids.get(char)
+            if glyph is None:
+                glyph = glyph_ids[char] = f"{font.has_glyph(ord(char)):04x}"
+            glyphs.append(glyph)
+        return f"1 0 0 1 {x} {PAGE_HEIGHT - y} Tm <{''.join(glyphs)}> Tj"
+
+    doc = pymupdf.open()
+    pages = []
+
+    def new_page(with_header: bool) -> list:
+        operators = [show_text(x, header_y, text) for x, header_y, text in HEADER_CELLS] if with_header else []
+        pages.append(operators)
+        return operators
+
+    operators = None
+    y = PAGE_HEIGHT
+    for row in rows:
+        cells = table_row(row)
+        cell_lines = [[cells[0]], station_lines(cells[1]), [cells[2]], station_lines(cells[3]), [cells[4]],
+                      [cells[5]], [cells[6]], dates_lines(cells[7])]
+        row_height = max(len(lines) for lines in cell_lines) * LINE_HEIGHT + ROW_GAP
+        if operators is None or y + row_height > PAGE_HEIGHT - 40:
+            operators = new_page(operators is None or repeat_header)
+            y = TABLE_TOP
+        for x, lines in zip(COLUMN_X, cell_lines):
+            for line_number, line in enumerate(lines):
+                operators.append(show_text(x, y + line_number * LINE_HEIGHT, line))
+        y += row_height
+
+    if operators is None:
+        operators = new_page(True)
+        y = TABLE_TOP
+    for line in PAGE_LEGEND:
+        y += LINE_HEIGHT
+        if y > PAGE_HEIGHT - 20:
+            operators = new_page(False)
+            y = TABLE_TOP
+        operators.append(show_text(COLUMN_X[0], y, line))
+
+    font_xref = None
+    for operators in pages:
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        if font_xref is None:
+            font_xref = page.insert_font(fontname="km", fontbuffer=font.buffer)
+        else:
+            # Share the embedded font instead of embedding it again on every page
+            doc.xref_set_key(page.xref, "Resources", f"<</Font<</km {font_xref} 0 R>>>>")
+        contents = doc.get_new_xref()
+        doc.update_object(contents, "<<>>")
+        doc.update_stream(contents, f"BT /km {FONT_SIZE} Tf\n{chr(10).join(operators)}\nET".encode())
+        page.set_contents(contents)
+
+    doc.subset_fonts()
+    doc.save(pdf_path, garbage=3, deflate=True)
+    doc.close()
+    return pdf_path
+
+
+def write_timetable_pdfs(source_dir: str, train_count: int, trains_per_pdf: int = 5000, seed: int = 0) -> list:
+    """
+    Write a synthetic timetable of train_count trains as several PDFs, like the KM releases, into source_dir.
+
+    Parameters:
+        source_dir (str): The directory to write the PDFs to.
+        train_count (int): The number of trains (rows) in all PDFs together.
+        trains_per_pdf (int): The number of trains per PDF.
+        seed (int): The random seed of generate_rows.
+
+    Returns:
+        list: The generated 9-column rows, in the order the PDFs (sorted by name) hold them.
+    """
+    rows = generate_rows(train_count, seed)
+    for pdf_number, start in enumerate(range(0, train_count, trains_per_pdf)):
+        write_timetable_pdf(os.path.join(source_dir, f"KM_{pdf_number:03d}.pdf"), rows[start:start + trains_per_pdf])
+    return rows
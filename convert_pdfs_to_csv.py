@@ -1,215 +1,344 @@
+import argparse
+import cProfile
 import csv
+import hashlib
+import json
 import os
 import re
 import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 import pymupdf
 
+from service_days import convert_date_expression
+from snapshot import write_snapshot
+from timetable import Timetable
+
 
 # TODO:
 # 1. Date convertion
 
-def extract_table_from_pdf_page(page_text: str) -> list:
+# Bump whenever a change to the parser changes the rows it extracts, so cached rows are re-extracted
+PARSER_VERSION = '1'
+
+# Lines containing any of these words are table headers or the legend and are skipped.
+# "odj." and "przyj." are matched with an optional period.
+SKIPPED_KEYWORDS = [
+    "okres", "nr poc", "relacja", "handlowa", "zestawienie", "termin", "kursowania",
+    "z", "odj\\.?", "do", "przyj\\.?", "typ", "taboru", "ilość", "legenda"
+]
+SKIPPED_LINE_PATTERN = re.compile(r'\b(?:' + '|'.join(SKIPPED_KEYWORDS) + r')\b', re.IGNORECASE)
+TRAIN_NUMBER_PATTERN = re.compile(r'^\d{5}(/\d+)?$')  # (e.g. 12345 or 12345/6)
+
+COUNT_COLUMN = 7  # "ilość", for EU47 followed by the first part of the dates on the same line
+DATES_COLUMN = 8  # "termin kursowania", may continue over several lines
+ROW_COMPLETE = 9
+
+# Extraction engines: "text" parses the page's text lines, "words" places words by their coordinates
+ENGINES = ('text', 'words')
+
+# Header labels (lowercase, without the period) of the table columns, in column order
+COLUMN_LABELS = ["nr", "z", "odj", "do", "przyj", "typ", "ilość", "termin"]
+COLUMN_TOLERANCE = 2  # points a cell may start left of its header label
+LINE_TOLERANCE = 2  # points two words' tops may differ by and still be on the same line
+
+# Column x-positions where the table starts and the y-position below which its rows begin
+TABLE_LAYOUT = Tuple[List[float], float]
+
+
+def extract_table_from_pdf_page(page_text: str, stats: Optional[dict] = None) -> list:
     """
-    Extracts table rows from the provided PDF page text by processing each line.
-    Lines containing specific keywords are skipped to ensure only relevant data is captured.
+    Extracts table rows from the provided PDF page text in a single pass over its lines.
+
+    Every line fills the next column of the current row. Lines matching SKIPPED_LINE_PATTERN
+    (headers, legend) and empty lines are skipped. The column being filled is the parser's state:
 
-    The keywords "odj." and "przyj." are handled with an optional period,
-    allowing for matches with both "odj" and "odj." (and similarly for "przyj").
+    - Any column: a station ending in "PERON" or "LOTNISKO" continues on the next line.
+    - COUNT_COLUMN: if the next line is a train number the row has no dates and is dropped
+      (KM leaves the dates empty for trains that don't run). For EU47 the line holds one count
+      per unit followed by the first part of the dates, which is carried over to the next line.
+    - DATES_COLUMN: the dates continue until a train number or a skipped line.
+    - ROW_COMPLETE: the line starts the next row.
 
     Parameters:
         page_text (str): The plain text extracted from a PDF page.
+        stats (dict): If given, the number of "lines" on the page and of "skipped_lines" matching
+            SKIPPED_LINE_PATTERN are stored in it.
 
     Returns:
         list: A list of rows, where each row is a list of strings representing table data.
     """
-    raw_keywords = [
-        "okres", "nr poc", "relacja", "handlowa", "zestawienie", "termin", "kursowania",
-        "z", "odj\\.?", "do", "przyj\\.?", "typ", "taboru", "ilość", "legenda"
-    ]
-    keywords_pattern = [re.compile(r'\b' + keyword + r'\b', re.IGNORECASE) for keyword in raw_keywords]
-
-    train_number_pattern = re.compile(r'^\d{5}(/\d+)?$')  # (e.g. 12345 or 12345/6)
+    is_skipped = SKIPPED_LINE_PATTERN.search
+    is_train_number = TRAIN_NUMBER_PATTERN.match
 
+    lines = page_text.splitlines()
+    line_count = len(lines)
     rows = []
     row = []
-    lines = page_text.splitlines()
-    column_counter = 1
-
+    column = 1
+    carried_dates = None  # EU47 dates to put in front of the next line
+    skipped_lines = 0
     i = 0
-    while i < len(lines):
+
+    while i < line_count:
         line = lines[i].strip()
+        if carried_dates is not None:
+            line = (carried_dates + " " + line).strip()
+            carried_dates = None
         i += 1
 
         if not line:
             continue
+        if is_skipped(line):
+            skipped_lines += 1
+            continue
 
-        if any(pattern.search(line) for pattern in keywords_pattern):
+        if column >= ROW_COMPLETE:
+            rows.append(row)
+            row = [line]
+            column = 2
             continue
 
-        if column_counter < 9:
-            if ("PERON" in line or "LOTNISKO" in line) and i < len(lines):
-                next_line = lines[i].strip()
+        if ("PERON" in line or "LOTNISKO" in line) and i < line_count:
+            line = line + " " + lines[i].strip()
+            i += 1
+
+        if column == COUNT_COLUMN:
+            next_line = lines[i].strip() if i < line_count else ""
+
+            # lines[i - 2] is the raw line before this one, the train model unless something sits in between
+            if lines[i - 2].strip().startswith("EU47"):
+                different_units_count = len(lines[i - 2].strip().split(", "))
+                line_parts = line.split(" ")
+                if i < line_count and not is_train_number(next_line):
+                    carried_dates = " ".join(line_parts[different_units_count:])
+                line = " ".join(line_parts[:different_units_count])
+
+            if is_train_number(next_line):
+                column = 0
+                row = []
+                continue
+
+        elif column == DATES_COLUMN:
+            next_line = lines[i].strip() if i < line_count else ""
+            while i < line_count and not is_train_number(next_line) and not is_skipped(next_line):
                 line = line + " " + next_line
                 i += 1
+                next_line = lines[i].strip() if i < line_count else ""
 
-            if column_counter == 7:
-                next_line = lines[i].strip() if i < len(lines) else ""
-
-                # Special handling for EU47 trains to properly parse units and dates
-                if lines[i - 2].strip().startswith("EU47"):
-                    different_units_count = len(lines[i - 2].strip().split(", "))
-                    line_parts = line.split(" ")
-                    units_counts = line_parts[:different_units_count]
-                    dates_part_1 = line_parts[different_units_count:]
-                    dates_part_1 = " ".join(dates_part_1)
-
-                    if i < len(lines) and not train_number_pattern.match(next_line):
-                        dates = dates_part_1 + " " + next_line
-                        lines[i] = dates
-
-                    line = " ".join(units_counts)
-
-                # if 8th column is a train number don't append that row, start new one
-                # that's because 8th column is date and for some reason (KM moment) it is sometimes empty, making the row invalid (at least I assumed that from manually checking if these trains exist)
-                if train_number_pattern.match(next_line):
-                    column_counter = 0
-                    row = []
-                    continue
-
-            if column_counter == 8:
-                next_line = lines[i].strip() if i < len(lines) else ""
-                # We need to keep checking if next line is not a train number (new row) or phrase to skip.
-                # If it's neither of those, we need to append it to the current line because it's a part of the date.
-                # If it's a train number or phrase to skip, we need to start a new row, because we reached the end of the current one.
-
-                while (not train_number_pattern.match(next_line) and not any(
-                        pattern.search(next_line) for pattern in keywords_pattern)) and i < len(lines):
-                    line = line + " " + next_line
-                    i += 1
-                    next_line = lines[i].strip() if i < len(lines) else ""
-            row.append(line)
-            column_counter += 1
-        else:
-            rows.append(row)
-            row = [line]
-            column_counter = 2
+        row.append(line)
+        column += 1
 
     if row:
         rows.append(row)
 
+    if stats is not None:
+        stats["lines"] = line_count
+        stats["skipped_lines"] = skipped_lines
+
     return rows
 
 
-def format_date_strings(row: list) -> list:
+def find_table_layout(words: list) -> Optional[TABLE_LAYOUT]:
     """
-    Formats date strings in the last element of a row.
+    Finds where each table column starts from the positions of the header labels on the page.
 
-    Standardizes date formatting by ensuring consistent spacing around hyphens and commas.
+    The labels are looked up on the header line, i.e. nearest to the "odj." label, so words like
+    "z" or "do" elsewhere on the page are not mistaken for them.
 
-    Args:
-        row: A list where the last element contains date information.
+    Parameters:
+        words (list): The words of the page as returned by page.get_text("words").
 
     Returns:
-        The modified row with cleaned date formatting in the last element.
+        tuple: The x-position where each column starts and the bottom of the header line,
+        or None if the page has no table header.
     """
-    dates = row[-1]
-    dates = dates.replace("-", " - ").replace(",", ", ").replace("  ", " ").strip()
+    candidates = {}
+    for word in words:
+        label = word[4].lower().rstrip('.')
+        if label in COLUMN_LABELS:
+            candidates.setdefault(label, []).append(word)
 
-    row[-1] = dates
-    return row
+    if 'odj' not in candidates:
+        return None
+    anchor = candidates['odj'][0]
+    max_distance = 3 * (anchor[3] - anchor[1])
+
+    column_starts = []
+    for label in COLUMN_LABELS:
+        if label not in candidates:
+            return None
+        nearest = min(candidates[label], key=lambda word: abs(word[1] - anchor[1]))
+        if abs(nearest[1] - anchor[1]) > max_distance:
+            return None
+        column_starts.append(nearest[0] - COLUMN_TOLERANCE)
 
+    if any(start >= next_start for start, next_start in zip(column_starts, column_starts[1:])):
+        return None
 
-def convert_dates_from_roman(row: list) -> list:
+    return column_starts, anchor[3]
+
+
+def extract_table_from_pdf_words(words: list, layout: Optional[TABLE_LAYOUT] = None) -> Optional[list]:
     """
-    Converts dates in the row from Roman numerals to Arabic numerals.
+    Extracts table rows from the words of a PDF page by their coordinates, in a single pass.
+
+    Every word goes to the column whose header label starts left of it and to the row of the
+    nearest train number above it, so station names and dates spread over several lines are
+    joined without looking ahead. As with the text engine, rows without dates are dropped and
+    everything from "Legenda" on is ignored.
 
     Parameters:
-        row (list): A list of strings representing a row.
+        words (list): The words of the page as returned by page.get_text("words").
+        layout (tuple): The table layout to use; found with find_table_layout if None.
 
     Returns:
-        list: The row with dates converted to Arabic numerals.
+        list: A list of 8-column rows, or None if the page has no table header to place the words by.
     """
-    date = row[-2]
+    if layout is None:
+        layout = find_table_layout(words)
+        if layout is None:
+            return None
+    column_starts, body_top = layout
+    is_train_number = TRAIN_NUMBER_PATTERN.match
+
+    legend_top = min((word[1] for word in words if word[1] > body_top and word[4].lower().startswith("legenda")),
+                     default=float('inf')) - LINE_TOLERANCE
+
+    body = []
+    for x0, y0, _, _, text, *_ in words:
+        if body_top < y0 < legend_top:
+            column = bisect_right(column_starts, x0) - 1
+            if column >= 0:
+                body.append((y0, x0, column, text))
+
+    row_tops = sorted(y0 for y0, _, column, text in body if column == 0 and is_train_number(text))
+    cells = [[[] for _ in column_starts] for _ in row_tops]
+    for y0, x0, column, text in body:
+        row_index = bisect_right(row_tops, y0 + LINE_TOLERANCE) - 1
+        if row_index >= 0:
+            cells[row_index][column].append((round(y0 / LINE_TOLERANCE), x0, text))
 
-    roman_to_arabic = {
-        "I": "01", "II": "02", "III": "03", "IV": "04", "V": "05", "VI": "06",
-        "VII": "07", "VIII": "08", "IX": "09", "X": "10", "XI": "11", "XII": "12"
-    }
+    rows = []
+    for row_cells in cells:
+        row = [" ".join(text for _, _, text in sorted(cell)) for cell in row_cells]
+        if row[-1]:
+            rows.append(row)
 
-    roman_number = re.search(r'[IVX]+\b', date)
+    return rows
 
-    if not roman_number:
-        return row  # Return the row unchanged if no Roman numerals are found
 
-    roman_number_str = roman_number.group()
+def _page_layout(doc, page_num: int, layouts: dict) -> Optional[TABLE_LAYOUT]:
+    if page_num not in layouts:
+        layouts[page_num] = find_table_layout(doc[page_num].get_text("words"))
+    return layouts[page_num]
 
-    if roman_number_str in roman_to_arabic:
-        if roman_number and "-" in date and len(re.findall(r'[IVX]+', date)) == 2:  # date like "1 VI - 5 VII"
-            star_date, end_date = date.split(" - ")
 
-            start_roman = re.search(r'[IVX]+', star_date).group()
-            end_roman = re.search(r'[IVX]+', end_date).group()
+def extract_rows_from_page(doc, page_num: int, engine: str = 'text', stats: Optional[dict] = None,
+                           layouts: Optional[dict] = None) -> list:
+    """
+    Extracts the table rows from a page of an open PDF with the given engine.
 
-            start_arabic = roman_to_arabic.get(start_roman)
-            end_arabic = roman_to_arabic.get(end_roman)
+    A page continuing the table without repeating its header is read with the columns of the
+    last page before it that has one. If there is none, the words engine falls back to text.
 
-            # remove roman numerals from dates
-            star_date = star_date.replace(start_roman, "").strip()
-            end_date = end_date.replace(end_roman, "").strip()
+    Parameters:
+        doc (pymupdf.Document): The open PDF.
+        page_num (int): The zero-based page number.
+        engine (str): "text" or "words", see ENGINES.
+        stats (dict): If given, the seconds spent in page.get_text ("get_text_seconds") and parsing
+            ("parse_seconds"), the "rows" produced and, for the text engine, the line counts of
+            extract_table_from_pdf_page are stored in it.
+        layouts (dict): The table layouts of this document's pages found so far, by page number.
+            Pass the same dict for every page of a document so earlier pages aren't read again;
+            it belongs to the open document and is dropped with it.
 
-            # add leading zero to day if needed
-            if len(star_date.split(" ")[0]) == 1:
-                star_date = "0" + star_date.split(" ")[0]
-            if len(end_date.split(" ")[0]) == 1:
-                end_date = "0" + end_date.split(" ")[0]
+    Returns:
+        list: A list of table rows extracted from the page.
 
-            row[-2] = star_date + "." + start_arabic + " - " + end_date + "." + end_arabic
+    Raises:
+        ValueError: If the engine is unknown.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown extraction engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+    page = doc[page_num]
+    start = time.perf_counter()
+    if engine == 'words':
+        if layouts is None:
+            layouts = {}
+        words = page.get_text("words")
+        layout = layouts[page_num] = find_table_layout(words)
+        previous_page_num = page_num - 1
+        while layout is None and previous_page_num >= 0:
+            previous_layout = _page_layout(doc, previous_page_num, layouts)
+            if previous_layout is not None:
+                layout = (previous_layout[0], float('-inf'))
+            previous_page_num -= 1
+        if layout is not None:
+            parse_start = time.perf_counter()
+            rows = extract_table_from_pdf_words(words, layout)
+            _record_page_stats(stats, start, parse_start, rows)
+            return rows
+
+    page_text = page.get_text("text")
+    parse_start = time.perf_counter()
+    rows = extract_table_from_pdf_page(page_text, stats)
+    _record_page_stats(stats, start, parse_start, rows)
+    return rows
 
-        elif roman_number and '-' in date:  # date like "1 - 5 VI"
-            roman = roman_number.group()
-            arabic = roman_to_arabic.get(roman)
 
-            date = date.replace(roman, '').strip()
+def _record_page_stats(stats: Optional[dict], start: float, parse_start: float, rows: list):
+    if stats is not None:
+        stats["get_text_seconds"] = parse_start - start
+        stats["parse_seconds"] = time.perf_counter() - parse_start
+        stats["rows"] = len(rows)
 
-            days = date.split(' - ')
 
-            for i, day in enumerate(days):
-                # add leading zero to day if needed
-                if len(day) == 1:
-                    day = "0" + day
-                days[i] = day + "." + arabic  # add month to day
+def format_date_strings(row: list) -> list:
+    """
+    Formats date strings in the last element of a row.
 
-            new_dates = " - ".join(days)
-            row[-2] = new_dates
-        elif roman_number and ',' in date:  # date like "1, 2 VI"
-            roman = roman_number.group()
-            arabic = roman_to_arabic.get(roman)
+    Standardizes date formatting by ensuring consistent spacing around hyphens and commas.
 
-            date = date.replace(roman, '').strip()
+    Args:
+        row: A list where the last element contains date information.
+
+    Returns:
+        The modified row with cleaned date formatting in the last element.
+    """
+    dates = row[-1]
+    dates = dates.replace("-", " - ").replace(",", ", ").replace("  ", " ").strip()
 
-            days = date.split(', ')
+    row[-1] = dates
+    return row
 
-            for i, day in enumerate(days):
-                # add leading zero to day if needed
-                if len(day) == 1:
-                    day = "0" + day
-                days[i] = day + "." + arabic  # add month to day
 
-            new_dates = ", ".join(days)
-            row[-2] = new_dates
-        elif roman_number and len(re.findall(r'[IVX]+', date)) == 1:  # date like "1 VI"
-            roman = roman_number.group()
-            arabic = roman_to_arabic.get(roman)
-            if arabic:
-                row[-2] = date.replace(roman, arabic).replace(" ", ".")
+def convert_dates_from_roman(row: list, column: int = -1) -> list:
+    """
+    Converts dates in the row from Roman numerals to the DD.MM format (e.g. "1 - 5 VI" to "01.06 - 05.06").
 
-            # add leading zero to day if needed
-            if len(row[-2].split(".")[0]) == 1:
-                row[-2] = "0" + row[-2]
-        return row
-    else:
-        return row
+    See service_days.convert_date_expression for the formats handled.
+
+    Parameters:
+        row (list): A list of strings representing a row.
+        column (int): The index of the dates: -1, or -2 once extract_date_annotations has added
+            the annotation column.
+
+    Returns:
+        list: The row with dates converted to Arabic numerals; unchanged if the dates can't be parsed.
+    """
+    try:
+        row[column] = convert_date_expression(row[column])
+    except ValueError:
+        pass  # Leave dates in an unknown format as they are
+
+    return row
 
 
 def extract_date_annotations(row: list) -> list:
@@ -243,104 +372,456 @@ def extract_date_annotations(row: list) -> list:
 
 
 
-def extract_rows_from_pdf(pdf_path: str) -> list:
+def extract_rows_from_pdf(pdf_path: str, engine: str = 'text') -> Iterator[list]:
     """
-    Processes a PDF file and returns the extracted table rows.
+    Processes a PDF file and yields the extracted table rows, one page at a time.
 
     Parameters:
         pdf_path (str): The path to the PDF file.
+        engine (str): The extraction engine, "text" (default) or "words", see ENGINES.
 
-    Returns:
-        list: A list of table rows extracted from the PDF.
+    Yields:
+        list: The table rows extracted from the PDF, in page order.
     """
     try:
         doc = pymupdf.open(pdf_path)
     except Exception as e:
         print(f"Error opening PDF file {pdf_path}: {e}")
-        return []
+        return
 
-    all_rows = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        rows = extract_table_from_pdf_page(page.get_text("text"))
-        all_rows.extend(rows)
+    with doc:
+        layouts = {}
+        for page_num in range(len(doc)):
+            yield from extract_rows_from_page(doc, page_num, engine, layouts=layouts)
 
-    return all_rows
 
+# The document opened by extract_page_rows with its page layouts, kept per process so a worker opens
+# a PDF only once. Pages are handed out in PDF order, so only the current PDF is kept open.
+_open_documents = {}
 
-def extract_rows_from_all_pdfs(source_dir='data/pdf') -> list:
+
+def extract_page_rows(pdf_path: str, page_num: int, engine: str = 'text') -> list:
+    """
+    Extracts the table rows from a single page of a PDF file.
+
+    Used as the unit of work of the process pool in extract_rows_from_all_pdfs.
+
+    Parameters:
+        pdf_path (str): The path to the PDF file.
+        page_num (int): The zero-based page number.
+        engine (str): The extraction engine, see ENGINES.
+
+    Returns:
+        list: A list of table rows extracted from the page.
+    """
+    if pdf_path not in _open_documents:
+        for previous_doc, _ in _open_documents.values():
+            previous_doc.close()
+        _open_documents.clear()
+        _open_documents[pdf_path] = (pymupdf.open(pdf_path), {})
+    doc, layouts = _open_documents[pdf_path]
+    return extract_rows_from_page(doc, page_num, engine, layouts=layouts)
+
+
+def list_pdf_files(source_dir: str) -> list:
+    """Returns the paths of all PDF files in the directory, sorted by name so the output order is stable."""
+    return [os.path.join(source_dir, file) for file in sorted(os.listdir(source_dir)) if file.endswith('.pdf')]
+
+
+class ExtractionCache:
+    """
+    A sidecar cache of the rows extracted from each PDF, one JSON file per PDF.
+
+    Entries are keyed by the SHA-256 of the PDF's content plus PARSER_VERSION and the engine,
+    so a renamed PDF is still served from cache while a changed PDF or a new parser version is
+    extracted again. Each engine keeps its own entries.
+    """
+
+    def __init__(self, cache_dir: str, engine: str = 'text'):
+        self.cache_dir = cache_dir
+        self.engine = engine
+        self._entry_names = {}  # pdf path -> cache file name
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _entry_path(self, pdf_path: str) -> str:
+        name = self._entry_names.get(pdf_path)
+        if name is None:
+            name = self._entry_names[pdf_path] = f"{self.file_hash(pdf_path)}-v{PARSER_VERSION}-{self.engine}.json"
+        return os.path.join(self.cache_dir, name)
+
+    def contains(self, pdf_path: str) -> bool:
+        return os.path.exists(self._entry_path(pdf_path))
+
+    def load(self, pdf_path: str):
+        """Return the cached rows of the PDF, or None if it has to be extracted."""
+        try:
+            with open(self._entry_path(pdf_path), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, pdf_path: str, rows: list):
+        entry_path = self._entry_path(pdf_path)
+        tmp_path = entry_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(rows, file, ensure_ascii=False)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"Error writing extraction cache {entry_path}: {e}")
+
+    def prune(self):
+        """Delete this engine's entries of PDFs that are no longer present and all entries of older parsers."""
+        in_use = set(self._entry_names.values())
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json') or name in in_use:
+                continue
+            if name.endswith(f"-{self.engine}.json") or f"-v{PARSER_VERSION}-" not in name:
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def extract_rows_from_all_pdfs(source_dir='data/pdf', workers=None, cache_dir=None, engine='text') -> list:
     """
     Extracts rows from all PDF files in the specified source directory.
 
     Parameters:
         source_dir (str): The directory containing PDF files.
+        workers (int): The number of worker processes; None or 1 parses in this process.
+        cache_dir (str): The directory of the extraction cache; None disables caching.
+        engine (str): The extraction engine, see ENGINES.
 
     Returns:
         list: A list of all rows extracted from all PDF files in the source directory.
     """
-    all_rows = []
+    return list(iter_rows_from_all_pdfs(source_dir, workers, cache_dir, engine))
+
 
-    for file in os.listdir(source_dir):
-        if file.endswith('.pdf'):
-            pdf_path = os.path.join(source_dir, file)
-            rows = extract_rows_from_pdf(pdf_path)
-            all_rows.extend(rows)
+def iter_rows_from_all_pdfs(source_dir='data/pdf', workers=None, cache_dir=None, engine='text') -> Iterator[list]:
+    """
+    Yields the rows of all PDF files in the specified source directory, in file/page order.
 
-    return all_rows
+    With more than one worker the pages of all PDFs are parsed in a process pool and the results
+    are merged back in file/page order, so the rows are identical to the serial run.
+    With a cache directory only PDFs whose content (or the parser) changed are parsed at all.
+    At most one PDF's rows are held in memory at a time (to store them in the cache).
 
+    Parameters:
+        source_dir (str): The directory containing PDF files.
+        workers (int): The number of worker processes; None or 1 parses in this process.
+        cache_dir (str): The directory of the extraction cache; None disables caching.
+        engine (str): The extraction engine, see ENGINES.
 
-def write_rows_to_csv(rows, output_csv='data/csv/KM_table_current.csv') -> None:
+    Yields:
+        list: The extracted rows.
+    """
+    pdf_paths = list_pdf_files(source_dir)
+    cache = ExtractionCache(cache_dir, engine) if cache_dir else None
+    cached = {pdf_path for pdf_path in pdf_paths if cache and cache.contains(pdf_path)}
+    extracted = iter_rows_per_pdf([pdf_path for pdf_path in pdf_paths if pdf_path not in cached], workers, engine)
+
+    for pdf_path in pdf_paths:
+        if pdf_path in cached:
+            cached_rows = cache.load(pdf_path)
+            if cached_rows is not None:
+                yield from cached_rows
+                continue
+            # The entry is unreadable, parse the PDF here instead
+            rows = extract_rows_from_pdf(pdf_path, engine)
+        else:
+            _, rows = next(extracted)
+
+        if not cache:
+            yield from rows
+            continue
+
+        # Later stages modify rows in place, so the cache gets copies
+        rows_to_cache = []
+        for row in rows:
+            rows_to_cache.append(list(row))
+            yield row
+        cache.store(pdf_path, rows_to_cache)
+
+    if cache:
+        cache.prune()
+
+
+def iter_rows_per_pdf(pdf_paths: list, workers=None, engine='text') -> Iterator[Tuple[str, Iterator[list]]]:
+    """
+    Yields (pdf_path, rows) for each PDF, parsed serially or with all pages spread over a process pool.
+
+    The rows of a PDF must be consumed before advancing to the next PDF.
+
+    Parameters:
+        pdf_paths (list): The PDF files to extract.
+        workers (int): The number of worker processes; None or 1 parses in this process.
+        engine (str): The extraction engine, see ENGINES.
+    """
+    if not workers or workers < 2:
+        for pdf_path in pdf_paths:
+            yield pdf_path, extract_rows_from_pdf(pdf_path, engine)
+        return
+
+    page_counts = []
+    for pdf_path in pdf_paths:
+        try:
+            with pymupdf.open(pdf_path) as doc:
+                page_counts.append(len(doc))
+        except Exception as e:
+            print(f"Error opening PDF file {pdf_path}: {e}")
+            page_counts.append(0)
+
+    pages = [(pdf_path, page_num, engine) for pdf_path, page_count in zip(pdf_paths, page_counts)
+             for page_num in range(page_count)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        page_results = _ordered_imap(executor, extract_page_rows, pages, window=workers * 4)
+
+        def rows_of(page_count):
+            for _ in range(page_count):
+                yield from next(page_results)
+
+        for pdf_path, page_count in zip(pdf_paths, page_counts):
+            yield pdf_path, rows_of(page_count)
+
+
+def _ordered_imap(executor, func, args_list: list, window: int) -> Iterator:
+    """Like executor.map, but with at most window tasks in flight so finished results never pile up."""
+    args_iter = iter(args_list)
+    pending = deque(executor.submit(func, *args) for args in islice(args_iter, window))
+    while pending:
+        result = pending.popleft().result()
+        next_args = next(args_iter, None)
+        if next_args is not None:
+            pending.append(executor.submit(func, *next_args))
+        yield result
+
+
+class ConversionProfile:
+    """
+    Instruments a conversion: records the get_text and parse time, the rows produced and the lines
+    skipped by SKIPPED_LINE_PATTERN for every page of every PDF, and writes them as a JSON report
+    to show which PDFs and page layouts are slow to parse.
+
+    iter_rows extracts the PDFs in this process and without the extraction cache, so every page is
+    parsed and timed, and cProfile sees the parser.
+    """
+
+    SLOWEST_PAGES = 20  # pages listed in the report's "slowest_pages", by parse time
+
+    def __init__(self, engine: str = 'text'):
+        self.engine = engine
+        self.pdfs = []  # {"file": pdf path, "pages": [page stats, ...]} in extraction order
+
+    def iter_rows(self, pdf_paths: list) -> Iterator[list]:
+        """Yields the rows of the PDFs like iter_rows_from_all_pdfs, recording the stats of each page."""
+        for pdf_path in pdf_paths:
+            pdf = {"file": pdf_path, "pages": []}
+            self.pdfs.append(pdf)
+            try:
+                doc = pymupdf.open(pdf_path)
+            except Exception as e:
+                print(f"Error opening PDF file {pdf_path}: {e}")
+                pdf["error"] = str(e)
+                continue
+
+            with doc:
+                layouts = {}
+                for page_num in range(len(doc)):
+                    stats = {"page": page_num}
+                    rows = extract_rows_from_page(doc, page_num, self.engine, stats, layouts)
+                    pdf["pages"].append(stats)
+                    yield from rows
+
+    @staticmethod
+    def _page_entry(stats: dict) -> dict:
+        entry = {"page": stats["page"],
+                 "get_text_ms": round(stats["get_text_seconds"] * 1000, 3),
+                 "parse_ms": round(stats["parse_seconds"] * 1000, 3),
+                 "rows": stats["rows"]}
+        for key in ("lines", "skipped_lines"):
+            if key in stats:
+                entry[key] = stats[key]
+        return entry
+
+    @staticmethod
+    def _totals(entries: list) -> dict:
+        totals = {"pages": len(entries),
+                  "get_text_ms": round(sum(entry["get_text_ms"] for entry in entries), 3),
+                  "parse_ms": round(sum(entry["parse_ms"] for entry in entries), 3),
+                  "rows": sum(entry["rows"] for entry in entries)}
+        for key in ("lines", "skipped_lines"):  # only counted by the text engine
+            values = [entry[key] for entry in entries if key in entry]
+            if values:
+                totals[key] = sum(values)
+        return totals
+
+    def report(self) -> dict:
+        """Return the report: totals, per-PDF totals with their pages, and the slowest pages overall."""
+        pdfs = []
+        all_pages = []
+        for pdf in self.pdfs:
+            pages = [self._page_entry(stats) for stats in pdf["pages"]]
+            pdf_entry = {"file": pdf["file"], **self._totals(pages)}
+            if "error" in pdf:
+                pdf_entry["error"] = pdf["error"]
+            pdf_entry["page_stats"] = pages
+            pdfs.append(pdf_entry)
+            all_pages.extend({"file": pdf["file"], **page} for page in pages)
+
+        return {
+            "time": datetime.now().isoformat(timespec='seconds'),
+            "engine": self.engine,
+            "totals": {"pdfs": len(pdfs), **self._totals(all_pages)},
+            "pdfs": pdfs,
+            "slowest_pages": sorted(all_pages, key=lambda page: page["parse_ms"], reverse=True)[:self.SLOWEST_PAGES],
+        }
+
+    def write(self, report_path: str):
+        """Write the report as JSON to report_path, replacing it atomically."""
+        report_dir = os.path.dirname(report_path)
+        tmp_path = report_path + '.tmp'
+        try:
+            if report_dir:
+                os.makedirs(report_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.report(), file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, report_path)
+        except OSError as e:
+            print(f"Error writing conversion profile {report_path}: {e}")
+
+
+def write_rows_to_csv(rows, output_csv='data/csv/KM_table_current.csv') -> bool:
     """
     Writes the provided rows to a CSV file.
 
+    Rows are streamed into a temporary file next to output_csv, which then atomically replaces it,
+    so readers never see a half-written CSV.
+
     Parameters:
-        rows (list): The list of rows to write to the CSV file.
+        rows (iterable): The rows to write to the CSV file; may be a generator.
         output_csv (str): The path where the CSV file will be saved.
+
+    Returns:
+        bool: Whether output_csv was replaced; on an error the previous CSV is left as it was.
     """
     # Ensure the output directory exists
     output_dir = os.path.dirname(output_csv)
-    if not os.path.exists(output_dir):
+    if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    tmp_path = output_csv + '.tmp'
     try:
-        with open(output_csv, "w", newline="", encoding="utf-8") as csv_file:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as csv_file:
             writer = csv.writer(csv_file, delimiter=";")
-            for row in rows:
-                writer.writerow(row)
+            writer.writerows(rows)
+        os.replace(tmp_path, output_csv)
         print(f"All data combined and saved to {output_csv}.")
+        return True
     except Exception as e:
         print(f"Error writing to CSV {output_csv}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
 
 
-def convert_all_pdfs_to_single_csv(source_dir='data/pdf', output_csv='data/csv/KM_table_current.csv') -> None:
+def process_dates(rows: Iterable[list]) -> Iterator[list]:
     """
-    Converts all PDF files in the specified source directory to a single CSV file.
+    Formats the dates of each row and moves their annotations to a separate column, lazily.
 
-    This function combines the functionality of extract_rows_from_all_pdfs and write_rows_to_csv.
-    The process includes extracting data from PDFs, formatting dates, converting Roman numerals,
-    extracting date annotations, and writing the final data to a CSV file.
+    The dates stay in KM's Roman-numeral form: km_bot shows them to users as the PDFs write them and
+    service_days parses them directly, so convert_dates_from_roman is not part of the pipeline.
 
     Parameters:
-        source_dir (str): The directory containing PDF files.
-        output_csv (str): The path where the combined CSV file will be saved.
-    """
-    all_rows = extract_rows_from_all_pdfs(source_dir)
+        rows (iterable): The extracted rows; empty rows are skipped.
 
-    # Process dates and extract annotations
-    processed_rows = []
-    for row in all_rows:
+    Yields:
+        list: The processed rows.
+    """
+    for row in rows:
         if row:  # Skip empty rows
             row = format_date_strings(row)
             row = extract_date_annotations(row)
-            # row = convert_dates_from_roman(row)
-            processed_rows.append(row)
+            yield row
+
+
+def convert_all_pdfs_to_single_csv(source_dir='data/pdf', output_csv='data/csv/KM_table_current.csv',
+                                   workers=None, cache_dir=None, engine='text', snapshot=True,
+                                   profile_report=None, profile_dump=None) -> None:
+    """
+    Converts all PDF files in the specified source directory to a single CSV file.
+
+    This function chains iter_rows_from_all_pdfs, process_dates and write_rows_to_csv as generator
+    stages, so rows flow from PDF pages to the CSV without the whole dataset being held in memory.
+    The process includes extracting data from PDFs, formatting dates, extracting date annotations,
+    and writing the final data to a CSV file. Next to the CSV a binary snapshot of the timetable's
+    indexes is written, which km_bot maps on start instead of parsing the CSV.
+
+    With profile_report or profile_dump the conversion is instrumented (see ConversionProfile):
+    the PDFs are parsed serially and without the cache, whatever workers and cache_dir are.
 
-    write_rows_to_csv(processed_rows, output_csv)
+    Parameters:
+        source_dir (str): The directory containing PDF files.
+        output_csv (str): The path where the combined CSV file will be saved.
+        workers (int): The number of worker processes used to parse PDF pages; None parses serially.
+        cache_dir (str): The directory caching the rows of unchanged PDFs; None disables caching.
+        engine (str): The extraction engine, "text" (default) or "words", see ENGINES.
+        snapshot (bool): Whether to write the snapshot (see snapshot.write_snapshot) next to the CSV.
+        profile_report (str): Where to write the JSON report of per-PDF and per-page timings; None for no report.
+        profile_dump (str): Where to write a cProfile dump of the extraction and CSV writing; None for no dump.
+    """
+    profile = ConversionProfile(engine) if profile_report or profile_dump else None
+    profiler = cProfile.Profile() if profile_dump else None
 
+    if profile:
+        rows = profile.iter_rows(list_pdf_files(source_dir))
+    else:
+        rows = iter_rows_from_all_pdfs(source_dir, workers, cache_dir, engine)
+
+    if profiler:
+        profiler.enable()
+    try:
+        csv_written = write_rows_to_csv(process_dates(rows), output_csv)
+    finally:
+        if profiler:
+            profiler.disable()
+
+    if profile_report:
+        profile.write(profile_report)
+        print(f"Conversion profile saved to {profile_report}.")
+    if profile_dump:
+        try:
+            profiler.dump_stats(profile_dump)
+            print(f"cProfile dump saved to {profile_dump}.")
+        except OSError as e:
+            print(f"Error writing cProfile dump {profile_dump}: {e}")
+
+    # The snapshot is only rewritten for a new CSV, never rebuilt from the one a failed run left behind
+    if snapshot and csv_written:
+        try:
+            snapshot_path = write_snapshot(Timetable.from_csv(output_csv), output_csv)
+            print(f"Timetable snapshot saved to {snapshot_path}.")
+        except OSError as e:
+            print(f"Error writing timetable snapshot for {output_csv}: {e}")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converts the KM timetable PDFs to a single CSV file.")
+    parser.add_argument('--engine', choices=ENGINES, default='text', help='the extraction engine')
+    parser.add_argument('--profile', metavar='REPORT',
+                        help='instrument the conversion and write per-PDF and per-page timings as JSON to REPORT')
+    parser.add_argument('--cprofile', metavar='DUMP', help='write a cProfile dump of the conversion to DUMP')
+    args = parser.parse_args()
+
     start = time.time()
-    convert_all_pdfs_to_single_csv('data/pdf')
+    convert_all_pdfs_to_single_csv('data/pdf', workers=os.cpu_count(), cache_dir='data/cache/pdf_rows',
+                                   engine=args.engine, profile_report=args.profile, profile_dump=args.cprofile)
     end = time.time()
-    print(f"Time taken: {end - start:.2f} seconds.")
\ No newline at end of file
+    print(f"Time taken: {end - start:.2f} seconds.")
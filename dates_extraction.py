@@ -1,5 +1,8 @@
 import csv
 import os
+import time
+
+from service_days import convert_date_expression
 
 def extract_unique_dates(csv_path='data/csv/KM_table_current.csv'):
     """
@@ -30,10 +33,38 @@ def extract_unique_dates(csv_path='data/csv/KM_table_current.csv'):
 
     return list(unique_dates)
 
+def convert_dates(dates):
+    """
+    Converts date strings to the DD.MM format locally, with the date grammar of service_days.
+
+    Parameters:
+        dates (list): The date strings, e.g. from extract_unique_dates
+
+    Returns:
+        tuple: A dict mapping each converted date to its DD.MM form and a list of the dates
+        the grammar can't parse
+    """
+    converted = {}
+    unconverted = []
+
+    for date_entry in dates:
+        try:
+            converted[date_entry] = convert_date_expression(date_entry)
+        except ValueError:
+            unconverted.append(date_entry)
+
+    return converted, unconverted
+
 def main():
     dates = extract_unique_dates()
     print(f"Found {len(dates)} unique date formats.")
-    print(dates)
+
+    start = time.perf_counter()
+    converted, unconverted = convert_dates(dates)
+    elapsed = time.perf_counter() - start
+    print(f"Converted {len(converted)} locally in {elapsed * 1000:.1f} ms.")
+    if unconverted:
+        print(f"Not recognized ({len(unconverted)}): {unconverted}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
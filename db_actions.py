@@ -1,26 +1,248 @@
+import argparse
+import csv
+import hashlib
+import os
 import sqlite3
-from typing import List, Tuple, Optional
+from collections import Counter
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+
+from service_days import ServiceCalendar, parse_date_expression, runs_with_annotation, split_annotation
+from timetable import TRAIN_NUMBER_PATTERN, expand_train_numbers, parse_time
+
+# start_date and end_date are ISO dates (NULL if the CSV's dates can't be parsed), annotation is the code
+# without brackets (e.g. "D" or "1-5", NULL if there is none) and departure_minutes the departure time
+# in minutes after midnight
+TRAIN_SCHEDULE_COLUMNS = ("train_nr", "departure_station", "departure_time", "arrival_station", "arrival_time",
+                          "train_model", "count", "start_date", "end_date", "annotation", "departure_minutes")
+ANNOTATION_COLUMN = TRAIN_SCHEDULE_COLUMNS.index("annotation")
+# A row's key is its content_key plus its occurrence, counting rows with the same content before it (see _keyed_rows)
+INSERT_TRAIN_SCHEDULE = (f"INSERT INTO train_schedule (content_key, occurrence, {', '.join(TRAIN_SCHEDULE_COLUMNS)})"
+                         f" VALUES (?, ?, {', '.join('?' for _ in TRAIN_SCHEDULE_COLUMNS)})")
+BULK_CHUNK_SIZE = 50000  # rows inserted per executemany call and transaction
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')  # WAL lets km_bot read while a load is running
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL is crash-safe in WAL mode
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # pages, or KiB if negative (64 MiB)
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Schema migrations, applied in order to bring a database from PRAGMA user_version to SCHEMA_VERSION.
+# Each runs in its own transaction together with setting user_version, so it is applied fully or not at all.
+SCHEMA_MIGRATIONS = [
+    # 1: typed train_schedule with the lookup indexes, keeping the rows of a table created by hand before
+    """
+    CREATE TABLE IF NOT EXISTS train_schedule (
+        train_nr, departure_station, departure_time, arrival_station, arrival_time,
+        train_model, count, start_date, end_date
+    );
+    CREATE TABLE train_schedule_typed (
+        id INTEGER PRIMARY KEY,
+        train_nr TEXT NOT NULL,
+        departure_station TEXT NOT NULL,
+        departure_time TEXT NOT NULL,
+        arrival_station TEXT NOT NULL,
+        arrival_time TEXT NOT NULL,
+        train_model TEXT NOT NULL,
+        count TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL
+    );
+    INSERT INTO train_schedule_typed (train_nr, departure_station, departure_time, arrival_station, arrival_time,
+                                      train_model, count, start_date, end_date)
+        SELECT train_nr, departure_station, departure_time, arrival_station, arrival_time,
+               train_model, count, start_date, end_date FROM train_schedule;
+    DROP TABLE train_schedule;
+    ALTER TABLE train_schedule_typed RENAME TO train_schedule;
+    CREATE INDEX idx_train_schedule_train_nr ON train_schedule (train_nr);
+    CREATE INDEX idx_train_schedule_route ON train_schedule (departure_station, arrival_station, departure_time);
+    CREATE INDEX idx_train_schedule_dates ON train_schedule (start_date, end_date);
+    """,
+    # 2: content keys for diff loads; rows inserted before have none and are replaced by the first diff load
+    """
+    ALTER TABLE train_schedule ADD COLUMN content_key TEXT;
+    ALTER TABLE train_schedule ADD COLUMN occurrence INTEGER;
+    CREATE UNIQUE INDEX idx_train_schedule_key ON train_schedule (content_key, occurrence);
+    """,
+    # 3: service dates as ISO dates with the annotation code, departure times in minutes, and indexes for range
+    # scans on them. The raw dates of existing rows can't be converted in SQL, so they are kept without dates
+    # and keys and are replaced by the next diff load.
+    """
+    CREATE TABLE train_schedule_dated (
+        id INTEGER PRIMARY KEY,
+        content_key TEXT,
+        occurrence INTEGER,
+        train_nr TEXT NOT NULL,
+        departure_station TEXT NOT NULL,
+        departure_time TEXT NOT NULL,
+        departure_minutes INTEGER,
+        arrival_station TEXT NOT NULL,
+        arrival_time TEXT NOT NULL,
+        train_model TEXT NOT NULL,
+        count TEXT NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        annotation TEXT
+    );
+    INSERT INTO train_schedule_dated (train_nr, departure_station, departure_time, arrival_station, arrival_time,
+                                      train_model, count)
+        SELECT train_nr, departure_station, departure_time, arrival_station, arrival_time, train_model, count
+        FROM train_schedule;
+    DROP TABLE train_schedule;
+    ALTER TABLE train_schedule_dated RENAME TO train_schedule;
+    CREATE INDEX idx_train_schedule_train_nr ON train_schedule (train_nr, start_date);
+    CREATE INDEX idx_train_schedule_route ON train_schedule (departure_station, arrival_station, departure_minutes);
+    CREATE INDEX idx_train_schedule_dates ON train_schedule (start_date, end_date);
+    CREATE UNIQUE INDEX idx_train_schedule_key ON train_schedule (content_key, occurrence);
+    """,
+]
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
+
+# The rows of a CSV being loaded as a diff, keyed like train_schedule
+INCOMING_SCHEDULE_TABLE = f"""
+    CREATE TEMP TABLE incoming_schedule (
+        content_key TEXT NOT NULL, occurrence INTEGER NOT NULL, {', '.join(TRAIN_SCHEDULE_COLUMNS)},
+        PRIMARY KEY (content_key, occurrence)
+    )
+"""
+INSERT_INCOMING_SCHEDULE = INSERT_TRAIN_SCHEDULE.replace("train_schedule", "incoming_schedule")
+RETIRE_REMOVED_ROWS = """
+    DELETE FROM train_schedule WHERE NOT EXISTS (
+        SELECT 1 FROM incoming_schedule AS incoming
+        WHERE incoming.content_key = train_schedule.content_key AND incoming.occurrence = train_schedule.occurrence
+    )
+"""
+INSERT_NEW_ROWS = f"""
+    INSERT INTO train_schedule (content_key, occurrence, {', '.join(TRAIN_SCHEDULE_COLUMNS)})
+    SELECT content_key, occurrence, {', '.join(TRAIN_SCHEDULE_COLUMNS)} FROM incoming_schedule AS incoming
+    WHERE NOT EXISTS (
+        SELECT 1 FROM train_schedule AS current
+        WHERE current.content_key = incoming.content_key AND current.occurrence = incoming.occurrence
+    )
+"""
+
+
+def content_key(row: tuple) -> str:
+    """Return a stable key of a train_schedule row's values: the hex BLAKE2b digest of the values joined."""
+    text = '\x1f'.join('' if value is None else str(value) for value in row)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _keyed_rows(rows: Iterable[Tuple[str, ...]], occurrences: Optional[Counter] = None) -> Iterator[tuple]:
+    """
+    Prefix each row with its content key and occurrence.
+
+    The occurrence is counted in Python, so inserting a row doesn't need a lookup of the rows with
+    the same key in the table.
+
+    Parameters:
+        rows (iterable): Tuples of values in TRAIN_SCHEDULE_COLUMNS order.
+        occurrences (Counter): The number of rows already stored per content key; counting starts there.
+    """
+    occurrences = Counter() if occurrences is None else occurrences
+    for row in rows:
+        key = content_key(row)
+        yield (key, occurrences[key], *row)
+        occurrences[key] += 1
+
+
+# The lookups km_bot makes, each a range scan on one of the indexes above. Dates are ISO dates; whether
+# the annotation lets a train run on the day is checked on the rows found.
+TRAIN_ON_DATE_QUERY = (f"SELECT {', '.join(TRAIN_SCHEDULE_COLUMNS)} FROM train_schedule"
+                       f" WHERE train_nr = ? AND start_date <= ? AND end_date >= ?")
+DEPARTURES_QUERY = (f"SELECT {', '.join(TRAIN_SCHEDULE_COLUMNS)} FROM train_schedule"
+                    f" WHERE departure_station = ? AND arrival_station = ? AND departure_minutes >= ?"
+                    f" AND start_date <= ? AND end_date >= ? ORDER BY departure_minutes")
+RUNNING_ON_DATE_QUERY = (f"SELECT {', '.join(TRAIN_SCHEDULE_COLUMNS)} FROM train_schedule"
+                         f" WHERE start_date <= ? AND end_date >= ?")
 
 
 class DatabaseManager:
-    def __init__(self, db_file: str = None):
-        """Initialize the DatabaseManager with an optional database file path."""
+    def __init__(self, db_file: str = None, journal_mode: str = SQLITE_JOURNAL_MODE,
+                 synchronous: str = SQLITE_SYNCHRONOUS, cache_size: int = SQLITE_CACHE_SIZE,
+                 reference: Optional[date] = None):
+        """
+        Initialize the DatabaseManager with an optional database file path.
+
+        Parameters:
+            db_file (str): The SQLite database to connect to; None to connect later.
+            journal_mode (str): The journal_mode pragma, one of JOURNAL_MODES.
+            synchronous (str): The synchronous pragma, one of SYNCHRONOUS_LEVELS.
+            cache_size (int): The cache_size pragma, in pages, or in KiB if negative.
+            reference (date): The day the years of loaded dates are resolved around (see ServiceCalendar);
+                today if None.
+
+        Raises:
+            ValueError: If a pragma value is not one of the allowed values.
+        """
+        if journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode '{journal_mode}', expected one of {', '.join(JOURNAL_MODES)}")
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level '{synchronous}', "
+                             f"expected one of {', '.join(SYNCHRONOUS_LEVELS)}")
+
         self.db_file = db_file
+        self.journal_mode = journal_mode.upper()
+        self.synchronous = synchronous.upper()
+        self.cache_size = int(cache_size)
+        self.calendar = ServiceCalendar(reference)
+        self._service_dates: Dict[Tuple[str, str], tuple] = {}
         self.connection = None
 
         if db_file:
             self.connect(db_file)
 
     def connect(self, db_file: str) -> sqlite3.Connection:
-        """Create a database connection to the SQLite database specified by db_file."""
+        """
+        Create a database connection to the SQLite database specified by db_file.
+
+        The pragmas are applied and the schema is created or migrated to SCHEMA_VERSION.
+        """
         try:
             self.connection = sqlite3.connect(db_file)
             self.db_file = db_file
+            self.connection.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+            self.connection.execute(f"PRAGMA synchronous = {self.synchronous}")
+            self.connection.execute(f"PRAGMA cache_size = {self.cache_size}")
+            self.migrate()
             return self.connection
         except sqlite3.Error as e:
             print(f"Error connecting to database: {e}")
             return None
 
+    def schema_version(self) -> int:
+        """Return the schema version of the database, 0 if it was never migrated."""
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self) -> int:
+        """
+        Apply the SCHEMA_MIGRATIONS the database is missing, each in its own transaction.
+
+        Returns:
+            int: The schema version of the database afterwards.
+
+        Raises:
+            ValueError: If the database was created by a newer version with a schema this one doesn't know.
+        """
+        version = self.schema_version()
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"Database schema version {version} is newer than the supported {SCHEMA_VERSION}")
+
+        for version in range(version + 1, SCHEMA_VERSION + 1):
+            try:
+                self.connection.executescript(
+                    f"BEGIN; {SCHEMA_MIGRATIONS[version - 1]}; PRAGMA user_version = {version}; COMMIT;")
+            except sqlite3.Error:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                raise
+        return self.schema_version()
+
+    def explain(self, query: str, parameters: tuple = ()) -> List[str]:
+        """Return the steps of SQLite's query plan for the query, e.g. "SEARCH train_schedule USING INDEX ..."."""
+        return [row[3] for row in self.connection.execute(f"EXPLAIN QUERY PLAN {query}", parameters)]
+
     def close(self):
         """Close the database connection if it exists."""
         if self.connection:
@@ -28,128 +250,220 @@ class DatabaseManager:
             self.connection = None
 
     def convert_to_inserts(self, csv_file: str) -> List[str]:
-        """Convert CSV file data to SQL insert statements."""
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-
-        inserts = []
-
-        for line in lines[1:]:  # Skip header
-            if ',' in line.split(';')[5]:
-                lines_to_insert = self._split_into_two_rows(line)
-                for insert_line in lines_to_insert:
-                    inserts.extend(self._generate_sql_inserts(*self._get_values_from_row(insert_line)))
-            else:
-                # extend because _generate_sql_inserts returns a list of inserts
-                inserts.extend(self._generate_sql_inserts(*self._get_values_from_row(line)))
-
-        return inserts
-
-    @staticmethod
-    def _split_dates_into_separate_rows(line: str) -> List[str]:
-        """Split a row into multiple rows if it contains multiple dates or date ranges."""
-        values = line.strip().split(';')
-        dates = values[7].split(',')
-
-        # If there's only one date or date range, return the original line
-        if len(dates) == 1:
-            return [line]
+        """Convert CSV file data to SQL insert statements (with date splitting, see iter_rows_with_date_splitting)."""
+        return self.convert_to_inserts_with_date_splitting(csv_file)
+
+    def iter_rows_with_date_splitting(self, csv_file: str) -> Iterator[Tuple[str, ...]]:
+        """
+        Yield the train_schedule rows of a CSV file, as parameter tuples for bulk_insert.
+
+        The file is read one line at a time and each line is parsed once; see _expand_row for how
+        a CSV row becomes several train_schedule rows. Only the current line is held in memory.
+
+        Parameters:
+            csv_file (str): The timetable CSV; a header line, which older CSVs start with, is skipped.
+
+        Yields:
+            tuple: The values of a row, in TRAIN_SCHEDULE_COLUMNS order.
+        """
+        with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file, delimiter=';')
+            first_row = next(reader, None)
+            # The converter writes no header, but older CSVs start with one
+            if first_row and TRAIN_NUMBER_PATTERN.match(first_row[0].strip()):
+                yield from self._expand_row(first_row)
+            for values in reader:
+                yield from self._expand_row(values)
+
+    def iter_inserts_with_date_splitting(self, csv_file: str) -> Iterator[str]:
+        """Yield the rows of iter_rows_with_date_splitting as SQL insert statements, with quotes escaped."""
+        columns = ', '.join(TRAIN_SCHEDULE_COLUMNS)
+        for row in self.iter_rows_with_date_splitting(csv_file):
+            values = ', '.join('NULL' if value is None else str(value) if isinstance(value, int)
+                               else "'" + value.replace("'", "''") + "'" for value in row)
+            yield f"INSERT INTO train_schedule ({columns}) VALUES ({values});"
+
+    def _expand_row(self, values: List[str]) -> Iterator[tuple]:
+        """
+        Expand a CSV row into one train_schedule row per date or date range, train model and train number.
+
+        The dates are parsed with service_days.parse_date_expression and stored as ISO dates, with the
+        annotation code of the annotation column (or of the dates). Of two train models ("EN57, EN71")
+        each gets its own rows, and so does each train number of timetable.expand_train_numbers ("12345/67").
+        Rows with fewer than the eight timetable columns are skipped.
+        """
+        if len(values) < 8:
+            return
+
+        train_numbers = expand_train_numbers(values[0])
+        departure_station, departure_time, arrival_station, arrival_time, train_models, count, dates = values[1:8]
+        # a row is split only into its first two train models
+        models = [model.strip() for model in train_models.split(',')[:2]]
+        departure_minutes = parse_time(departure_time)
+        service_dates, annotation = self._parse_service_dates(dates, values[8] if len(values) > 8 else '')
+
+        for start_date, end_date in service_dates:
+            for model in models:
+                for train_nr in train_numbers:
+                    yield (train_nr, departure_station, departure_time, arrival_station, arrival_time,
+                           model, count, start_date, end_date, annotation, departure_minutes)
+
+    def _parse_service_dates(self, dates: str, annotation: str) -> tuple:
+        """
+        Parse a date column and its annotation column into ISO (start, end) dates and the annotation code.
+
+        An empty date column means every day, dates that can't be parsed give a single (None, None) span so
+        the row is kept but never found by date. Results are memoized per distinct pair of columns.
+        """
+        key = (dates, annotation)
+        parsed = self._service_dates.get(key)
+        if parsed is not None:
+            return parsed
 
-        # Create a new row for each date or date range
-        result_rows = []
-        for date in dates:
-            new_values = values.copy()
-            new_values[7] = date.strip()  # Replace with single date or date range
-            result_rows.append(';'.join(new_values))
+        try:
+            spans, inline_annotation = parse_date_expression(dates)
+            service_dates = [tuple(day.isoformat() for day in self.calendar.span_dates(span)) for span in spans]
+            if not spans:
+                service_dates = [(date.min.isoformat(), date.max.isoformat())]
+        except ValueError:
+            service_dates, inline_annotation = [(None, None)], None
+
+        if annotation.strip():
+            annotation = split_annotation(annotation)[1] or annotation.strip()
+        else:
+            annotation = inline_annotation
 
-        return result_rows
+        parsed = self._service_dates[key] = (service_dates, annotation)
+        return parsed
 
-    @staticmethod
-    def _generate_sql_inserts(arrival_station: str, arrival_time: str, dates: List[str], departure_station: str,
-                              departure_time: str, train_model: str, count: str, train_nr_1: str,
-                              train_nr_2: Optional[str]) -> List[str]:
-        """Generate SQL insert statements for train schedule data."""
-        generated_inserts = []
-
-        for d in dates:
-            if '-' in d:
-                d = d.split('-')
-                start_date = d[0]
-                end_date = d[1]
-            else:
-                start_date = d
-                end_date = d
-
-            insert = (
-                f"INSERT INTO train_schedule (train_nr, departure_station, departure_time, arrival_station, arrival_time, train_model, count, start_date, end_date)"
-                f" VALUES ('{train_nr_1}', '{departure_station}', '{departure_time}', '{arrival_station}', '{arrival_time}', '{train_model}', '{count}', '{start_date}', '{end_date}');")
-            generated_inserts.append(insert)
-
-            # train number 2 is not always present
-            if train_nr_2:
-                insert = (
-                    f"INSERT INTO train_schedule (train_nr, departure_station, departure_time, arrival_station, arrival_time, train_model, count, start_date, end_date)"
-                    f" VALUES ('{train_nr_2}', '{departure_station}', '{departure_time}', '{arrival_station}', '{arrival_time}', '{train_model}', '{count}', '{start_date}', '{end_date}');")
-                generated_inserts.append(insert)
-
-        return generated_inserts
-
-    def _get_values_from_row(self, line: str) -> Tuple[str, str, List[str], str, str, str, str, str, Optional[str]]:
-        """Extract values from a CSV row."""
-        values = line.strip().split(';')
-        train_nr_1, train_nr_2 = self._get_two_train_numbers(values)
-        departure_station = values[1]
-        departure_time = values[2]
-        arrival_station = values[3]
-        arrival_time = values[4]
-        train_model = values[5]
-        count = values[6]
-        date = values[7]
-        dates = date.split(',')
-
-        return arrival_station, arrival_time, dates, departure_station, departure_time, train_model, count, train_nr_1, train_nr_2
+    def insert_data(self, inserts: List[str]):
+        """Execute SQL insert statements and commit the transaction."""
+        if not self.connection:
+            raise ValueError("Database connection not established. Call connect() first.")
 
-    @staticmethod
-    def _get_two_train_numbers(values: List[str]) -> Tuple[str, Optional[str]]:
-        """Extract train numbers from values."""
-        train_nr_raw = values[0]
-        if '/' in train_nr_raw:
-            train_nr_1 = train_nr_raw.split('/')[0]
-            train_nr_2 = train_nr_raw[:4] + train_nr_raw.split('/')[1]
-        else:
-            train_nr_1 = train_nr_raw
-            train_nr_2 = None
-        return train_nr_1, train_nr_2
+        for insert in inserts:
+            self.connection.execute(insert)
+        self.connection.commit()
 
-    @staticmethod
-    def _split_into_two_rows(row_to_split: str) -> List[str]:
-        """Split a row into two if it contains multiple train models."""
-        values = row_to_split.strip().split(';')
-        train_models = values[5].split(',')
+    def bulk_insert(self, rows: Iterable[Tuple[str, ...]], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """
+        Insert train_schedule rows with executemany, one transaction per chunk_size rows.
 
-        # a safety check to make sure that the row is split only if there are two train models
-        if len(train_models) == 1:
-            return [';'.join(values)]
+        The values are bound as parameters, so station names containing quotes are stored as they are,
+        and the rows are consumed lazily, so a generator is never held in memory as a whole.
+        Each row is stored with its content_key and occurrence, so later loads can be diffed against it.
 
-        row_1 = values.copy()
-        row_2 = values.copy()
+        Parameters:
+            rows (iterable): Tuples of values in TRAIN_SCHEDULE_COLUMNS order; may be a generator.
+            chunk_size (int): The number of rows inserted and committed at a time.
 
-        row_1[5] = train_models[0]
-        row_2[5] = train_models[1]
+        Returns:
+            int: The number of rows inserted.
 
-        return [';'.join(row_1), ';'.join(row_2)]
+        Raises:
+            ValueError: If there is no database connection.
+        """
+        if not self.connection:
+            raise ValueError("Database connection not established. Call connect() first.")
 
-    def insert_data(self, inserts: List[str]):
-        """Execute SQL insert statements and commit the transaction."""
+        # Rows already in the table count towards the occurrences; a fresh table has none
+        occurrences = Counter(dict(self.connection.execute(
+            "SELECT content_key, COUNT(*) FROM train_schedule WHERE content_key IS NOT NULL GROUP BY content_key")))
+        rows = _keyed_rows(rows, occurrences)
+        inserted = 0
+        while True:
+            with self.connection:
+                chunk_inserted = self.connection.executemany(INSERT_TRAIN_SCHEDULE, islice(rows, chunk_size)).rowcount
+            inserted += chunk_inserted
+            if chunk_inserted < chunk_size:
+                return inserted
+
+    def load_csv(self, csv_file: str, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Bulk load a CSV file into train_schedule with date splitting and return the number of rows inserted."""
+        return self.bulk_insert(self.iter_rows_with_date_splitting(csv_file), chunk_size)
+
+    def load_csv_diff(self, csv_file: str) -> dict:
+        """
+        Load a CSV file as a diff against train_schedule, in a single transaction.
+
+        Rows are matched by content_key and occurrence: rows of the CSV not in the table are inserted,
+        rows of the table no longer in the CSV are retired (deleted) and the rest is left alone, so a
+        small correction of the timetable touches only the rows it changes. The CSV is staged in a
+        temporary table, keeping memory flat.
+
+        Parameters:
+            csv_file (str): The timetable CSV, expanded like iter_rows_with_date_splitting.
+
+        Returns:
+            dict: The number of rows "inserted", "retired" and "unchanged".
+
+        Raises:
+            ValueError: If there is no database connection.
+        """
         if not self.connection:
             raise ValueError("Database connection not established. Call connect() first.")
 
-        for insert in inserts:
-            self.connection.execute(insert)
-        self.connection.commit()
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS temp.incoming_schedule")
+            self.connection.execute(INCOMING_SCHEDULE_TABLE)
+            incoming = self.connection.executemany(
+                INSERT_INCOMING_SCHEDULE, _keyed_rows(self.iter_rows_with_date_splitting(csv_file))).rowcount
+            retired = self.connection.execute(RETIRE_REMOVED_ROWS).rowcount
+            inserted = self.connection.execute(INSERT_NEW_ROWS).rowcount
+            self.connection.execute("DROP TABLE temp.incoming_schedule")
+
+        return {"inserted": inserted, "retired": retired, "unchanged": incoming - inserted}
+
+    def find_train(self, train_nr: str, day: date) -> List[tuple]:
+        """
+        Return the rows of a train that runs on the given day.
+
+        A range scan of idx_train_schedule_train_nr finds the rows whose service dates include the day,
+        of which those whose annotation doesn't allow running on it are dropped.
+
+        Parameters:
+            train_nr (str): A 5-digit train number.
+            day (date): The day the train has to run on.
+
+        Returns:
+            list: The rows, as tuples in TRAIN_SCHEDULE_COLUMNS order.
+        """
+        iso_day = day.isoformat()
+        return [row for row in self.connection.execute(TRAIN_ON_DATE_QUERY, (train_nr, iso_day, iso_day))
+                if runs_with_annotation(row[ANNOTATION_COLUMN], day)]
+
+    def find_departures(self, departure_station: str, arrival_station: str, minutes: int, day: date,
+                        limit: int = 5) -> List[tuple]:
+        """
+        Return the next departures between two stations from the given time on that run on the given day.
+
+        A range scan of idx_train_schedule_route reads the departures in time order, so only as many
+        rows are read as it takes to find limit trains running on the day.
+
+        Parameters:
+            departure_station (str): The departure station name as written in the timetable.
+            arrival_station (str): The arrival station name as written in the timetable.
+            minutes (int): The earliest departure time in minutes after midnight.
+            day (date): The day the departures have to run on.
+            limit (int): The maximum number of departures to return.
+
+        Returns:
+            list: The rows, as tuples in TRAIN_SCHEDULE_COLUMNS order, earliest departure first.
+        """
+        iso_day = day.isoformat()
+        cursor = self.connection.execute(DEPARTURES_QUERY, (departure_station, arrival_station, minutes,
+                                                            iso_day, iso_day))
+        departures = []
+        for row in cursor:
+            if runs_with_annotation(row[ANNOTATION_COLUMN], day):
+                departures.append(row)
+                if len(departures) == limit:
+                    break
+        cursor.close()
+        return departures
 
     @staticmethod
-    def write_inserts_to_file(inserts: List[str], file_name: str):
+    def write_inserts_to_file(inserts: Iterable[str], file_name: str):
         """Write SQL insert statements to a file."""
         with open(file_name, 'w', encoding='utf-8') as file:
             for insert in inserts:
@@ -157,38 +471,26 @@ class DatabaseManager:
 
     def convert_to_inserts_with_date_splitting(self, csv_file: str) -> List[str]:
         """Convert CSV file data to SQL insert statements with date splitting."""
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-
-        inserts = []
-
-        for line in lines[1:]:  # Skip header
-            # First split by dates
-            date_split_rows = self._split_dates_into_separate_rows(line)
-
-            for date_row in date_split_rows:
-                # Then handle train model splitting if needed
-                if ',' in date_row.split(';')[5]:
-                    model_split_rows = self._split_into_two_rows(date_row)
-                    for model_row in model_split_rows:
-                        inserts.extend(self._generate_sql_inserts(*self._get_values_from_row(model_row)))
-                else:
-                    inserts.extend(self._generate_sql_inserts(*self._get_values_from_row(date_row)))
-
-        return inserts
+        return list(self.iter_inserts_with_date_splitting(csv_file))
 
 
 # Example usage
 if __name__ == "__main__":
-    db_manager = DatabaseManager()
+    parser = argparse.ArgumentParser(description="Loads the timetable CSV into km_bot.db.")
+    parser.add_argument('--csv', default='data/csv/KM_table_current.csv')
+    parser.add_argument('--db', default='km_bot.db')
+    parser.add_argument('--export-sql', metavar='PATH', help='also write the data as SQL insert statements to PATH')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
 
-    # Convert CSV to SQL inserts with date splitting
-    inserts = db_manager.convert_to_inserts_with_date_splitting('data/csv/KM_table_current.csv')
+    # Load the CSV with date splitting as a diff against the rows already in the database
+    counts = db_manager.load_csv_diff(args.csv)
+    print(f"Loaded {args.csv} into {args.db}: {counts['inserted']} rows inserted, {counts['retired']} retired, "
+          f"{counts['unchanged']} unchanged.")
 
-    # Write inserts to file
-    db_manager.write_inserts_to_file(inserts, 'data/inserts.sql')
+    # Optionally export the inserts to a file
+    if args.export_sql:
+        db_manager.write_inserts_to_file(db_manager.iter_inserts_with_date_splitting(args.csv), args.export_sql)
 
-    # Connect to DB and insert data
-    db_manager.connect('km_bot.db')
-    db_manager.insert_data(inserts)
-    db_manager.close()
\ No newline at end of file
+    db_manager.close()
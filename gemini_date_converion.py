@@ -1,20 +1,92 @@
+import ast
+import json
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 import dates_extraction
 
+# A converted date: "DD.MM" or "DD.MM - DD.MM" items separated by ", ", optionally followed by an annotation
+_CONVERTED_ITEM = r'\d{2}\.\d{2}(?: - \d{2}\.\d{2})?'
+CONVERTED_DATE_PATTERN = re.compile(rf'^{_CONVERTED_ITEM}(?:, {_CONVERTED_ITEM})*(?: \([^()]*\))?$')
+
+
+class DateConversionCache:
+    """
+    Persists every date the model converted, keyed by the raw date string, as a JSON file.
+
+    The timetable keeps most of its date strings from one PDF release to the next,
+    so with the cache only strings never seen before are sent to the model.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conversions = {}
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._conversions = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Error reading date conversion cache {path}: {e}")
+
+    def get(self, date):
+        """Return the cached conversion of the date, or None if it was never converted"""
+        return self._conversions.get(date)
+
+    def update(self, conversions):
+        """Add converted dates and write the cache to disk (if it has a path)"""
+        with self._lock:
+            self._conversions.update(conversions)
+            if not self.path:
+                return
+
+            output_dir = os.path.dirname(self.path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+
+            # Write to a temp file first so a crash never leaves a truncated cache behind
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(self._conversions, file, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error writing date conversion cache {self.path}: {e}")
+
+    def __contains__(self, date):
+        return date in self._conversions
+
+
 class DateConverter:
-    def __init__(self, api_key=None, model="gemini-2.0-flash-lite"):
+    def __init__(self, api_key=None, model="gemini-2.0-flash-lite", client=None,
+                 cache_path='data/cache/date_conversions.json', batch_size=50, max_concurrent_requests=4):
+        """
+        Parameters:
+            api_key (str): The Gemini API key; read from GEMINI_API_KEY if not given
+            model (str): The model converting the dates
+            client: The client sending the requests; a genai.Client if not given (tests pass a fake one)
+            cache_path (str): The JSON file caching converted dates; None keeps them in memory only
+            batch_size (int): The maximum number of dates sent in one request
+            max_concurrent_requests (int): How many requests may be in flight at the same time
+        """
         load_dotenv()
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         self.model = model
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = client or genai.Client(api_key=self.api_key)
+        self.cache = DateConversionCache(cache_path)
+        self.batch_size = batch_size
+        self.max_concurrent_requests = max_concurrent_requests
 
     @staticmethod
     def get_dates():
-        """Retrieves dates for conversion"""
-        return dates_extraction.extract_unique_dates()
+        """Retrieves the dates the local date grammar can't convert, which are left for the model"""
+        _, unconverted = dates_extraction.convert_dates(dates_extraction.extract_unique_dates())
+        return unconverted
 
     @staticmethod
     def get_system_instruction():
@@ -90,35 +162,97 @@ class DateConverter:
                 role="user",
                 parts=[
                     types.Part.from_text(
-                        text=f"Convert the following list of dates from formats with Roman numerals to the standardized DD.MM format:\n {dates}"
+                        text=f"Convert the following list of dates from formats with Roman numerals to the standardized DD.MM format:\n {json.dumps(dates, ensure_ascii=False)}"
                     ),
                 ],
             )
         ]
 
-    def convert_dates(self, dates=None, stream=True):
-        """Converts dates using Gemini model"""
-        dates = dates or self.get_dates()
-        contents = self.create_contents(dates)
-        config = self.create_content_config()
-
-        if stream:
-            return self.client.models.generate_content_stream(
-                model=self.model,
-                contents=contents,
-                config=config
-            )
-        else:
-            return self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=config
-            )
+    @staticmethod
+    def parse_response(text, dates):
+        """
+        Parses the model's output list back into a dict and validates it.
+
+        Parameters:
+            text (str): The model's response, containing a list like [ "01.06", "01.06 - 05.07" ]
+            dates (list): The dates sent in the request, in the same order
+
+        Returns:
+            dict: The raw date mapped to its conversion, for every item in the DD.MM format;
+            items that don't follow it are left out
+
+        Raises:
+            ValueError: If the response holds no list of strings as long as the request
+        """
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end < start:
+            raise ValueError("No list found in the model's response")
+
+        try:
+            converted = ast.literal_eval(text[start:end + 1])
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"The model's response is not a valid list: {e}")
+
+        if not isinstance(converted, list) or not all(isinstance(item, str) for item in converted):
+            raise ValueError("The model's response is not a list of strings")
+        if len(converted) != len(dates):
+            raise ValueError(f"Expected {len(dates)} dates, the model returned {len(converted)}")
+
+        return {date: item.strip() for date, item in zip(dates, converted)
+                if CONVERTED_DATE_PATTERN.match(item.strip())}
+
+    def request_batch(self, dates):
+        """Sends one batch of dates to the model and returns the validated conversions"""
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=self.create_contents(dates),
+            config=self.create_content_config()
+        )
+        return self.parse_response(response.text or "", dates)
+
+    def convert_dates(self, dates=None):
+        """
+        Converts dates using Gemini model, sending only the dates that aren't cached yet.
+
+        The new dates are sent in batches of at most batch_size, with up to max_concurrent_requests
+        requests at a time. Every batch is cached as soon as it's back; a failed batch is reported
+        and left out, so it's sent again on the next run.
+
+        Parameters:
+            dates (list): The dates to convert; see get_dates if not given
+
+        Returns:
+            dict: Every date converted so far (cached or new) mapped to its DD.MM form
+        """
+        dates = self.get_dates() if dates is None else dates
+        unseen = list(dict.fromkeys(date for date in dates if date not in self.cache))
+        batches = [unseen[i:i + self.batch_size] for i in range(0, len(unseen), self.batch_size)]
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+                futures = {executor.submit(self.request_batch, batch): batch for batch in batches}
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    try:
+                        converted = future.result()
+                    except Exception as e:
+                        print(f"Error converting a batch of {len(batch)} dates: {e}")
+                        continue
+                    if len(converted) < len(batch):
+                        print(f"The model returned {len(batch) - len(converted)} dates in an unexpected format")
+                    self.cache.update(converted)
+
+        return {date: self.cache.get(date) for date in dates if date in self.cache}
 
     def generate(self):
         """Generates and displays converted dates"""
-        for chunk in self.convert_dates():
-            print(chunk.text, end="")
+        dates = self.get_dates()
+        if not dates:
+            print("All dates were converted locally, nothing to send to the model.")
+            return
+
+        for date, converted in self.convert_dates(dates).items():
+            print(f"{date} -> {converted}")
 
 
 if __name__ == "__main__":
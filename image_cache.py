@@ -0,0 +1,46 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+class FileIdStore:
+    """
+    Persists the Telegram file_id of every image the bot uploaded, keyed by the image URL.
+
+    Replying with a cached file_id lets Telegram reuse the uploaded photo instead of fetching
+    the remote image again. Keying by URL means a changed image URL is simply uploaded again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_ids: Dict[str, str] = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._file_ids = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Error reading file_id store {path}: {e}")
+
+    def get(self, image_url: str) -> Optional[str]:
+        """Return the cached file_id for the image, or None if it was never uploaded."""
+        return self._file_ids.get(image_url)
+
+    def set(self, image_url: str, file_id: str):
+        """Remember the file_id of an uploaded image and write the store to disk (kept in memory if that fails)."""
+        with self._lock:
+            self._file_ids[image_url] = file_id
+            output_dir = os.path.dirname(self.path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+
+            # Write to a temp file first so a crash never leaves a truncated store behind
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._file_ids, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def __contains__(self, image_url: str) -> bool:
+        return image_url in self._file_ids
@@ -1,34 +1,52 @@
+import asyncio
+import contextvars
 import os
-from datetime import datetime
-import csv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import lru_cache
 from typing import Final
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.error import TelegramError
+from telegram.ext import Application, CommandHandler, InlineQueryHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 
+from image_cache import FileIdStore
+from response_cache import ResponseCache
+from service_days import ServiceCalendar
+from snapshot import SnapshotTimetableStore
+from timetable import parse_time
+from tracing import LatencyTracer, format_summary, stage, traced
+
 # Constants
 load_dotenv()
 api_key = os.getenv('TELEGRAM_API_TOKEN')
 BOT_USERNAME: Final = '@kmkobot'
 REMOTE_CSV_FILE_URL = 'https://users.pja.edu.pl/~s28102/KM_Bot/data/csvs/KM_table_current.csv'
 LOCAL_CSV_FILE_PATH = 'data/csv/KM_table_current.csv'
-MONTH_ROMAN_NUMERALS = {
-    'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6,
-    'VII': 7, 'VIII': 8, 'IX': 9, 'X': 10, 'XI': 11, 'XII': 12
-}
+FILE_ID_STORE_PATH = 'data/file_ids.json'
+IMAGE_CACHE_CHAT_ID = os.getenv('IMAGE_CACHE_CHAT_ID')  # chat the bot uploads train images to once, to get their file_ids
+DEPARTURE_WINDOW_MINUTES = 30  # how far from the requested time a departure may be
+INLINE_RESULTS_LIMIT = 10
+LOOKUP_WORKERS = int(os.getenv('LOOKUP_WORKERS', '4'))  # threads running lookups off the event loop
+MAX_CONCURRENT_LOOKUPS = int(os.getenv('MAX_CONCURRENT_LOOKUPS', '64'))  # lookups queued or running at once
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '64'))  # updates the Application handles at once
+CONNECTION_POOL_SIZE = int(os.getenv('CONNECTION_POOL_SIZE', '32'))  # parallel requests to the Bot API
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1024'))  # responses kept for repeated queries
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # 'polling' or 'webhook'
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', '1'))
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL')  # e.g. a local stand-in Bot API server for benchmarks
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public URL Telegram posts to, required in webhook mode
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))  # share of messages whose stages are timed
+TRACE_LOG_PATH = os.getenv('TRACE_LOG_PATH', 'data/traces.jsonl')
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
 DAYS_OF_THE_WEEK = {
     '1': 'poniedziałek', '2': 'wtorek', '3': 'środa', '4': 'czwartek',
     '5': 'piątek', '6': 'sobota', '7': 'niedziela'
 }
-WORKDAYS = [0, 1, 2, 3, 4]
-HOLIDAYS = {
-    '1.01': 'Nowy Rok', '6.01': 'Trzech Króli', '1.05': 'Święto Pracy',
-    '3.05': 'Święto Konstytucji 3 Maja', '15.08': 'Wniebowzięcie Najświętszej Maryi Panny',
-    '1.11': 'Wszystkich Świętych', '11.11': 'Święto Niepodległości', '25.12': 'Boże Narodzenie',
-    '26.12': 'Boże Narodzenie'
-}
-today = datetime.now().date()
-year = datetime.now().year
 TRAIN_IMAGES = {
     'Flirt 1': 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/Flirt_1.jpg',
     'Flirt 3': 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/Flirt_3.jpg',
@@ -45,172 +63,60 @@ TRAIN_IMAGES = {
     'Kibel EN71': 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/EN_71.jpg',
     'SN82 (dzierżawiony od SKPL)': 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/SN82.jpg',
 }
+DEFAULT_TRAIN_IMAGE = 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/default_pic.jpg'
+timetable_store = SnapshotTimetableStore(LOCAL_CSV_FILE_PATH)  # maps the converter's snapshot when it's current
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix='lookup')
+_lookup_semaphores = {}
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+file_id_store = FileIdStore(FILE_ID_STORE_PATH)
+tracer = LatencyTracer(TRACE_SAMPLE_RATE, TRACE_LOG_PATH)
 
 
-def get_train_info(reader, target_train_nr):
-    for row in reader:
-        curr_train_nr = row[0]
-        row_sliced = None
-
-        if len(curr_train_nr) > 5:
-            if curr_train_nr[:4] == target_train_nr[:4] and curr_train_nr[6] == target_train_nr[4]:
-                row_sliced = curr_train_nr[:4] + curr_train_nr[6:]
-            elif curr_train_nr[:5] == target_train_nr:
-                row_sliced = curr_train_nr[:5]
-        elif curr_train_nr == target_train_nr:
-            row_sliced = curr_train_nr
-
-        if row_sliced is not None:
-            row[0] = row_sliced
-            if is_valid_date_range(row[7]):
-                return format_train_info(row)
-
-    return {"numer_pociagu": target_train_nr, "typ_taboru": f"Nie znaleziono pociągu o numerze {target_train_nr}"}
-
-
+@traced('lookup')
 def get_train_info_from_nr(train_nr: str):
-    with open(LOCAL_CSV_FILE_PATH, newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        next(reader, None)  # skip the headers
-        return get_train_info(reader, train_nr)
+    timetable = timetable_store.get()
+    today = date.today()
+    for row_id, row in timetable.find_by_number(train_nr):
+        if timetable.runs_on(row_id, today):
+            return format_train_info(row)
 
+    return {"numer_pociagu": train_nr, "typ_taboru": f"Nie znaleziono pociągu o numerze {train_nr}"}
 
+
+@traced('lookup')
 def get_train_info_from_stations(start_station: str, end_station: str, time: str):
-    with open(LOCAL_CSV_FILE_PATH, newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        next(reader, None)  # skip the headers
+    timetable = timetable_store.get()
+    minutes = parse_time(time)
+    # Users mistype names and leave out diacritics, so match them to the timetable's spellings first
+    start_stations = timetable.stations.resolve_all(start_station)
+    end_stations = timetable.stations.resolve_all(end_station)
 
-        # Search for train number
-        for row in reader:
-            if row[1] == start_station.upper() and row[3] == end_station.upper() and row[2] == time:
-                return format_train_info(row)
-        return {"numer_pociagu": "Nie znaleziono pociągu", "typ_taboru": "Nie znaleziono pociągu"}
+    if minutes is not None:
+        today = date.today()
+        departures = [departure for start in start_stations for end in end_stations
+                      for departure in timetable.find_departures(start, end, minutes, today,
+                                                                 DEPARTURE_WINDOW_MINUTES)]
+        if departures:
+            # The nearest departure over every spelling of the two stations
+            _, row = min(departures, key=lambda departure: (abs(parse_time(departure[1][2]) - minutes),
+                                                            parse_time(departure[1][2])))
+            return format_train_info(row)
 
+    return {"numer_pociagu": "Nie znaleziono pociągu", "typ_taboru": "Nie znaleziono pociągu"}
 
-def is_valid_date_range(date_range):
-    if '(' in date_range:
-        date_range, additional_info = date_range.split("(", 1)[0].strip(), date_range.split("(", 1)[1].split(")")[
-            0].strip()
-    else:
-        additional_info = None
-
-    if process_additional_info(additional_info):
-        if 'i' in date_range:
-            date_ranges = date_range.split('i').trim()
-            for dr in date_ranges:
-                return is_valid_date_range(dr)
-
-        if ',' in date_range:
-            date_ranges = date_range.split(',')
-            for dr in date_ranges:
-                if '-' in dr:
-                    start_date, end_date = dr.split('-')
-                    if ' ' in start_date:
-                        day = start_date.split(' ')[0]
-                        month = start_date.split(' ')[1]
-                        start_date = parse_date(day, year, month)
-                    elif ' ' in end_date:
-                        day = end_date.split(' ')[0]
-                        month = end_date.split(' ')[1]
-                        end_date = parse_date(day, year, month)
-                    else:
-                        day = end_date
-                        month = date_range.split(' ')[1]
-                        end_date = parse_date(day, year, month)
-
-                    if start_date <= today <= end_date:
-                        return True
-                else:
-                    if (' ' in dr) and (dr.split(' ')[0].isdigit()):
-                        day = dr.split(' ')[0]
-                        month = dr.split(' ')[1]
-                        date = parse_date(day, year, month)
-                    else:
-                        day = dr
-                        month = date_range.split(' ')[1]
-                        date = parse_date(day, year, month)
-                    if date == today:
-                        return True
-        elif '-' in date_range:
-            start_date, end_date = date_range.split('-')
-
-            start_date = split_and_parse_date(start_date, date_range)
-            end_date = split_and_parse_date(end_date, date_range)
-
-            if start_date <= today <= end_date:
-                return True
-        else:
-            date = parse_date(date_range.strip(), year)
-            if date == today:
-                return True
-
-    return False
-
-
-def split_and_parse_date(date_str, date_range):
-    if ' ' in date_str:
-        day = date_str.split(' ')[0]
-        month = date_str.split(' ')[1]
-        parsed_date = parse_date(day, year, month)
-    else:
-        day = date_str
-        month = date_range.split(' ')[1]
-        parsed_date = parse_date(day, year, month)
 
-    return parsed_date
+@lru_cache(maxsize=2)
+def _service_calendar(day: date) -> ServiceCalendar:
+    return ServiceCalendar(day)
 
 
-def parse_date(date_str, year, month=None):
-    if ' ' in date_str:
-        day, month_from_roman = date_str.split(' ')
-        month_from_roman = MONTH_ROMAN_NUMERALS[month_from_roman]
-        day = int(day)
-        date = datetime(year, month_from_roman, day).date()
-    else:
-        day = int(date_str)
-        month_from_roman = MONTH_ROMAN_NUMERALS[month]
-        date = datetime(year, month_from_roman, day).date()
-
-    return date
-
-
-def process_additional_info(additional_info):
-    today_without_year = today.strftime('%d.%m')  # remove year from today's date
-    if additional_info is None:
-        return True
-
-    if additional_info == 'A':  # runs on workdays
-        return today.weekday() in WORKDAYS
-    if additional_info == 'B':  # runs on workdays and sundays
-        return today.weekday() in WORKDAYS or today.weekday() == 6
-    if additional_info == 'C':  # runs on weekends and holidays
-        return today.weekday() == 5 or today.weekday() == 6 or today_without_year in HOLIDAYS
-    if additional_info == 'D':  # runs on workdays but not on holidays
-        return today.weekday() in WORKDAYS and today_without_year not in HOLIDAYS
-    if additional_info == 'E':  # runs on workdays and saturdays but not on holidays
-        return (today.weekday() in WORKDAYS or today.weekday() == 5) and today_without_year not in HOLIDAYS
-    if additional_info == '+':  # runs on holidays
-        return today_without_year in HOLIDAYS
-    if additional_info.isdigit():  # runs on specified day of the week
-        return today.weekday() == int(additional_info) - 1
-    if '-' in additional_info:  # runs on specified days of the week
-        start_day, end_day = additional_info.split('-')
-        return int(start_day) - 1 <= today.weekday() <= int(end_day) - 1
-
-    return False
-
-
-# Test cases
-# print(is_valid_date_range("29 XI (A)"))  # Single day with note
-# print(is_valid_date_range("23 XI-1 XII (B)"))  # Date range with note
-# print(is_valid_date_range("27 XI,30 XI-1 XII (C)"))  # Mixed format with note
-# print(is_valid_date_range("2,4-9 XII (D)"))  # Mixed format with note
-# print(is_valid_date_range("2-3,9 XII (E)"))  # Mixed format with note
-# print(is_valid_date_range("2,9 XII (1)"))  # Mixed format with note
-# print(is_valid_date_range("11-16,18-23 XII (2-7)"))  # Date range with note
-# print(is_valid_date_range("10-30 XI (5-6)"))  # Date range with note
+def is_valid_date_range(date_range, day=None):
+    day = day or date.today()
+    calendar = _service_calendar(day)
+    return calendar.runs_on(calendar.compile(date_range), day)
 
 
+@traced('format')
 def format_train_info(row: list):
     train_model_mapping = {
         'ER75': 'Flirt 1',
@@ -256,8 +162,20 @@ async def model_from_stations_command(update: Update, context: ContextTypes):
         'Podaj stację początkową, stację końcową oraz godzinę odjazdu ze stacji początkowej')
 
 
+async def stats_command(update: Update, context: ContextTypes):
+    if update.effective_user is None or update.effective_user.id not in ADMIN_USER_IDS:
+        return
+
+    lines = ['Czasy etapów (lookup zawiera format):', *format_summary(tracer.summary())]
+    cache_stats = response_cache.stats()
+    lines.append('Cache: ' + ', '.join(f'{name}={value}' for name, value in cache_stats.items()))
+    await update.message.reply_text('\n'.join(lines))
+
+
 # Responses
-def handle_response(text: str):
+@traced('parse')
+def normalize_query(text: str) -> str:
+    """Normalize a message so that equivalent queries share one cache entry."""
     if '\n' in text:
         char_to_split = '\n'
     elif ',' in text:
@@ -268,17 +186,91 @@ def handle_response(text: str):
         char_to_split = None
 
     parameters = text.split(char_to_split)
-    parameters = [x.strip() for x in parameters]
-    parameters = [x.upper() for x in parameters]
+    return '\n'.join(' '.join(x.split()).upper() for x in parameters)
 
-    if len(text) == 5 and text.isdigit():
-        return get_train_info_from_nr(text)
+
+def handle_response(text: str):
+    query = normalize_query(text)
+    timetable = timetable_store.get()
+    service_date = date.today()
+
+    response = response_cache.get(query, service_date, timetable)
+    if response is None:
+        response = lookup_response(query)
+        response_cache.put(query, service_date, timetable, response)
+    return response
+
+
+def lookup_response(query: str):
+    parameters = query.split('\n')
+
+    if len(query) == 5 and query.isdigit():
+        return get_train_info_from_nr(query)
     elif len(parameters) == 3:
         return get_train_info_from_stations(parameters[0], parameters[1], parameters[2])
     else:
         return {"numer_pociagu": "Nieprawidłowy format", "typ_taboru": "Nieprawidłowy format"}
 
 
+def _get_lookup_semaphore() -> asyncio.Semaphore:
+    """Return the lookup semaphore of the running event loop (asyncio primitives can't be shared between loops)."""
+    loop = asyncio.get_running_loop()
+    semaphore = _lookup_semaphores.get(loop)
+    if semaphore is None:
+        _lookup_semaphores.clear()
+        semaphore = _lookup_semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+    return semaphore
+
+
+async def run_in_lookup_executor(func, *args):
+    """
+    Run a lookup in the lookup executor so that a timetable reload or a slow lookup
+    never blocks the event loop. At most MAX_CONCURRENT_LOOKUPS lookups are queued or running.
+    """
+    # Copy the context so that stage timings made in the worker thread land in the current trace
+    context = contextvars.copy_context()
+    async with _get_lookup_semaphore():
+        return await asyncio.get_running_loop().run_in_executor(lookup_executor, context.run, func, *args)
+
+
+async def run_lookup(text: str):
+    return await run_in_lookup_executor(handle_response, text)
+
+
+def build_inline_results(query: str) -> list:
+    """Suggest train numbers or stations for what the user typed so far in an inline query."""
+    timetable = timetable_store.get()
+
+    if query.isdigit():
+        results = []
+        for train_nr in timetable.complete_train_numbers(query, date.today(), INLINE_RESULTS_LIMIT):
+            response = handle_response(train_nr)
+            results.append(InlineQueryResultArticle(
+                id=f'nr-{train_nr}', title=train_nr, description=response['typ_taboru'],
+                input_message_content=InputTextMessageContent(train_nr)))
+        return results
+
+    # Complete the station being typed, keeping the ones already entered ("GRODZISK MAZ., WARSZ")
+    *entered, prefix = query.split(',')
+    entered = [part.strip() for part in entered]
+    results = []
+    for station in timetable.stations.complete(prefix, INLINE_RESULTS_LIMIT):
+        text = ', '.join(entered + [station])
+        results.append(InlineQueryResultArticle(
+            id=f'st-{len(results)}', title=station, description=text,
+            input_message_content=InputTextMessageContent(text)))
+    return results
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query.query.strip()
+    if not query:
+        return
+
+    results = await run_in_lookup_executor(build_inline_results, query)
+    await update.inline_query.answer(results, cache_time=60)
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text
@@ -292,19 +284,51 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message_type == 'group' and BOT_USERNAME not in text:
         return
 
-    new_text = text.replace(BOT_USERNAME, '') if BOT_USERNAME in text else text
-    response = handle_response(new_text)
+    with tracer.trace(chat_type=message_type):
+        new_text = text.replace(BOT_USERNAME, '') if BOT_USERNAME in text else text
+        with stage('handle_response'):
+            response = await run_lookup(new_text)
 
-    # Fetch the url based on the train model
-    image_url = TRAIN_IMAGES.get(response['typ_taboru'],
-                                 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/default_pic.jpg')
+        # Fetch the url based on the train model
+        image_url = TRAIN_IMAGES.get(response['typ_taboru'], DEFAULT_TRAIN_IMAGE)
 
-    print('Bot responded with:', response)
+        print('Bot responded with:', response)
 
-    await update.message.reply_text(
-        f"Numer pociągu: *{response['numer_pociagu']}*\n"
-        f"Typ taboru: *{response['typ_taboru']}*\n"
-        f"[{response['typ_taboru']}]({image_url})", parse_mode='Markdown')
+        caption = (f"Numer pociągu: *{response['numer_pociagu']}*\n"
+                   f"Typ taboru: *{response['typ_taboru']}*")
+
+        # Reuse the already uploaded photo if we have its file_id, otherwise let Telegram preview the link
+        file_id = file_id_store.get(image_url)
+        with stage('send'):
+            if file_id:
+                await update.message.reply_photo(photo=file_id, caption=caption, parse_mode='Markdown')
+            else:
+                await update.message.reply_text(
+                    f"{caption}\n"
+                    f"[{response['typ_taboru']}]({image_url})", parse_mode='Markdown')
+
+
+async def upload_train_images(application: Application):
+    """Upload every train image not uploaded yet to IMAGE_CACHE_CHAT_ID and store the returned file_ids."""
+    if not IMAGE_CACHE_CHAT_ID:
+        return
+
+    for image_url in [*TRAIN_IMAGES.values(), DEFAULT_TRAIN_IMAGE]:
+        if image_url in file_id_store:
+            continue
+        try:
+            message = await application.bot.send_photo(chat_id=IMAGE_CACHE_CHAT_ID, photo=image_url)
+        except TelegramError as e:
+            print(f'Error uploading {image_url}: {e}')
+            continue
+
+        print(f'Uploaded {image_url}')
+        try:
+            # The last size is the largest one, the same Telegram would show for the original upload
+            file_id_store.set(image_url, message.photo[-1].file_id)
+        except OSError as e:
+            # The file_id is kept in memory, it just has to be uploaded again after a restart
+            print(f'Error saving the file_id of {image_url}: {e}')
 
 
 async def error(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -312,22 +336,45 @@ async def error(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 if __name__ == '__main__':
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        raise ValueError("BOT_MODE 'webhook' needs WEBHOOK_URL, the public URL Telegram posts updates to")
+
     print('Starting bot...')
 
-    app = Application.builder().token(api_key).build()
+    # Load the timetable before the first message arrives
+    timetable_store.get()
+
+    builder = (Application.builder().token(api_key)
+               .concurrent_updates(MAX_CONCURRENT_UPDATES)
+               .connection_pool_size(CONNECTION_POOL_SIZE)
+               .pool_timeout(30)
+               .post_init(upload_train_images))
+    if TELEGRAM_BASE_URL:
+        builder = builder.base_url(TELEGRAM_BASE_URL)
+    app = builder.build()
 
     # Commands handling
     app.add_handler(CommandHandler('start', start_command))
     app.add_handler(CommandHandler('help', help_command))
+    app.add_handler(CommandHandler('stats', stats_command))
     # app.add_handler(CommandHandler('model', model_from_number_command))
     # app.add_handler(CommandHandler('model2', model_from_stations_command))
 
     # Messages
     app.add_handler(MessageHandler(filters.TEXT, handle_message))
+    app.add_handler(InlineQueryHandler(inline_query))
 
     # Errors
     app.add_error_handler(error)
 
-    # Polls the bot
-    print('Polling...')
-    app.run_polling(poll_interval=1)
+    if BOT_MODE == 'webhook':
+        # Telegram pushes updates to a local HTTP server instead of the bot asking for them
+        print(f'Listening for webhooks on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}...')
+        app.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                        webhook_url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+    elif BOT_MODE == 'polling':
+        # Polls the bot
+        print('Polling...')
+        app.run_polling(poll_interval=POLL_INTERVAL)
+    else:
+        raise ValueError(f"Unknown BOT_MODE '{BOT_MODE}', expected 'polling' or 'webhook'")
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, Optional
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache of bot responses keyed by normalized query text and service date.
+
+    Responses depend on the day (which trains run) and on the timetable they were looked up in,
+    so the whole cache is dropped as soon as either of them changes: at midnight and whenever
+    the timetable snapshot is reloaded. Cached responses are shared and must not be modified.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._service_date: Optional[date] = None
+        self._snapshot: Optional[object] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # entries pushed out by newer ones because the cache was full
+        self.invalidations = 0  # entries dropped because the day or the timetable changed
+
+    def _validate(self, service_date: date, snapshot: object):
+        """Drop every entry if they were computed for another day or another timetable snapshot."""
+        if service_date != self._service_date or snapshot is not self._snapshot:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._service_date = service_date
+            self._snapshot = snapshot
+
+    def get(self, query: str, service_date: date, snapshot: object) -> Optional[Dict[str, str]]:
+        """Return the cached response for the query, or None on a miss."""
+        key = (query, service_date)
+        with self._lock:
+            self._validate(service_date, snapshot)
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, query: str, service_date: date, snapshot: object, response: Dict[str, str]):
+        """Store a response, evicting the least recently used one if the cache is full."""
+        key: Hashable = (query, service_date)
+        with self._lock:
+            self._validate(service_date, snapshot)
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters used to size the cache."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
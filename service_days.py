@@ -0,0 +1,317 @@
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+MONTH_ROMAN_NUMERALS = {
+    'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6,
+    'VII': 7, 'VIII': 8, 'IX': 9, 'X': 10, 'XI': 11, 'XII': 12
+}
+WORKDAYS = [0, 1, 2, 3, 4]
+HOLIDAYS = {
+    '1.01': 'Nowy Rok', '6.01': 'Trzech Króli', '1.05': 'Święto Pracy',
+    '3.05': 'Święto Konstytucji 3 Maja', '15.08': 'Wniebowzięcie Najświętszej Maryi Panny',
+    '1.11': 'Wszystkich Świętych', '11.11': 'Święto Niepodległości', '25.12': 'Boże Narodzenie',
+    '26.12': 'Boże Narodzenie'
+}
+
+DAY_MONTH = Tuple[int, Optional[int]]
+DATE_SPAN = Tuple[Tuple[int, int], Tuple[int, int]]
+
+_ANNOTATION_PATTERN = re.compile(r'\(([^)]*)\)')
+_ROMAN_DATE_PATTERN = re.compile(r'^(\d{1,2})(?:\s*([IVX]+))?$')
+_ARABIC_DATE_PATTERN = re.compile(r'^(\d{1,2})\.(\d{1,2})$')
+
+
+def split_annotation(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits a date string like "2,4-9 XII (D)" into the dates and the annotation code.
+
+    Returns:
+        tuple: The date part and the annotation without brackets (None if there is none).
+    """
+    match = _ANNOTATION_PATTERN.search(text)
+    if not match:
+        return text.strip(), None
+    return text[:match.start()].strip(), match.group(1).strip()
+
+
+def _parse_day_month(part: str) -> DAY_MONTH:
+    """Parse "4", "4 XII" or "04.12" into (day, month), with month None when it is left out."""
+    part = part.strip()
+    match = _ROMAN_DATE_PATTERN.match(part)
+    if match:
+        day, roman = match.groups()
+        if roman is None:
+            return int(day), None
+        if roman not in MONTH_ROMAN_NUMERALS:
+            raise ValueError(f"Unknown month '{roman}' in '{part}'")
+        return int(day), MONTH_ROMAN_NUMERALS[roman]
+
+    match = _ARABIC_DATE_PATTERN.match(part)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+
+    raise ValueError(f"Unrecognized date '{part}'")
+
+
+def parse_date_expression(text: str) -> Tuple[List[DATE_SPAN], Optional[str]]:
+    """
+    Parses a KM date expression into inclusive (day, month) spans.
+
+    Handles single dates ("1 VI"), comma lists ("1, 2 VI"), ranges within a month ("1 - 5 VI"),
+    cross-month ranges ("30 XI - 1 XII"), mixes of those ("2,4-9 XII"), lists joined with " i "
+    and DD.MM dates. A day written without a month takes the month of the next date that has
+    one, as in "1, 2 VI" meaning 1 VI and 2 VI.
+
+    Parameters:
+        text (str): The date expression, optionally followed by an annotation like "(D)".
+
+    Returns:
+        tuple: A list of ((start_day, start_month), (end_day, end_month)) spans and the annotation code.
+
+    Raises:
+        ValueError: If the expression doesn't follow any of the known formats.
+    """
+    dates, annotation = split_annotation(text)
+    dates = re.sub(r'\s+i\s+', ',', dates)
+    items = [item.strip() for item in dates.split(',') if item.strip()]
+
+    parsed = []
+    for item in items:
+        if '-' in item:
+            start, end = item.split('-', 1)
+            parsed.append([_parse_day_month(start), _parse_day_month(end)])
+        else:
+            day_month = _parse_day_month(item)
+            parsed.append([day_month, day_month])
+
+    # Days without a month take it from the next date to the right, then from the left as a fallback
+    month = None
+    for pair in reversed(parsed):
+        for i in (1, 0):
+            if pair[i][1] is None:
+                pair[i] = (pair[i][0], month)
+            else:
+                month = pair[i][1]
+    month = None
+    for pair in parsed:
+        for i in (0, 1):
+            if pair[i][1] is None:
+                pair[i] = (pair[i][0], month)
+            else:
+                month = pair[i][1]
+
+    spans = []
+    for start, end in parsed:
+        if start[1] is None or end[1] is None:
+            raise ValueError(f"No month given in '{text}'")
+        spans.append((start, end))
+
+    return spans, annotation
+
+
+def _format_day_month(day_month: Tuple[int, int]) -> str:
+    day, month = day_month
+    if not 1 <= day <= 31 or not 1 <= month <= 12:
+        raise ValueError(f"Invalid date {day}.{month}")
+    return f"{day:02d}.{month:02d}"
+
+
+@lru_cache(maxsize=None)
+def convert_date_expression(text: str) -> str:
+    """
+    Converts a KM date expression to the DD.MM format, keeping the annotation at the end.
+
+    Accepts everything parse_date_expression does, e.g. "1 VI" becomes "01.06", "1 VI - 5 VII"
+    "01.06 - 05.07", "1, 2 VI" "01.06, 02.06" and "1-5 VI (+)" "01.06 - 05.06 (+)".
+    Results are memoized per raw string, so converting a whole timetable costs one parse per
+    distinct expression.
+
+    Parameters:
+        text (str): The date expression, optionally followed by an annotation like "(C)".
+
+    Returns:
+        str: The dates as "DD.MM", "DD.MM - DD.MM" items separated by ", ".
+
+    Raises:
+        ValueError: If the expression doesn't follow any of the known formats.
+    """
+    spans, annotation = parse_date_expression(text)
+    items = [_format_day_month(start) if start == end else f"{_format_day_month(start)} - {_format_day_month(end)}"
+             for start, end in spans]
+    converted = ", ".join(items)
+    if annotation is not None:
+        converted = f"{converted} ({annotation})".strip()
+    return converted
+
+
+def is_holiday(day: date) -> bool:
+    return f"{day.day}.{day.month:02d}" in HOLIDAYS
+
+
+def runs_with_annotation(annotation: Optional[str], day: date) -> bool:
+    """
+    Checks whether a train with the given annotation runs on the given day of the week.
+
+    Parameters:
+        annotation (str): The annotation code without brackets, e.g. "D", "+", "6" or "1-5".
+        day (date): The day to check.
+
+    Returns:
+        bool: True if the annotation allows running on that day.
+    """
+    if not annotation:
+        return True
+
+    weekday = day.weekday()
+    if annotation == 'A':  # runs on workdays
+        return weekday in WORKDAYS
+    if annotation == 'B':  # runs on workdays and sundays
+        return weekday in WORKDAYS or weekday == 6
+    if annotation == 'C':  # runs on weekends and holidays
+        return weekday == 5 or weekday == 6 or is_holiday(day)
+    if annotation == 'D':  # runs on workdays but not on holidays
+        return weekday in WORKDAYS and not is_holiday(day)
+    if annotation == 'E':  # runs on workdays and saturdays but not on holidays
+        return (weekday in WORKDAYS or weekday == 5) and not is_holiday(day)
+    if annotation == '+':  # runs on holidays
+        return is_holiday(day)
+    if annotation.isdigit():  # runs on specified day of the week
+        return weekday == int(annotation) - 1
+    if '-' in annotation:  # runs on specified days of the week
+        start_day, end_day = annotation.split('-', 1)
+        if start_day.strip().isdigit() and end_day.strip().isdigit():
+            return int(start_day) - 1 <= weekday <= int(end_day) - 1
+
+    return False
+
+
+class ServiceCalendar:
+    """
+    Compiles date expressions into day bitmasks so that "runs on day D" is a single bit test.
+
+    Bit i of a mask is set when the train runs on epoch + i days. The window starts on January 1st
+    of the year before the reference date and spans three years, so timetables crossing the new
+    year resolve correctly. Spans are placed to contain the reference date where they can, else
+    closest to it (see span_dates); a range whose end falls before its start continues into the
+    next year.
+    """
+
+    def __init__(self, reference: Optional[date] = None):
+        reference = reference or date.today()
+        self.reference = reference
+        self.epoch = date(reference.year - 1, 1, 1)
+        self.span = (date(reference.year + 2, 1, 1) - self.epoch).days
+        self.all_days = (1 << self.span) - 1
+        self._annotation_masks: Dict[Optional[str], int] = {}
+        self._placed: Dict[DATE_SPAN, Tuple[date, date]] = {}
+        self._compiled: Dict[Tuple[str, Optional[str]], int] = {}
+
+    def _place(self, span: DATE_SPAN, year: int) -> Tuple[date, date]:
+        """Place a (day, month) span starting in the given year; an end before the start is in the next year."""
+        (start_day, start_month), (end_day, end_month) = span
+        start = date(year, start_month, start_day)
+        try:
+            end = date(year, end_month, end_day)
+        except ValueError:
+            end = date(year + 1, end_month, end_day)
+        if end < start:
+            end = date(year + 1, end_month, end_day)
+        return start, end
+
+    def span_dates(self, span: DATE_SPAN) -> Tuple[date, date]:
+        """
+        Return the first and the last day of a (day, month) span, placed in years around the reference date.
+
+        The span starts in the reference year or the year before if that makes it contain the reference
+        date, so a range over the whole timetable period is placed in the period running now. Otherwise
+        it is placed where it ends or starts closest to the reference date, which may be the next year.
+
+        Raises:
+            ValueError: If the span's dates don't exist in any of these years.
+        """
+        placed = self._placed.get(span)
+        if placed is not None:
+            return placed
+
+        reference = self.reference
+        candidates = []
+        for year in (reference.year - 1, reference.year, reference.year + 1):
+            try:
+                start, end = self._place(span, year)
+            except ValueError:
+                continue
+            if start <= reference <= end and year <= reference.year:
+                placed = (start, end)
+                break
+            candidates.append((start, end))
+        else:
+            if not candidates:
+                raise ValueError(f"Invalid date span {span}")
+            placed = min(candidates, key=lambda candidate: (candidate[0] - reference).days if candidate[0] > reference
+                         else (reference - candidate[1]).days)
+
+        self._placed[span] = placed
+        return placed
+
+    def _span_mask(self, span: DATE_SPAN) -> int:
+        start, end = self.span_dates(span)
+
+        start_offset = max((start - self.epoch).days, 0)
+        end_offset = min((end - self.epoch).days, self.span - 1)
+        if end_offset < start_offset:
+            return 0
+        return ((1 << (end_offset - start_offset + 1)) - 1) << start_offset
+
+    def annotation_mask(self, annotation: Optional[str]) -> int:
+        """Return the mask of every day in the window on which the annotation allows running."""
+        mask = self._annotation_masks.get(annotation)
+        if mask is None:
+            mask = 0
+            for offset in range(self.span):
+                if runs_with_annotation(annotation, self.epoch + timedelta(days=offset)):
+                    mask |= 1 << offset
+            self._annotation_masks[annotation] = mask
+        return mask
+
+    def compile(self, dates: str, annotation: Optional[str] = None) -> int:
+        """
+        Compiles a date column and its annotation into a day bitmask.
+
+        Parameters:
+            dates (str): The date expression, e.g. "2, 4 - 9 XII". May still contain the annotation.
+            annotation (str): The annotation column, e.g. "(D)". Takes precedence over one inside dates.
+
+        Returns:
+            int: The day bitmask; 0 if the expression can't be parsed. An empty date means every day.
+        """
+        key = (dates, annotation)
+        mask = self._compiled.get(key)
+        if mask is not None:
+            return mask
+
+        try:
+            spans, inline_annotation = parse_date_expression(dates)
+            if annotation and annotation.strip():
+                annotation = split_annotation(annotation)[1] or annotation.strip()
+            else:
+                annotation = inline_annotation
+
+            if spans:
+                dates_mask = 0
+                for span in spans:
+                    dates_mask |= self._span_mask(span)
+            else:
+                dates_mask = self.all_days
+            mask = dates_mask & self.annotation_mask(annotation)
+        except ValueError:
+            mask = 0
+
+        self._compiled[key] = mask
+        return mask
+
+    def runs_on(self, mask: int, day: date) -> bool:
+        """Test whether the compiled mask includes the given day."""
+        offset = (day - self.epoch).days
+        return 0 <= offset < self.span and mask >> offset & 1 == 1
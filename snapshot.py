@@ -0,0 +1,382 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from service_days import ServiceCalendar
+from stations import StationIndex
+from timetable import Timetable, TimetableStore
+
+# Bump whenever the layout or the meaning of the compiled data changes, so older snapshots are rejected
+SNAPSHOT_VERSION = 2  # 2: service days placed to contain the reference date (see ServiceCalendar.span_dates)
+SNAPSHOT_MAGIC = b'KMTTSNAP'
+
+# magic, version, SHA-256 of the source CSV, calendar reference date (ordinal), mask width in bytes
+_HEADER = struct.Struct('<8sI32sII')
+_SECTION = struct.Struct('<QQ')  # offset, length in bytes
+# The sections in file order, with the array type code of their items
+_SECTIONS = [
+    ('string_offsets', 'I'),  # string i is string_data[string_offsets[i]:string_offsets[i + 1]]
+    ('string_data', 'B'),  # the UTF-8 bytes of every distinct cell value and station name
+    ('row_offsets', 'I'),  # the cells of row r are row_cells[row_offsets[r]:row_offsets[r + 1]]
+    ('row_cells', 'I'),  # string ids
+    ('number_keys', 'I'),  # string ids of the train numbers, sorted by the numbers
+    ('number_offsets', 'I'),  # the rows of number n are number_rows[number_offsets[n]:number_offsets[n + 1]]
+    ('number_rows', 'I'),
+    ('station_keys', 'I'),  # string ids of the station names in the station-pair index
+    ('pair_keys', 'Q'),  # departure station id << 32 | arrival station id, sorted
+    ('pair_offsets', 'I'),  # pair p's departures are pair_minutes/pair_rows[pair_offsets[p]:pair_offsets[p + 1]]
+    ('pair_minutes', 'H'),
+    ('pair_rows', 'I'),
+    ('row_masks', 'I'),  # the service-day mask id of every row
+    ('masks', 'B'),  # the distinct service-day masks, mask_width little-endian bytes each
+]
+_ALIGNMENT = 8
+
+
+def snapshot_path_for(csv_path: str) -> str:
+    """Return the path of the snapshot that belongs next to the CSV, e.g. KM_table_current.snapshot."""
+    return os.path.splitext(csv_path)[0] + '.snapshot'
+
+
+def file_hash(path: str) -> bytes:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.digest()
+
+
+class _StringTable:
+    """Interns strings while writing a snapshot."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.offsets = array('I', [0])
+        self.data = bytearray()
+
+    def intern(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.ids)
+            self.data += value.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return string_id
+
+
+def write_snapshot(timetable: Timetable, csv_path: str, snapshot_path: Optional[str] = None) -> str:
+    """
+    Writes the timetable's rows, indexes and compiled service days as a binary snapshot.
+
+    Every cell value and station name is stored once in a string table; rows and indexes refer
+    to it by id. The header records the SHA-256 of the CSV the timetable was loaded from, so a
+    snapshot is only used as long as that CSV is unchanged.
+
+    Parameters:
+        timetable (Timetable): The timetable loaded from csv_path.
+        csv_path (str): The CSV the timetable was loaded from.
+        snapshot_path (str): Where to write the snapshot; next to the CSV if None.
+
+    Returns:
+        str: The path of the snapshot.
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    strings = _StringTable()
+    sections = {name: array(type_code) for name, type_code in _SECTIONS}
+
+    sections['row_offsets'].append(0)
+    for row in timetable.rows:
+        sections['row_cells'].extend(strings.intern(cell) for cell in row)
+        sections['row_offsets'].append(len(sections['row_cells']))
+
+    sections['number_offsets'].append(0)
+    for train_nr in timetable.train_numbers:
+        sections['number_keys'].append(strings.intern(train_nr))
+        sections['number_rows'].extend(timetable.by_number[train_nr])
+        sections['number_offsets'].append(len(sections['number_rows']))
+
+    # Station ids follow the order of the index, so the StationIndex built at load time is the same
+    station_ids = {}
+    for pair in timetable.by_station_pair:
+        for station in pair:
+            if station not in station_ids:
+                station_ids[station] = len(station_ids)
+                sections['station_keys'].append(strings.intern(station))
+
+    pairs = sorted(timetable.by_station_pair.items(),
+                   key=lambda item: (station_ids[item[0][0]], station_ids[item[0][1]]))
+    sections['pair_offsets'].append(0)
+    for (departure, arrival), (minutes, row_ids) in pairs:
+        sections['pair_keys'].append(station_ids[departure] << 32 | station_ids[arrival])
+        sections['pair_minutes'].extend(minutes)
+        sections['pair_rows'].extend(row_ids)
+        sections['pair_offsets'].append(len(sections['pair_rows']))
+
+    mask_width = (timetable.calendar.span + 7) // 8
+    mask_ids = {}
+    for mask in timetable.service_days:
+        mask_id = mask_ids.get(mask)
+        if mask_id is None:
+            mask_id = mask_ids[mask] = len(mask_ids)
+            sections['masks'].frombytes(mask.to_bytes(mask_width, 'little'))
+        sections['row_masks'].append(mask_id)
+
+    sections['string_offsets'] = strings.offsets
+    sections['string_data'] = array('B', strings.data)
+
+    payloads = []
+    for name, _ in _SECTIONS:
+        section = sections[name]
+        if sys.byteorder != 'little':
+            section.byteswap()
+        payloads.append(section.tobytes())
+
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, file_hash(csv_path),
+                          timetable.calendar.reference.toordinal(), mask_width)
+    offset = _HEADER.size + _SECTION.size * len(_SECTIONS)
+    table = bytearray()
+    for payload in payloads:
+        offset += -offset % _ALIGNMENT
+        table += _SECTION.pack(offset, len(payload))
+        offset += len(payload)
+
+    output_dir = os.path.dirname(snapshot_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Write to a temp file first so the bot never maps a half-written snapshot
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(header)
+        file.write(table)
+        for payload in payloads:
+            file.write(b'\0' * (-file.tell() % _ALIGNMENT))
+            file.write(payload)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+class _Strings:
+    """Decodes strings from the snapshot's string table on first use."""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+        self.decoded: List[Optional[str]] = [None] * (len(offsets) - 1)
+
+    def __getitem__(self, string_id: int) -> str:
+        value = self.decoded[string_id]
+        if value is None:
+            value = self.decoded[string_id] = str(self.data[self.offsets[string_id]:self.offsets[string_id + 1]],
+                                                  'utf-8')
+        return value
+
+
+class _Rows(Sequence):
+
+    def __init__(self, strings: _Strings, offsets: memoryview, cells: memoryview):
+        self.strings = strings
+        self.offsets = offsets
+        self.cells = cells
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            return [self[i] for i in range(*row_id.indices(len(self)))]
+        strings = self.strings
+        return [strings[string_id] for string_id in self.cells[self.offsets[row_id]:self.offsets[row_id + 1]]]
+
+
+class _TrainNumbers(Sequence):
+    """The sorted train numbers, as strings."""
+
+    def __init__(self, strings: _Strings, keys: memoryview):
+        self.strings = strings
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.strings[string_id] for string_id in self.keys[index]]
+        return self.strings[self.keys[index]]
+
+
+class _NumberIndex(Mapping):
+    """Train number -> row ids, looked up by binary search over the sorted numbers."""
+
+    def __init__(self, numbers: _TrainNumbers, offsets: memoryview, row_ids: memoryview):
+        self.numbers = numbers
+        self.offsets = offsets
+        self.row_ids = row_ids
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        return iter(self.numbers)
+
+    def __getitem__(self, train_nr: str) -> memoryview:
+        index = bisect_left(self.numbers, train_nr)
+        if index == len(self.numbers) or self.numbers[index] != train_nr:
+            raise KeyError(train_nr)
+        return self.row_ids[self.offsets[index]:self.offsets[index + 1]]
+
+
+class _StationPairIndex(Mapping):
+    """(departure, arrival) -> (sorted departure minutes, row ids), like Timetable.by_station_pair."""
+
+    def __init__(self, station_ids: Dict[str, int], station_names: List[str], keys: memoryview,
+                 offsets: memoryview, minutes: memoryview, row_ids: memoryview):
+        self.station_ids = station_ids
+        self.station_names = station_names
+        self.keys = keys
+        self.offsets = offsets
+        self.minutes = minutes
+        self.row_ids = row_ids
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        for key in self.keys:
+            yield self.station_names[key >> 32], self.station_names[key & 0xFFFFFFFF]
+
+    def __getitem__(self, pair: Tuple[str, str]) -> Tuple[memoryview, memoryview]:
+        departure_id = self.station_ids.get(pair[0])
+        arrival_id = self.station_ids.get(pair[1])
+        if departure_id is None or arrival_id is None:
+            raise KeyError(pair)
+        key = departure_id << 32 | arrival_id
+        index = bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            raise KeyError(pair)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.minutes[start:end], self.row_ids[start:end]
+
+
+class _ServiceDays(Sequence):
+    """The service-day bitmask of every row, as an int."""
+
+    def __init__(self, row_masks: memoryview, masks: memoryview, mask_width: int):
+        self.row_masks = row_masks
+        self.masks = masks
+        self.mask_width = mask_width
+
+    def __len__(self):
+        return len(self.row_masks)
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            return [self[i] for i in range(*row_id.indices(len(self)))]
+        start = self.row_masks[row_id] * self.mask_width
+        return int.from_bytes(self.masks[start:start + self.mask_width], 'little')
+
+
+class SnapshotTimetable(Timetable):
+    """
+    A Timetable served straight from a memory-mapped snapshot.
+
+    Loading only maps the file and wraps its sections; rows, strings and masks are decoded
+    when a lookup touches them. All lookup methods are Timetable's own, working on views
+    that behave like the lists and dicts Timetable builds from the CSV.
+    """
+
+    def __init__(self, snapshot: mmap.mmap, source_mtime: Optional[float], reference: date, mask_width: int,
+                 sections: Dict[str, memoryview]):
+        self._snapshot = snapshot
+        self.source_mtime = source_mtime
+        self.calendar = ServiceCalendar(reference)
+
+        strings = _Strings(sections['string_offsets'], sections['string_data'])
+        self.rows = _Rows(strings, sections['row_offsets'], sections['row_cells'])
+        self.service_days = _ServiceDays(sections['row_masks'], sections['masks'], mask_width)
+        self.train_numbers = _TrainNumbers(strings, sections['number_keys'])
+        self.by_number = _NumberIndex(self.train_numbers, sections['number_offsets'], sections['number_rows'])
+
+        station_names = [strings[string_id] for string_id in sections['station_keys']]
+        station_ids = {name: station_id for station_id, name in enumerate(station_names)}
+        self.by_station_pair = _StationPairIndex(station_ids, station_names, sections['pair_keys'],
+                                                 sections['pair_offsets'], sections['pair_minutes'],
+                                                 sections['pair_rows'])
+        self.stations = StationIndex(station_names)
+
+
+def load_snapshot(csv_path: str, snapshot_path: Optional[str] = None,
+                  today: Optional[date] = None) -> Optional[SnapshotTimetable]:
+    """
+    Loads the snapshot of the CSV if it is current.
+
+    A snapshot is rejected (and None returned) if it is missing, was written by another
+    SNAPSHOT_VERSION, doesn't belong to the CSV's current content, or was compiled in another
+    year than today, whose service days it may not cover.
+
+    Parameters:
+        csv_path (str): The timetable CSV the snapshot has to belong to.
+        snapshot_path (str): The snapshot; next to the CSV if None.
+        today (date): The date used for the year check; date.today() if None.
+
+    Returns:
+        SnapshotTimetable: The memory-mapped timetable, or None if the CSV has to be parsed instead.
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    if sys.byteorder != 'little' or not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        source_mtime = os.stat(csv_path).st_mtime
+        with open(snapshot_path, 'rb') as file:
+            snapshot = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        print(f"Error opening snapshot {snapshot_path}: {e}")
+        return None
+
+    if len(snapshot) < _HEADER.size + _SECTION.size * len(_SECTIONS):
+        print(f"Snapshot {snapshot_path} is truncated, ignoring it")
+        return None
+
+    magic, version, csv_hash, reference_ordinal, mask_width = _HEADER.unpack_from(snapshot, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        print(f"Snapshot {snapshot_path} has an unsupported format, ignoring it")
+        return None
+    reference = date.fromordinal(reference_ordinal)
+    if reference.year != (today or date.today()).year:
+        print(f"Snapshot {snapshot_path} was compiled in {reference.year}, ignoring it")
+        return None
+    if csv_hash != file_hash(csv_path):
+        print(f"Snapshot {snapshot_path} is stale, ignoring it")
+        return None
+
+    view = memoryview(snapshot)
+    sections = {}
+    for i, (name, type_code) in enumerate(_SECTIONS):
+        offset, length = _SECTION.unpack_from(snapshot, _HEADER.size + i * _SECTION.size)
+        if offset + length > len(snapshot):
+            print(f"Snapshot {snapshot_path} is truncated, ignoring it")
+            return None
+        sections[name] = view[offset:offset + length].cast(type_code)
+
+    return SnapshotTimetable(snapshot, source_mtime, reference, mask_width, sections)
+
+
+class SnapshotTimetableStore(TimetableStore):
+    """
+    A TimetableStore that maps the binary snapshot next to the CSV when it is current,
+    and parses the CSV only when there is no usable snapshot.
+    """
+
+    def __init__(self, csv_path: str, snapshot_path: Optional[str] = None):
+        super().__init__(csv_path)
+        self.snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+
+    def load(self) -> Timetable:
+        return load_snapshot(self.csv_path, self.snapshot_path) or super().load()
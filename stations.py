@@ -0,0 +1,126 @@
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+# Letters NFKD doesn't decompose into a base letter and a diacritic
+_EXTRA_TRANSLATIONS = str.maketrans({'Ł': 'L', 'ł': 'l'})
+_NON_ALPHANUMERIC = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize_station_name(name: str) -> str:
+    """
+    Normalizes a station name for matching: uppercase, without Polish diacritics and punctuation.
+
+    For example "Grodzisk Maz." and "GRODZISK MAZ" both become "GRODZISK MAZ",
+    and "Łowicz Główny" becomes "LOWICZ GLOWNY".
+    """
+    name = unicodedata.normalize('NFKD', name.translate(_EXTRA_TRANSLATIONS))
+    name = ''.join(char for char in name if not unicodedata.combining(char)).upper()
+    return _NON_ALPHANUMERIC.sub(' ', name).strip()
+
+
+def trigrams(normalized_name: str) -> List[str]:
+    """Return the distinct trigrams of a normalized name, padded so that word starts weigh more."""
+    padded = f"  {normalized_name} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class StationIndex:
+    """
+    Resolves mistyped station names to the canonical names used in the timetable.
+
+    The index is built once from every station name: an exact map of normalized names and
+    trigram posting lists, so resolving a name only touches stations sharing a trigram with it.
+    The PDFs don't always spell a station the same way (case, diacritics, punctuation), so a
+    normalized name maps to every spelling of it, sorted.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.by_normalized: Dict[str, List[str]] = {}
+        for name in names:
+            name = name.strip()
+            if name:
+                spellings = self.by_normalized.setdefault(normalize_station_name(name), [])
+                if name not in spellings:
+                    spellings.append(name)
+        for spellings in self.by_normalized.values():
+            spellings.sort()
+
+        self.normalized_names = sorted(self.by_normalized)
+        self.trigram_counts: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for station_id, normalized in enumerate(self.normalized_names):
+            grams = trigrams(normalized)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(station_id)
+
+    def resolve(self, query: str, min_similarity: float = 0.45) -> Optional[str]:
+        """
+        Returns the canonical station name closest to the query, the first spelling of resolve_all.
+
+        Parameters:
+            query (str): The station name as typed by the user.
+            min_similarity (float): The lowest trigram similarity (Dice coefficient) accepted as a match.
+
+        Returns:
+            str: The station name as written in the timetable, or None if nothing is close enough.
+        """
+        spellings = self.resolve_all(query, min_similarity)
+        return spellings[0] if spellings else None
+
+    def resolve_all(self, query: str, min_similarity: float = 0.45) -> List[str]:
+        """
+        Returns every spelling in the timetable of the station closest to the query.
+
+        Parameters:
+            query (str): The station name as typed by the user.
+            min_similarity (float): The lowest trigram similarity (Dice coefficient) accepted as a match.
+
+        Returns:
+            list: The station names as written in the timetable, empty if nothing is close enough.
+        """
+        normalized = normalize_station_name(query)
+        if not normalized:
+            return []
+
+        exact = self.by_normalized.get(normalized)
+        if exact is not None:
+            return exact
+
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return []
+
+        def similarity(station_id):
+            return 2 * shared[station_id] / (len(grams) + self.trigram_counts[station_id])
+
+        best = max(shared, key=lambda station_id: (similarity(station_id), -self.trigram_counts[station_id]))
+        if similarity(best) < min_similarity:
+            return []
+        return self.by_normalized[self.normalized_names[best]]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Returns stations whose normalized name starts with the normalized prefix, shortest names first.
+
+        Parameters:
+            prefix (str): What the user has typed so far.
+            limit (int): The maximum number of stations to return.
+
+        Returns:
+            list: Canonical station names.
+        """
+        normalized = normalize_station_name(prefix)
+        if not normalized:
+            return []
+
+        lo = bisect_left(self.normalized_names, normalized)
+        hi = bisect_right(self.normalized_names, normalized + '\uffff', lo)
+        matches = sorted(self.normalized_names[lo:hi], key=len)[:limit]
+        return [self.by_normalized[name][0] for name in matches]
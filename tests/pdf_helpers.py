@@ -0,0 +1,21 @@
+import pymupdf
+
+HEADER = ["Zestawienie pociagow KM", "nr poc.", "relacja handlowa", "z", "odj.", "do", "przyj.",
+          "typ taboru", "termin kursowania"]
+
+
+def write_pdf(path, rows_per_page):
+    """Write a minimal timetable PDF with one text line per cell, like the KM PDFs' text layer."""
+    doc = pymupdf.open()
+    for rows in rows_per_page:
+        page = doc.new_page()
+        y = 40
+        for line in HEADER + [cell for row in rows for cell in row]:
+            page.insert_text((40, y), line, fontsize=6)
+            y += 7
+    doc.save(path)
+
+
+def make_rows(first_train_nr, count):
+    return [[str(first_train_nr + i), "WARSZAWA", "7:30", "RADOM", "9:00", "EN76", "1", f"{i % 28 + 1} - 30 XII (D)"]
+            for i in range(count)]
@@ -0,0 +1,31 @@
+import os
+
+from benchmarks.suite import run_scale
+from benchmarks.synthetic import write_timetable_pdfs
+
+
+class TestBenchmarkSuite:
+
+    # The generator splits the timetable into PDFs of the requested size
+    def test_generator_writes_pdfs_at_scale(self, tmp_path):
+        # Arrange
+        source_dir = str(tmp_path / "pdf")
+
+        # Act
+        rows = write_timetable_pdfs(source_dir, 250, trains_per_pdf=100)
+
+        # Assert
+        assert len(rows) == 250
+        assert sorted(os.listdir(source_dir)) == ["KM_000.pdf", "KM_001.pdf", "KM_002.pdf"]
+
+    # Every stage runs on a small timetable and both engines recover every train
+    def test_all_stages_run(self, tmp_path):
+        results = run_scale(200, str(tmp_path), trains_per_pdf=100, queries=20)
+
+        assert results['rows_text'] == 200
+        assert results['rows_words'] == 200
+        assert results['inserts'] > 0
+        for stage in ('extract_text', 'extract_words', 'write_csv', 'db_convert', 'db_insert', 'db_bulk_load',
+                      'db_diff_reload', 'timetable_load', 'snapshot_write', 'snapshot_load', 'lookup_number',
+                      'lookup_stations', 'lookup_db_number', 'lookup_db_stations'):
+            assert results[stage] > 0
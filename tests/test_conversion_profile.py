@@ -0,0 +1,61 @@
+import csv
+import json
+import pstats
+
+from convert_pdfs_to_csv import (ConversionProfile, convert_all_pdfs_to_single_csv, extract_rows_from_all_pdfs,
+                                 list_pdf_files)
+from pdf_helpers import HEADER, make_rows, write_pdf
+
+
+class TestConversionProfile:
+
+    # Every page of every PDF is reported with its timings, rows and skipped header lines
+    def test_report_has_per_page_stats(self, tmp_path):
+        # Arrange
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 5), make_rows(18100, 3)])
+        write_pdf(str(source_dir / "b.pdf"), [make_rows(19000, 4)])
+        output_csv = str(tmp_path / "KM_table_current.csv")
+        report_path = str(tmp_path / "profile" / "report.json")
+
+        # Act
+        convert_all_pdfs_to_single_csv(str(source_dir), output_csv, workers=2, cache_dir=str(tmp_path / "cache"),
+                                       snapshot=False, profile_report=report_path)
+
+        # Assert
+        with open(report_path, encoding='utf-8') as file:
+            report = json.load(file)
+        with open(output_csv, encoding='utf-8') as file:
+            assert len(list(csv.reader(file, delimiter=";"))) == 12
+        assert [pdf["file"].rsplit("/", 1)[-1] for pdf in report["pdfs"]] == ["a.pdf", "b.pdf"]
+        assert [[page["rows"] for page in pdf["page_stats"]] for pdf in report["pdfs"]] == [[5, 3], [4]]
+        assert all(page["skipped_lines"] == len(HEADER) for pdf in report["pdfs"] for page in pdf["page_stats"])
+        assert report["totals"]["pages"] == 3
+        assert report["totals"]["rows"] == 12
+        assert report["totals"]["lines"] == 3 * len(HEADER) + 12 * 8
+        assert report["slowest_pages"][0]["parse_ms"] == max(page["parse_ms"] for page in report["slowest_pages"])
+        assert not (tmp_path / "cache").exists()
+
+    # The profile yields the same rows as the uninstrumented extraction
+    def test_iter_rows_matches_extraction(self, tmp_path):
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 5), make_rows(18100, 3)])
+
+        rows = list(ConversionProfile().iter_rows(list_pdf_files(str(source_dir))))
+
+        assert rows == extract_rows_from_all_pdfs(str(source_dir))
+
+    # The cProfile dump can be read with pstats and covers the page parser
+    def test_cprofile_dump_covers_parser(self, tmp_path):
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 5)])
+        dump_path = str(tmp_path / "conversion.prof")
+
+        convert_all_pdfs_to_single_csv(str(source_dir), str(tmp_path / "out.csv"), snapshot=False,
+                                       profile_dump=dump_path)
+
+        functions = {name for _, _, name in pstats.Stats(dump_path).stats}
+        assert "extract_table_from_pdf_page" in functions
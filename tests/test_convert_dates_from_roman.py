@@ -77,4 +77,26 @@ class TestConvertDatesFromRoman:
         result = convert_dates_from_roman(input_row)
     
         # Assert
-        assert result[-1] == ""
\ No newline at end of file
+        assert result[-1] == ""
+
+    # After extract_date_annotations the dates are the column before the annotation
+    def test_dates_before_annotation_column(self):
+        # Arrange
+        input_row = ["12345", "WARSZAWA", "2, 4 - 9 XII", "(D)"]
+
+        # Act
+        result = convert_dates_from_roman(input_row, column=-2)
+
+        # Assert
+        assert result[-2:] == ["02.12, 04.12 - 09.12", "(D)"]
+
+    # The dates column is the one given, even when it is empty and the cell before it holds a date
+    def test_empty_dates_column_is_not_guessed(self):
+        # Arrange
+        input_row = ["12345", "3 XII", ""]
+
+        # Act
+        result = convert_dates_from_roman(input_row)
+
+        # Assert
+        assert result == ["12345", "3 XII", ""]
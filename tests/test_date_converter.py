@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from gemini_date_converion import DateConverter
+from service_days import convert_date_expression
+
+
+class FakeModels:
+    """Stands in for client.models: converts the requested dates locally and records every request."""
+
+    def __init__(self, respond=None, delay=0.0):
+        self.requests = []
+        self.respond = respond or (lambda dates: json.dumps([convert_date_expression(date) for date in dates]))
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        dates = json.loads(contents[0].parts[0].text.split("\n", 1)[1])
+        with self._lock:
+            self.requests.append(dates)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return SimpleNamespace(text=self.respond(dates))
+
+
+class FakeClient:
+
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+
+
+class TestDateConverter:
+
+    # Only dates never converted before are sent, also after a restart
+    def test_only_unseen_dates_are_sent(self, tmp_path):
+        # Arrange
+        cache_path = str(tmp_path / "cache" / "date_conversions.json")
+        first_client, second_client = FakeClient(), FakeClient()
+
+        # Act
+        first = DateConverter(client=first_client, cache_path=cache_path).convert_dates(["1 VI", "1 - 5 VI"])
+        second = DateConverter(client=second_client, cache_path=cache_path).convert_dates(["1 - 5 VI", "1, 2 VI (C)"])
+
+        # Assert
+        assert first == {"1 VI": "01.06", "1 - 5 VI": "01.06 - 05.06"}
+        assert second == {"1 - 5 VI": "01.06 - 05.06", "1, 2 VI (C)": "01.06, 02.06 (C)"}
+        assert second_client.models.requests == [["1, 2 VI (C)"]]
+
+    # Dates are sent in bounded batches with a bounded number of requests in flight
+    def test_batches_and_concurrency_are_bounded(self):
+        client = FakeClient(delay=0.05)
+        dates = [f"{day} {month}" for month in ("I", "II", "III") for day in range(1, 29)]
+
+        converted = DateConverter(client=client, cache_path=None, batch_size=10,
+                                  max_concurrent_requests=3).convert_dates(dates)
+
+        assert len(converted) == len(dates)
+        assert sorted(len(batch) for batch in client.models.requests) == [4] + [10] * 8
+        assert client.models.max_in_flight == 3
+
+    # Items not in the DD.MM format are dropped, a misaligned response is rejected as a whole
+    def test_invalid_output_is_not_cached(self):
+        responses = iter(['Here you go: [ "01.06", "June 2nd" ]', '[ "01.06" ]'])
+        client = FakeClient(respond=lambda dates: next(responses))
+        converter = DateConverter(client=client, cache_path=None, batch_size=2)
+
+        first = converter.convert_dates(["1 VI", "2 VI"])
+        second = converter.convert_dates(["3 VI", "4 VI"])
+
+        assert first == {"1 VI": "01.06"}
+        assert second == {}
+        assert "2 VI" not in converter.cache
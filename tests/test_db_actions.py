@@ -0,0 +1,317 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from benchmarks.synthetic import write_timetable_csv
+from convert_pdfs_to_csv import write_rows_to_csv
+from db_actions import (DEPARTURES_QUERY, RUNNING_ON_DATE_QUERY, SCHEMA_VERSION, TRAIN_ON_DATE_QUERY,
+                        TRAIN_SCHEDULE_COLUMNS, DatabaseManager)
+from timetable import expand_train_numbers
+
+REFERENCE = date(2025, 5, 1)
+
+
+def new_database(tmp_path, name="km_bot.db"):
+    return DatabaseManager(str(tmp_path / name), reference=REFERENCE)
+
+
+def schedule_rows(db_manager):
+    return sorted(db_manager.connection.execute(f"SELECT {', '.join(TRAIN_SCHEDULE_COLUMNS)} FROM train_schedule"))
+
+
+class TestBulkLoad:
+
+    # The bulk load stores the same rows as executing the string INSERTs
+    def test_bulk_load_matches_string_inserts(self, tmp_path):
+        # Arrange
+        csv_path = write_timetable_csv(str(tmp_path / "KM_table_current.csv"), 300)
+        string_db = new_database(tmp_path, "inserts.db")
+        bulk_db = new_database(tmp_path, "bulk.db")
+
+        # Act
+        string_db.insert_data(string_db.convert_to_inserts_with_date_splitting(csv_path))
+        row_count = bulk_db.load_csv(csv_path, chunk_size=100)
+
+        # Assert
+        assert row_count == len(schedule_rows(bulk_db))
+        assert row_count > 300
+        assert schedule_rows(bulk_db) == schedule_rows(string_db)
+
+    # Station names with quotes are stored as they are by the bulk load and by the exported SQL script
+    def test_quotes_are_stored_verbatim(self, tmp_path):
+        csv_path = tmp_path / "KM_table_current.csv"
+        csv_path.write_text("header\n10001;PRZYSTANEK 'A';7:30;RADOM;9:00;EN76;1;1 - 5 VI;\n", encoding='utf-8')
+        bulk_db = new_database(tmp_path, "bulk.db")
+        script_db = new_database(tmp_path, "script.db")
+        sql_path = str(tmp_path / "inserts.sql")
+
+        row_count = bulk_db.load_csv(str(csv_path))
+        script_db.write_inserts_to_file(script_db.iter_inserts_with_date_splitting(str(csv_path)), sql_path)
+        with open(sql_path, encoding='utf-8') as sql_file:
+            script_db.connection.executescript(sql_file.read())
+
+        assert row_count == 1
+        assert schedule_rows(bulk_db)[0][1] == "PRZYSTANEK 'A'"
+        assert schedule_rows(script_db) == schedule_rows(bulk_db)
+
+    # Rows are committed in chunks, an exact multiple of the chunk size included
+    def test_chunks_are_committed(self, tmp_path):
+        db_manager = new_database(tmp_path)
+        rows = ((str(10000 + i), "A", "7:30", "B", "9:00", "EN57", "1", "2025-06-01", "2025-06-01", None, 450)
+                for i in range(200))
+
+        row_count = db_manager.bulk_insert(rows, chunk_size=50)
+
+        assert row_count == 200
+        assert not db_manager.connection.in_transaction
+        assert len(schedule_rows(db_manager)) == 200
+
+
+class TestRowExpansion:
+
+    # Each CSV row expands into one row per date or range, train model and train number
+    def test_row_is_expanded(self, tmp_path):
+        # Arrange
+        csv_path = tmp_path / "KM_table_current.csv"
+        csv_path.write_text("header\n"
+                            "10002/3;WARSZAWA;7:30;RADOM;9:00;EN57, EN71;1, 1;1 - 5 VI, 8 VI;(C)\n"
+                            "10010;RADOM;10:00;WARSZAWA;11:30;EN76;1;9 VI;\n", encoding='utf-8')
+
+        # Act
+        rows = list(DatabaseManager(reference=REFERENCE).iter_rows_with_date_splitting(str(csv_path)))
+
+        # Assert
+        assert [(row[0], row[5], row[7], row[8], row[9]) for row in rows] == [
+            ("10002", "EN57", "2025-06-01", "2025-06-05", "C"), ("10003", "EN57", "2025-06-01", "2025-06-05", "C"),
+            ("10002", "EN71", "2025-06-01", "2025-06-05", "C"), ("10003", "EN71", "2025-06-01", "2025-06-05", "C"),
+            ("10002", "EN57", "2025-06-08", "2025-06-08", "C"), ("10003", "EN57", "2025-06-08", "2025-06-08", "C"),
+            ("10002", "EN71", "2025-06-08", "2025-06-08", "C"), ("10003", "EN71", "2025-06-08", "2025-06-08", "C"),
+            ("10010", "EN76", "2025-06-09", "2025-06-09", None),
+        ]
+        assert rows[-1] == ("10010", "RADOM", "10:00", "WARSZAWA", "11:30", "EN76", "1", "2025-06-09", "2025-06-09",
+                            None, 600)
+
+    # Cells quoted by the CSV writer are read as one value, lines that aren't rows are skipped
+    def test_quoted_cells_and_short_lines(self, tmp_path):
+        csv_path = tmp_path / "KM_table_current.csv"
+        csv_path.write_text('header\n10001;"PRZYSTANEK; A";7:30;RADOM;9:00;EN76;1;1 VI;\n\n10002;RADOM\n',
+                            encoding='utf-8')
+
+        rows = list(DatabaseManager(reference=REFERENCE).iter_rows_with_date_splitting(str(csv_path)))
+
+        assert rows == [("10001", "PRZYSTANEK; A", "7:30", "RADOM", "9:00", "EN76", "1", "2025-06-01", "2025-06-01",
+                         None, 450)]
+
+    # Train numbers are expanded like the in-memory timetable does, whatever the suffix length
+    def test_train_numbers_match_timetable(self, tmp_path):
+        csv_path = write_csv(tmp_path / "KM_table_current.csv", ["12345/67;A;7:30;B;9:00;EN57;1;1 VI;",
+                                                                 "23456/7;A;8:30;B;10:00;EN57;1;1 VI;"])
+
+        rows = list(DatabaseManager(reference=REFERENCE).iter_rows_with_date_splitting(csv_path))
+
+        assert [row[0] for row in rows] == [*expand_train_numbers("12345/67"), *expand_train_numbers("23456/7")]
+        assert [row[0] for row in rows] == ["12345", "12367", "23456", "23457"]
+
+    # A CSV written by write_rows_to_csv has no header, so its first line is a row too
+    def test_headerless_csv_keeps_first_row(self, tmp_path):
+        csv_path = tmp_path / "KM_table_current.csv"
+        write_rows_to_csv([["10001", "RADOM", "7:30", "WARSZAWA", "9:00", "EN76", "1", "1 VI", ""],
+                           ["10002", "WARSZAWA", "8:30", "RADOM", "10:00", "EN76", "1", "2 VI", ""]], str(csv_path))
+
+        rows = list(DatabaseManager(reference=REFERENCE).iter_rows_with_date_splitting(str(csv_path)))
+
+        assert [row[0] for row in rows] == ["10001", "10002"]
+
+
+class TestSchema:
+
+    # A new database gets the typed table, the indexes and the configured pragmas
+    def test_new_database_is_created_with_schema_and_pragmas(self, tmp_path):
+        # Act
+        db_manager = DatabaseManager(str(tmp_path / "km_bot.db"), synchronous="full", cache_size=-2048)
+
+        # Assert
+        connection = db_manager.connection
+        assert db_manager.schema_version() == SCHEMA_VERSION
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert connection.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+        assert connection.execute("PRAGMA cache_size").fetchone()[0] == -2048
+        columns = connection.execute("PRAGMA table_info(train_schedule)")
+        column_types = {name: column_type for _, name, column_type, *_ in columns}
+        assert column_types["id"] == "INTEGER"
+        assert column_types["departure_minutes"] == "INTEGER"
+        assert all(column_types[column] == "TEXT" for column in TRAIN_SCHEDULE_COLUMNS if column != "departure_minutes")
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(train_schedule)")}
+        assert indexes == {"idx_train_schedule_train_nr", "idx_train_schedule_route", "idx_train_schedule_dates",
+                           "idx_train_schedule_key"}
+
+    # A table created by hand before the schema was managed is migrated with its rows, whose raw dates
+    # are dropped until the next diff load replaces them
+    def test_unmanaged_table_is_migrated(self, tmp_path):
+        db_path = str(tmp_path / "km_bot.db")
+        connection = sqlite3.connect(db_path)
+        connection.execute("CREATE TABLE train_schedule (train_nr, departure_station, departure_time, arrival_station, "
+                           "arrival_time, train_model, count, start_date, end_date)")
+        connection.execute("INSERT INTO train_schedule VALUES ('10001', 'A', '7:30', 'B', '9:00', 'EN57', '1', '1 VI', "
+                           "'1 VI')")
+        connection.commit()
+        connection.close()
+
+        db_manager = DatabaseManager(db_path, reference=REFERENCE)
+        db_manager.close()
+        db_manager.connect(db_path)
+        migrated_rows = schedule_rows(db_manager)
+        counts = db_manager.load_csv_diff(write_csv(tmp_path / "KM_table_current.csv",
+                                                    ["10001;A;7:30;B;9:00;EN57;1;1 VI;"]))
+
+        assert db_manager.schema_version() == SCHEMA_VERSION
+        assert migrated_rows == [("10001", "A", "7:30", "B", "9:00", "EN57", "1", None, None, None, None)]
+        assert counts == {"inserted": 1, "retired": 1, "unchanged": 0}
+        assert schedule_rows(db_manager) == [("10001", "A", "7:30", "B", "9:00", "EN57", "1", "2025-06-01",
+                                              "2025-06-01", None, 450)]
+
+    # A schema from a newer version is not touched
+    def test_newer_schema_is_rejected(self, tmp_path):
+        db_manager = new_database(tmp_path)
+        db_manager.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+        with pytest.raises(ValueError):
+            db_manager.migrate()
+
+    # Unknown pragma values are rejected before they reach SQL
+    def test_invalid_pragma_is_rejected(self):
+        with pytest.raises(ValueError):
+            DatabaseManager(journal_mode="WAL; DROP TABLE train_schedule")
+
+    # The bot's lookups are index searches, not table scans
+    @pytest.mark.parametrize("query, parameters, index", [
+        (TRAIN_ON_DATE_QUERY, ("10001", "2025-06-01", "2025-06-01"), "idx_train_schedule_train_nr"),
+        (DEPARTURES_QUERY, ("WARSZAWA", "RADOM", 450, "2025-06-01", "2025-06-01"), "idx_train_schedule_route"),
+        (RUNNING_ON_DATE_QUERY, ("2025-06-01", "2025-06-01"), "idx_train_schedule_dates"),
+    ])
+    def test_queries_use_indexes(self, tmp_path, query, parameters, index):
+        db_manager = new_database(tmp_path)
+        db_manager.load_csv(write_timetable_csv(str(tmp_path / "KM_table_current.csv"), 300))
+        db_manager.connection.execute("ANALYZE")
+
+        plan = db_manager.explain(query, parameters)
+
+        assert len(plan) == 1
+        assert plan[0].startswith(f"SEARCH train_schedule USING INDEX {index} ")
+
+
+def write_csv(path, lines):
+    path.write_text("header\n" + "".join(line + "\n" for line in lines), encoding='utf-8')
+    return str(path)
+
+
+class TestDiffLoad:
+
+    # A corrected CSV inserts only the new rows, retires only the removed ones and leaves the rest alone
+    def test_reload_touches_only_changed_rows(self, tmp_path):
+        # Arrange
+        db_manager = new_database(tmp_path)
+        first = write_csv(tmp_path / "first.csv", ["10001;A;7:30;B;9:00;EN57;1;1 VI, 2 VI;",
+                                                   "10002;B;8:30;C;9:30;EN76;1;3 VI;",
+                                                   "10003;C;9:30;D;10:30;EN71;1;4 VI;"])
+        second = write_csv(tmp_path / "second.csv", ["10001;A;7:30;B;9:00;EN57;1;1 VI, 2 VI;",
+                                                     "10002;B;8:35;C;9:30;EN76;1;3 VI;",
+                                                     "10004;D;11:30;E;12:30;EN71;1;5 VI;"])
+        db_manager.load_csv_diff(first)
+        ids_before = dict(db_manager.connection.execute("SELECT start_date, id FROM train_schedule"))
+
+        # Act
+        counts = db_manager.load_csv_diff(second)
+
+        # Assert
+        assert counts == {"inserted": 2, "retired": 2, "unchanged": 2}
+        ids_after = dict(db_manager.connection.execute("SELECT start_date, id FROM train_schedule"))
+        for unchanged_date in ("2025-06-01", "2025-06-02"):
+            assert ids_after[unchanged_date] == ids_before[unchanged_date]
+        assert [row[0] for row in schedule_rows(db_manager)] == ["10001", "10001", "10002", "10004"]
+        assert db_manager.load_csv_diff(second) == {"inserted": 0, "retired": 0, "unchanged": 4}
+
+    # Identical rows are kept as many times as the CSV has them
+    def test_duplicate_rows_are_counted(self, tmp_path):
+        db_manager = new_database(tmp_path)
+        row = "10001;A;7:30;B;9:00;EN57;1;1 VI;"
+
+        first = db_manager.load_csv_diff(write_csv(tmp_path / "first.csv", [row, row, row]))
+        second = db_manager.load_csv_diff(write_csv(tmp_path / "second.csv", [row]))
+
+        assert first == {"inserted": 3, "retired": 0, "unchanged": 0}
+        assert second == {"inserted": 0, "retired": 2, "unchanged": 1}
+        assert len(schedule_rows(db_manager)) == 1
+
+    # Rows bulk loaded before are keyed too, so the first diff load only applies the changes
+    def test_diff_after_bulk_load(self, tmp_path):
+        csv_path = write_timetable_csv(str(tmp_path / "KM_table_current.csv"), 300)
+        db_manager = new_database(tmp_path)
+        row_count = db_manager.load_csv(csv_path)
+
+        counts = db_manager.load_csv_diff(csv_path)
+
+        assert counts == {"inserted": 0, "retired": 0, "unchanged": row_count}
+
+    # A bulk load into a table that has the same rows already counts their occurrences on from there
+    def test_bulk_load_continues_occurrences(self, tmp_path):
+        csv_path = write_csv(tmp_path / "KM_table_current.csv", ["10001;A;7:30;B;9:00;EN57;1;1 VI;"] * 2)
+        db_manager = new_database(tmp_path)
+
+        db_manager.load_csv(csv_path)
+        db_manager.load_csv(csv_path)
+
+        occurrences = db_manager.connection.execute("SELECT occurrence FROM train_schedule ORDER BY occurrence")
+        assert [occurrence for occurrence, in occurrences] == [0, 1, 2, 3]
+
+
+class TestQueries:
+
+    # A train is found only on the days its dates and annotation let it run
+    def test_find_train_on_date(self, tmp_path):
+        # Arrange
+        db_manager = new_database(tmp_path)
+        db_manager.load_csv_diff(write_csv(tmp_path / "KM_table_current.csv", [
+            "10001;A;7:30;B;9:00;EN57;1;1 - 30 VI;(C)",
+            "10001;A;17:30;B;19:00;EN57;1;2 - 6 VI;",
+            "10002;B;8:30;C;9:30;EN76;1;3 VI;",
+        ]))
+
+        # Act
+        saturday = db_manager.find_train("10001", date(2025, 6, 7))
+        monday = db_manager.find_train("10001", date(2025, 6, 2))
+        july = db_manager.find_train("10001", date(2025, 7, 5))
+
+        # Assert
+        assert [(row[2], row[9]) for row in saturday] == [("7:30", "C")]
+        assert [row[2] for row in monday] == ["17:30"]
+        assert july == []
+
+    # Departures are the next ones from the given time running on the day, in time order
+    def test_find_departures_after_time(self, tmp_path):
+        db_manager = new_database(tmp_path)
+        db_manager.load_csv_diff(write_csv(tmp_path / "KM_table_current.csv", [
+            "10005;A;9:15;B;10:00;EN57;1;1 - 30 VI;",
+            "10001;A;6:30;B;7:30;EN57;1;1 - 30 VI;",
+            "10003;A;8:10;B;9:00;EN57;1;1 - 30 VI;(C)",
+            "10004;A;8:40;B;9:30;EN57;1;1 - 30 VI;",
+            "10002;A;7:45;B;8:30;EN57;1;1 - 30 VI;",
+            "10006;B;8:00;A;9:00;EN57;1;1 - 30 VI;",
+        ]))
+
+        departures = db_manager.find_departures("A", "B", 7 * 60 + 30, date(2025, 6, 2), limit=2)
+
+        assert [row[0] for row in departures] == ["10002", "10004"]
+        assert [row[0] for row in db_manager.find_departures("A", "B", 0, date(2025, 8, 1))] == []
+
+    # A full-year range is stored in the reference year and found before and after 1 July
+    def test_full_year_range(self, tmp_path):
+        csv_line = "10001;A;7:30;B;9:00;EN57;1;1 I - 31 XII;"
+        for reference in (date(2026, 3, 1), date(2026, 10, 18)):
+            db_manager = DatabaseManager(str(tmp_path / f"{reference}.db"), reference=reference)
+            db_manager.load_csv_diff(write_csv(tmp_path / "KM_table_current.csv", [csv_line]))
+
+            assert schedule_rows(db_manager)[0][7:9] == ("2026-01-01", "2026-12-31")
+            assert [row[0] for row in db_manager.find_train("10001", reference)] == ["10001"]
+            assert [row[0] for row in db_manager.find_departures("A", "B", 0, reference)] == ["10001"]
@@ -0,0 +1,39 @@
+import json
+import os
+
+import pytest
+
+from convert_pdfs_to_csv import extract_table_from_pdf_page
+
+# Page texts with the rows the previous parser extracted from them
+# (regenerate with: python -m benchmarks.legacy_parser tests/fixtures/parser_golden.json)
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'parser_golden.json')
+
+with open(GOLDEN_PATH, encoding='utf-8') as golden_file:
+    GOLDEN_PAGES = json.load(golden_file)
+
+
+class TestExtractTableFromPdfPage:
+
+    # The state-machine parser extracts exactly the rows the previous parser did
+    @pytest.mark.parametrize("page", GOLDEN_PAGES, ids=[page["name"] for page in GOLDEN_PAGES])
+    def test_matches_golden_rows(self, page):
+        assert extract_table_from_pdf_page(page["page_text"]) == page["rows"]
+
+    # EU47 count lines also carry the first part of the dates, which joins the next line
+    def test_eu47_dates_are_carried_to_dates_column(self):
+        # Arrange
+        page_text = "\n".join(["19211", "WARSZAWA", "7:30", "RADOM", "9:00", "EU47, EU47", "1 1 2, 4 - 9", "XII (D)"])
+
+        # Act
+        result = extract_table_from_pdf_page(page_text)
+
+        # Assert
+        assert result == [["19211", "WARSZAWA", "7:30", "RADOM", "9:00", "EU47, EU47", "1 1", "2, 4 - 9 XII (D)"]]
+
+    # A row whose dates are missing is dropped
+    def test_row_without_dates_is_dropped(self):
+        page_text = "\n".join(["19211", "WARSZAWA", "7:30", "RADOM", "9:00", "EN76", "1",
+                               "19213", "RADOM", "10:00", "WARSZAWA", "11:30", "EN76", "1", "2 XII"])
+        assert extract_table_from_pdf_page(page_text) == [
+            ["19213", "RADOM", "10:00", "WARSZAWA", "11:30", "EN76", "1", "2 XII"]]
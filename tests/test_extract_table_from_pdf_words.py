@@ -0,0 +1,91 @@
+import pymupdf
+import pytest
+
+from benchmarks.synthetic import generate_rows, table_row, write_timetable_pdf
+from convert_pdfs_to_csv import (extract_rows_from_all_pdfs, extract_rows_from_page, extract_rows_from_pdf,
+                                 extract_table_from_pdf_words)
+
+
+class TestExtractTableFromPdfWords:
+
+    # The words engine reads back exactly the generated rows, including two-line stations,
+    # multi-line dates and EU47 rows
+    def test_reads_back_generated_timetable(self, tmp_path):
+        # Arrange
+        rows = generate_rows(150, seed=3)
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), rows)
+
+        # Act
+        extracted = list(extract_rows_from_pdf(pdf_path, engine='words'))
+
+        # Assert
+        assert extracted == [table_row(row) for row in rows]
+        assert any("WARSZAWA ZACHODNIA PERON 8" in row for row in extracted)
+        assert any("WARSZAWA LOTNISKO CHOPINA" in row for row in extracted)
+        assert any(row[5] == "EU47" for row in extracted)
+        assert any(row[7].count(",") >= 2 for row in extracted)
+
+    # Pages that don't repeat the header are read with the columns of the first page
+    def test_pages_without_header_use_previous_columns(self, tmp_path):
+        rows = generate_rows(150, seed=4)
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), rows, repeat_header=False)
+
+        extracted = list(extract_rows_from_pdf(pdf_path, engine='words'))
+
+        assert len(pymupdf.open(pdf_path)) > 1
+        assert extracted == [table_row(row) for row in rows]
+
+    # The text engine reads the generated layout the same as the words engine
+    def test_text_engine_reads_back_generated_timetable(self, tmp_path):
+        rows = generate_rows(150, seed=3)
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), rows)
+
+        extracted = list(extract_rows_from_pdf(pdf_path))
+
+        assert extracted == [table_row(row) for row in rows]
+
+    # A single page read on its own still finds the columns on the pages before it
+    def test_page_read_alone_uses_previous_columns(self, tmp_path):
+        rows = generate_rows(150, seed=4)
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), rows, repeat_header=False)
+        expected = list(extract_rows_from_pdf(pdf_path, engine='words'))
+
+        with pymupdf.open(pdf_path) as doc:
+            last_page_rows = extract_rows_from_page(doc, len(doc) - 1, engine='words')
+
+        assert last_page_rows and last_page_rows == expected[-len(last_page_rows):]
+
+    # Rows without dates are dropped, like the text engine does
+    def test_row_without_dates_is_dropped(self, tmp_path):
+        rows = generate_rows(3, seed=5)
+        rows[1][7] = rows[1][8] = ""
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), rows)
+
+        extracted = list(extract_rows_from_pdf(pdf_path, engine='words'))
+
+        assert [row[0] for row in extracted] == [rows[0][0], rows[2][0]]
+
+    # A page without a table header can't be read by coordinates
+    def test_page_without_header_returns_none(self):
+        words = [(20, 80, 40, 86, "10000", 0, 0, 0), (60, 80, 90, 86, "RADOM", 0, 1, 0)]
+
+        assert extract_table_from_pdf_words(words) is None
+
+    # The process pool gives the same rows as the serial run with the words engine too
+    def test_parallel_words_engine_matches_serial(self, tmp_path):
+        source_dir = tmp_path / "pdf"
+        write_timetable_pdf(str(source_dir / "a.pdf"), generate_rows(120, seed=6))
+        write_timetable_pdf(str(source_dir / "b.pdf"), generate_rows(80, seed=7))
+
+        serial = extract_rows_from_all_pdfs(str(source_dir), engine='words')
+        parallel = extract_rows_from_all_pdfs(str(source_dir), workers=2, engine='words')
+
+        assert parallel == serial
+        assert len(serial) == 200
+
+    # An unknown engine is rejected
+    def test_unknown_engine_raises(self, tmp_path):
+        pdf_path = write_timetable_pdf(str(tmp_path / "timetable.pdf"), generate_rows(3))
+
+        with pytest.raises(ValueError):
+            list(extract_rows_from_pdf(pdf_path, engine='ocr'))
@@ -0,0 +1,49 @@
+import os
+
+import convert_pdfs_to_csv
+from convert_pdfs_to_csv import extract_rows_from_all_pdfs
+from pdf_helpers import make_rows, write_pdf
+
+
+class TestExtractionCache:
+
+    # Unchanged PDFs are served from the cache, a changed one is parsed again
+    def test_only_changed_pdfs_are_parsed(self, tmp_path, monkeypatch):
+        # Arrange
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        cache_dir = str(tmp_path / "cache")
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 5)])
+        write_pdf(str(source_dir / "b.pdf"), [make_rows(19000, 5)])
+        first_run = extract_rows_from_all_pdfs(str(source_dir), cache_dir=cache_dir)
+
+        parsed = []
+        extract_rows_from_pdf = convert_pdfs_to_csv.extract_rows_from_pdf
+        monkeypatch.setattr(convert_pdfs_to_csv, 'extract_rows_from_pdf',
+                            lambda pdf_path, engine='text': parsed.append(os.path.basename(pdf_path)) or
+                            extract_rows_from_pdf(pdf_path, engine))
+
+        # Act
+        second_run = extract_rows_from_all_pdfs(str(source_dir), cache_dir=cache_dir)
+        write_pdf(str(source_dir / "b.pdf"), [make_rows(19500, 3)])
+        third_run = extract_rows_from_all_pdfs(str(source_dir), cache_dir=cache_dir)
+
+        # Assert
+        assert second_run == first_run
+        assert parsed == ["b.pdf"]
+        assert [row[0] for row in third_run] == [row[0] for row in first_run[:5]] + ["19500", "19501", "19502"]
+        assert len(os.listdir(cache_dir)) == 2
+
+    # Bumping the parser version invalidates every entry
+    def test_parser_version_invalidates_cache(self, tmp_path, monkeypatch):
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        cache_dir = str(tmp_path / "cache")
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 5)])
+        extract_rows_from_all_pdfs(str(source_dir), cache_dir=cache_dir)
+        old_entries = set(os.listdir(cache_dir))
+
+        monkeypatch.setattr(convert_pdfs_to_csv, 'PARSER_VERSION', 'next')
+        extract_rows_from_all_pdfs(str(source_dir), cache_dir=cache_dir)
+
+        assert set(os.listdir(cache_dir)).isdisjoint(old_entries)
@@ -0,0 +1,14 @@
+from benchmarks.fake_telegram import run
+
+
+class TestFakeTelegram:
+
+    # A webhook burst far larger than the default listen backlog of 5 is answered without any
+    # connection waiting on a SYN retransmit, which takes at least a second
+    def test_webhook_burst_is_answered(self):
+        # Act
+        results = run('webhook', updates=100, sequential=1, concurrency=16, trains=200, timeout=60)
+
+        # Assert
+        assert len(results["burst"]) == 100
+        assert max(results["burst"]) < 1000
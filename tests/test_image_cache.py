@@ -0,0 +1,23 @@
+from image_cache import FileIdStore
+
+IMAGE_URL = 'https://users.pja.edu.pl/~s28102/KM_Bot/Images/Elf.jpg'
+
+
+class TestFileIdStore:
+
+    # Stored file_ids survive a restart
+    def test_file_ids_are_persisted(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / "data" / "file_ids.json")
+
+        # Act
+        FileIdStore(path).set(IMAGE_URL, "AgACAgQAAxkBAAIB")
+        reloaded = FileIdStore(path)
+
+        # Assert
+        assert reloaded.get(IMAGE_URL) == "AgACAgQAAxkBAAIB"
+        assert IMAGE_URL in reloaded
+
+    # Images never uploaded have no file_id
+    def test_missing_file_id(self, tmp_path):
+        assert FileIdStore(str(tmp_path / "file_ids.json")).get(IMAGE_URL) is None
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import km_bot
+from timetable import TimetableStore
+from tracing import LatencyTracer
+
+BURST_SIZE = 300
+MAX_LOOP_LAG = 0.1  # seconds
+
+
+def make_update(text, replies):
+    async def reply_text(reply, **kwargs):
+        replies.append(reply)
+
+    chat = SimpleNamespace(type='private', username='tester')
+    return SimpleNamespace(message=SimpleNamespace(text=text, chat=chat, reply_text=reply_text))
+
+
+class TestHandleMessageConcurrency:
+
+    # A burst of updates with slow lookups never blocks the event loop for long
+    def test_burst_does_not_block_event_loop(self, tmp_path, monkeypatch, capsys):
+        # Arrange
+        csv_path = tmp_path / "timetable.csv"
+        csv_path.write_text("19211/3;GRODZISK MAZ.;7:30;WARSZAWA ZACHODNIA;8:10;EN76;1;;\n", encoding='utf-8')
+        monkeypatch.setattr(km_bot, 'timetable_store', TimetableStore(str(csv_path)))
+        monkeypatch.setattr(km_bot, 'tracer', LatencyTracer(sample_rate=1.0))
+
+        handle_response = km_bot.handle_response
+
+        def slow_handle_response(text):
+            time.sleep(0.005)  # stands in for disk I/O or a timetable reload
+            return handle_response(text)
+
+        monkeypatch.setattr(km_bot, 'handle_response', slow_handle_response)
+        replies = []
+        updates = [make_update("19213" if i % 2 else "GRODZISK MAZ., WARSZAWA ZACHODNIA, 7:30", replies)
+                   for i in range(BURST_SIZE)]
+
+        async def run_burst():
+            max_lag = 0.0
+            done = asyncio.Event()
+
+            async def watch_loop():
+                nonlocal max_lag
+                while not done.is_set():
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.001)
+                    max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+            watcher = asyncio.create_task(watch_loop())
+            await asyncio.gather(*(km_bot.handle_message(update, None) for update in updates))
+            done.set()
+            await watcher
+            return max_lag
+
+        # Act
+        max_lag = asyncio.run(run_burst())
+
+        # Assert
+        assert len(replies) == BURST_SIZE
+        assert all("EN76" not in reply and "Elf" in reply for reply in replies)
+        assert max_lag < MAX_LOOP_LAG
+        assert km_bot.tracer.summary()["total"]["count"] == BURST_SIZE
+        assert {"parse", "lookup", "format", "send"} <= set(km_bot.tracer.summary())
+
+
+class TestUploadTrainImages:
+
+    # A store that can't be written to doesn't stop the bot from starting; the file_ids stay in memory
+    def test_unwritable_store_keeps_file_ids_in_memory(self, tmp_path, monkeypatch, capsys):
+        # Arrange
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        store = km_bot.FileIdStore(str(data_dir / "file_ids.json"))
+        monkeypatch.setattr(km_bot, 'file_id_store', store)
+        monkeypatch.setattr(km_bot, 'IMAGE_CACHE_CHAT_ID', '42')
+
+        def failing_open(*args, **kwargs):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr('builtins.open', failing_open)
+
+        async def send_photo(chat_id, photo):
+            return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id=f"id-{photo}")])
+
+        application = SimpleNamespace(bot=SimpleNamespace(send_photo=send_photo))
+
+        # Act
+        asyncio.run(km_bot.upload_train_images(application))
+        monkeypatch.undo()
+
+        # Assert
+        assert store.get(km_bot.DEFAULT_TRAIN_IMAGE) == f"id-{km_bot.DEFAULT_TRAIN_IMAGE}"
+        assert "Error saving the file_id" in capsys.readouterr().out
+
+
+class TestStationLookup:
+
+    # Departures filed under another spelling of the same station are found too, the nearest one first
+    def test_departures_under_every_spelling(self, tmp_path, monkeypatch):
+        csv_path = tmp_path / "timetable.csv"
+        csv_path.write_text("19211;GRODZISK MAZ.;7:30;WARSZAWA ZACHODNIA;8:10;EN76;1;;\n"
+                            "19213;GRODZISK MAZ;7:40;WARSZAWA ZACHODNIA;8:20;EN76;1;;\n", encoding='utf-8')
+        monkeypatch.setattr(km_bot, 'timetable_store', TimetableStore(str(csv_path)))
+
+        response = km_bot.get_train_info_from_stations("grodzisk maz", "warszawa zachodnia", "7:39")
+
+        assert response["numer_pociagu"] == "19213"
@@ -0,0 +1,40 @@
+import convert_pdfs_to_csv
+from convert_pdfs_to_csv import convert_all_pdfs_to_single_csv, extract_page_rows
+from pdf_helpers import make_rows, write_pdf
+
+
+class TestParallelExtraction:
+
+    # The process-pool run writes exactly the same CSV as the serial run
+    def test_parallel_output_is_identical_to_serial(self, tmp_path):
+        # Arrange
+        source_dir = tmp_path / "pdf"
+        source_dir.mkdir()
+        write_pdf(str(source_dir / "b.pdf"), [make_rows(19000, 12), make_rows(19100, 11)])
+        write_pdf(str(source_dir / "a.pdf"), [make_rows(18000, 10), make_rows(18100, 12), make_rows(18200, 5)])
+        serial_csv = tmp_path / "serial.csv"
+        parallel_csv = tmp_path / "parallel.csv"
+
+        # Act
+        convert_all_pdfs_to_single_csv(str(source_dir), str(serial_csv))
+        convert_all_pdfs_to_single_csv(str(source_dir), str(parallel_csv), workers=3)
+
+        # Assert
+        assert parallel_csv.read_bytes() == serial_csv.read_bytes()
+        assert serial_csv.read_text(encoding='utf-8').splitlines()[0].startswith("18000;")
+        assert len(serial_csv.read_text(encoding='utf-8').splitlines()) == 50
+
+    # A worker keeps only the PDF it is reading open and closes the previous one
+    def test_worker_closes_previous_pdf(self, tmp_path):
+        first_pdf, second_pdf = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+        write_pdf(first_pdf, [make_rows(18000, 10)])
+        write_pdf(second_pdf, [make_rows(19000, 10)])
+
+        extract_page_rows(first_pdf, 0)
+        first_doc, _ = convert_pdfs_to_csv._open_documents[first_pdf]
+        rows = extract_page_rows(second_pdf, 0)
+
+        assert first_doc.is_closed
+        assert list(convert_pdfs_to_csv._open_documents) == [second_pdf]
+        assert rows[0][0] == "19000"
+        convert_pdfs_to_csv._open_documents.pop(second_pdf)[0].close()
@@ -0,0 +1,52 @@
+from datetime import date
+
+from response_cache import ResponseCache
+
+TODAY = date(2025, 1, 10)
+TOMORROW = date(2025, 1, 11)
+RESPONSE = {"numer_pociagu": "19211", "typ_taboru": "Elf"}
+
+
+class TestResponseCache:
+
+    # A stored response is returned for the same query, day and snapshot
+    def test_hit_and_miss_counters(self):
+        # Arrange
+        cache = ResponseCache()
+        snapshot = object()
+
+        # Act
+        first = cache.get("19211", TODAY, snapshot)
+        cache.put("19211", TODAY, snapshot, RESPONSE)
+        second = cache.get("19211", TODAY, snapshot)
+
+        # Assert
+        assert first is None
+        assert second == RESPONSE
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    # The least recently used entry is evicted when the cache is full
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_size=2)
+        snapshot = object()
+        cache.put("a", TODAY, snapshot, RESPONSE)
+        cache.put("b", TODAY, snapshot, RESPONSE)
+        cache.get("a", TODAY, snapshot)
+        cache.put("c", TODAY, snapshot, RESPONSE)
+
+        assert cache.get("b", TODAY, snapshot) is None
+        assert cache.get("a", TODAY, snapshot) == RESPONSE
+        assert cache.stats()["evictions"] == 1
+
+    # Entries expire at midnight and when the timetable snapshot is reloaded
+    def test_invalidated_by_new_day_and_new_snapshot(self):
+        cache = ResponseCache()
+        snapshot = object()
+        cache.put("19211", TODAY, snapshot, RESPONSE)
+
+        assert cache.get("19211", TOMORROW, snapshot) is None
+
+        cache.put("19211", TOMORROW, snapshot, RESPONSE)
+        assert cache.get("19211", TOMORROW, object()) is None
+        assert cache.stats()["invalidations"] == 2
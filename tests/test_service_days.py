@@ -0,0 +1,111 @@
+from datetime import date
+
+import pytest
+
+from service_days import ServiceCalendar, convert_date_expression, parse_date_expression, runs_with_annotation
+
+
+class TestParseDateExpression:
+
+    # Days without a month take the month of the next date that has one
+    def test_mixed_list_and_range(self):
+        spans, annotation = parse_date_expression("2,4-9 XII (D)")
+        assert spans == [((2, 12), (2, 12)), ((4, 12), (9, 12))]
+        assert annotation == "D"
+
+    # The spaced format written by format_date_strings parses the same way
+    def test_spaced_format(self):
+        spans, annotation = parse_date_expression("27 XI, 30 XI - 1 XII")
+        assert spans == [((27, 11), (27, 11)), ((30, 11), (1, 12))]
+        assert annotation is None
+
+    # Dates already converted to DD.MM are accepted too
+    def test_arabic_dates(self):
+        spans, _ = parse_date_expression("01.06 - 05.07")
+        assert spans == [((1, 6), (5, 7))]
+
+
+class TestConvertDateExpression:
+
+    # Every format listed in the model's system prompt converts to the same DD.MM output
+    def test_system_prompt_examples(self):
+        inputs = ["1 VI", "1 VI - 5 VII", "1, 2 VI", "1 - 5 VI", "1 VI (C)", "15 VIII", "1 I - 31 XII", "1, 15, 30 IX"]
+        expected = ["01.06", "01.06 - 05.07", "01.06, 02.06", "01.06 - 05.06", "01.06 (C)", "15.08",
+                    "01.01 - 31.12", "01.09, 15.09, 30.09"]
+        assert [convert_date_expression(text) for text in inputs] == expected
+
+    # Mixed lists, cross-month ranges and annotations with a hyphen are converted too
+    def test_mixed_list_with_annotation(self):
+        assert convert_date_expression("2,4-9 XII (1-5)") == "02.12, 04.12 - 09.12 (1-5)"
+        assert convert_date_expression("27 XI, 30 XI - 1 XII") == "27.11, 30.11 - 01.12"
+
+    # Unknown formats and out-of-range dates are rejected rather than guessed
+    def test_invalid_dates_raise(self):
+        for text in ["1 XIIII", "kursuje codziennie", "32 I", "01.13"]:
+            with pytest.raises(ValueError):
+                convert_date_expression(text)
+
+
+class TestRunsWithAnnotation:
+
+    # (D) means workdays except holidays; single-digit holiday days must be recognized
+    def test_workdays_without_holidays(self):
+        assert runs_with_annotation("D", date(2025, 1, 2))  # Thursday
+        assert not runs_with_annotation("D", date(2025, 1, 6))  # Monday, Trzech Króli
+        assert not runs_with_annotation("D", date(2025, 1, 4))  # Saturday
+
+    # A range of weekdays like (5-6) means Friday and Saturday
+    def test_weekday_range(self):
+        assert runs_with_annotation("5-6", date(2025, 1, 3))
+        assert not runs_with_annotation("5-6", date(2025, 1, 5))
+
+
+class TestServiceCalendar:
+
+    # "Runs on date D" matches the dates and annotation of the row
+    def test_compile_range_with_annotation(self):
+        # Arrange
+        calendar = ServiceCalendar(date(2024, 12, 1))
+
+        # Act
+        mask = calendar.compile("2, 4 - 9 XII", "(D)")
+
+        # Assert
+        assert calendar.runs_on(mask, date(2024, 12, 2))
+        assert not calendar.runs_on(mask, date(2024, 12, 3))  # not listed
+        assert calendar.runs_on(mask, date(2024, 12, 4))
+        assert not calendar.runs_on(mask, date(2024, 12, 7))  # Saturday
+        assert not calendar.runs_on(mask, date(2025, 12, 2))  # next year's December
+
+    # A range crossing the new year continues into the next year
+    def test_range_across_new_year(self):
+        calendar = ServiceCalendar(date(2025, 1, 10))
+        mask = calendar.compile("14 XII - 8 III")
+        assert calendar.runs_on(mask, date(2024, 12, 20))
+        assert calendar.runs_on(mask, date(2025, 1, 10))
+        assert not calendar.runs_on(mask, date(2025, 3, 9))
+
+    # A range over the whole year is placed in the reference year, also late in the year
+    def test_full_year_range(self):
+        calendar = ServiceCalendar(date(2026, 10, 18))
+        mask = calendar.compile("1 I - 31 XII")
+        assert calendar.span_dates(((1, 1), (31, 12))) == (date(2026, 1, 1), date(2026, 12, 31))
+        assert calendar.runs_on(mask, date(2026, 10, 19))
+        assert calendar.runs_on(mask, date(2026, 2, 1))
+        assert not calendar.runs_on(mask, date(2027, 1, 1))
+
+    # A range longer than six months crossing the new year contains the reference date
+    def test_long_range_across_new_year(self):
+        calendar = ServiceCalendar(date(2026, 6, 12))
+        assert calendar.span_dates(((1, 11), (30, 6))) == (date(2025, 11, 1), date(2026, 6, 30))
+
+        calendar = ServiceCalendar(date(2026, 10, 18))
+        mask = calendar.compile("1 III - 28 II")
+        assert calendar.span_dates(((1, 3), (28, 2))) == (date(2026, 3, 1), date(2027, 2, 28))
+        assert calendar.runs_on(mask, date(2026, 10, 18))
+        assert not calendar.runs_on(mask, date(2027, 3, 1))
+
+    # Unparsable dates never run instead of raising on every lookup
+    def test_unparsable_dates(self):
+        calendar = ServiceCalendar(date(2025, 1, 10))
+        assert calendar.compile("kiedyś") == 0
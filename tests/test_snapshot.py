@@ -0,0 +1,102 @@
+import random
+from datetime import date
+
+import pytest
+
+import convert_pdfs_to_csv
+import snapshot
+from benchmarks.synthetic import write_timetable_csv
+from snapshot import SnapshotTimetable, SnapshotTimetableStore, load_snapshot, write_snapshot
+from timetable import Timetable
+
+DAY = date.today()
+
+
+def write_csv_and_snapshot(tmp_path, train_count=500):
+    csv_path = write_timetable_csv(str(tmp_path / "KM_table_current.csv"), train_count)
+    timetable = Timetable.from_csv(csv_path)
+    write_snapshot(timetable, csv_path)
+    return csv_path, timetable
+
+
+class TestSnapshot:
+
+    # Every lookup answers the same from the snapshot as from the CSV
+    def test_lookups_match_csv_timetable(self, tmp_path):
+        # Arrange
+        csv_path, timetable = write_csv_and_snapshot(tmp_path)
+        rng = random.Random(0)
+
+        # Act
+        loaded = load_snapshot(csv_path)
+
+        # Assert
+        assert isinstance(loaded, SnapshotTimetable)
+        assert list(loaded.rows) == timetable.rows
+        assert list(loaded.service_days) == timetable.service_days
+        for train_nr in timetable.train_numbers[:100] + ["99999"]:
+            assert loaded.find_by_number(train_nr) == timetable.find_by_number(train_nr)
+        for prefix in ["1", "10", "105", "9"]:
+            assert loaded.complete_train_numbers(prefix, DAY) == timetable.complete_train_numbers(prefix, DAY)
+        for row in rng.sample(timetable.rows, 100):
+            minutes = rng.randrange(24 * 60)
+            assert (loaded.find_departures(row[1], row[3], minutes, DAY, 180)
+                    == timetable.find_departures(row[1], row[3], minutes, DAY, 180))
+        assert loaded.stations.by_normalized == timetable.stations.by_normalized
+
+    # A snapshot of an older CSV is rejected and the store parses the CSV instead
+    def test_stale_snapshot_is_rejected(self, tmp_path):
+        csv_path, _ = write_csv_and_snapshot(tmp_path)
+        write_timetable_csv(csv_path, 400, seed=1)
+
+        store = SnapshotTimetableStore(csv_path)
+
+        assert load_snapshot(csv_path) is None
+        assert type(store.get()) is Timetable
+        assert len(store.get().rows) == 400
+
+    # A snapshot written by another format version is rejected
+    def test_other_version_is_rejected(self, tmp_path, monkeypatch):
+        csv_path, _ = write_csv_and_snapshot(tmp_path)
+
+        monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+
+        assert load_snapshot(csv_path) is None
+
+    # The store maps a current snapshot instead of parsing the CSV
+    def test_store_uses_current_snapshot(self, tmp_path):
+        csv_path, _ = write_csv_and_snapshot(tmp_path)
+
+        store = SnapshotTimetableStore(csv_path)
+
+        assert isinstance(store.get(), SnapshotTimetable)
+        assert store.get() is store.get()
+
+    # A train running all year runs today in the snapshot too
+    def test_full_year_range_runs_today(self, tmp_path):
+        csv_path = str(tmp_path / "KM_table_current.csv")
+        with open(csv_path, "w", encoding="utf-8") as file:
+            file.write("10001;A;7:30;B;9:00;EN57;1;1 I - 31 XII;\n")
+        write_snapshot(Timetable.from_csv(csv_path), csv_path)
+
+        loaded = load_snapshot(csv_path)
+
+        assert loaded.runs_on(0, DAY)
+
+    # A conversion whose CSV write fails leaves the previous snapshot alone instead of rebuilding it
+    def test_failed_conversion_keeps_snapshot(self, tmp_path, monkeypatch):
+        csv_path, _ = write_csv_and_snapshot(tmp_path)
+        with open(snapshot.snapshot_path_for(csv_path), 'rb') as snapshot_file:
+            previous_snapshot = snapshot_file.read()
+
+        def failing_rows(*args):
+            yield ["19300", "RADOM", "8:00"]
+            raise ValueError("broken page")
+
+        monkeypatch.setattr(convert_pdfs_to_csv, 'iter_rows_from_all_pdfs', failing_rows)
+        monkeypatch.setattr(convert_pdfs_to_csv, 'write_snapshot', lambda *args: pytest.fail("snapshot rewritten"))
+
+        convert_pdfs_to_csv.convert_all_pdfs_to_single_csv(str(tmp_path / "pdf"), csv_path)
+
+        with open(snapshot.snapshot_path_for(csv_path), 'rb') as snapshot_file:
+            assert snapshot_file.read() == previous_snapshot
@@ -0,0 +1,50 @@
+from stations import StationIndex, normalize_station_name
+
+STATION_NAMES = [
+    "WARSZAWA ZACHODNIA", "WARSZAWA WSCHODNIA", "GRODZISK MAZ.", "ŁOWICZ GŁÓWNY",
+    "WARSZAWA LOTNISKO CHOPINA", "MODLIN LOTNISKO", "OTWOCK", "ŻYRARDÓW",
+]
+
+
+class TestNormalizeStationName:
+
+    # Diacritics, case and punctuation don't matter
+    def test_normalize(self):
+        assert normalize_station_name("Łowicz Główny") == "LOWICZ GLOWNY"
+        assert normalize_station_name("grodzisk maz.") == "GRODZISK MAZ"
+
+
+class TestStationIndex:
+
+    index = StationIndex(STATION_NAMES)
+
+    # Input without diacritics resolves to the canonical name
+    def test_resolve_without_diacritics(self):
+        assert self.index.resolve("zyrardow") == "ŻYRARDÓW"
+
+    # A typo still resolves to the closest station
+    def test_resolve_typo(self):
+        assert self.index.resolve("warszawa zachdnia") == "WARSZAWA ZACHODNIA"
+
+    # Part of a two-line name such as the airport station resolves to the full name
+    def test_resolve_partial_airport_name(self):
+        assert self.index.resolve("lotnisko chopina") == "WARSZAWA LOTNISKO CHOPINA"
+
+    # Every spelling of a station is kept, so rows filed under any of them can be found
+    def test_resolve_all_spellings(self):
+        index = StationIndex(["GRODZISK MAZ.", "OTWOCK", "GRODZISK MAZ", "Grodzisk Maz."])
+
+        assert index.resolve_all("grodzisk maz") == ["GRODZISK MAZ", "GRODZISK MAZ.", "Grodzisk Maz."]
+        assert index.resolve_all("grodzsk") == ["GRODZISK MAZ", "GRODZISK MAZ.", "Grodzisk Maz."]
+        assert index.resolve_all("KRAKÓW") == []
+        assert index.complete("gro") == ["GRODZISK MAZ"]
+
+    # Nothing close enough resolves to None
+    def test_resolve_unknown(self):
+        assert self.index.resolve("KRAKÓW") is None
+
+    # Prefix completion ignores diacritics and returns shorter names first
+    def test_complete_prefix(self):
+        assert self.index.complete("warszawa") == ["WARSZAWA WSCHODNIA", "WARSZAWA ZACHODNIA",
+                                                   "WARSZAWA LOTNISKO CHOPINA"]
+        assert self.index.complete("lo") == ["ŁOWICZ GŁÓWNY"]
@@ -0,0 +1,124 @@
+import os
+from datetime import date
+
+from timetable import Timetable, TimetableStore, expand_train_numbers, parse_time
+
+
+def write_csv(path, lines):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+class TestExpandTrainNumbers:
+
+    # A plain number stays as it is
+    def test_single_number(self):
+        assert expand_train_numbers("19211") == ["19211"]
+
+    # "12345/6" stands for trains 12345 and 12346
+    def test_slash_variant(self):
+        assert expand_train_numbers("19211/3") == ["19211", "19213"]
+
+
+class TestTimetable:
+
+    # Both numbers of a slash row point to the same row, with the number column normalized
+    def test_find_by_number_covers_slash_variants(self):
+        # Arrange
+        timetable = Timetable([
+            ["19211/3", "WARSZAWA", "7:30", "RADOM", "9:00", "EN76", "1", "1 - 5 XII", ""],
+            ["19300", "RADOM", "10:00", "WARSZAWA", "11:30", "ER75", "1", "2 XII", ""],
+        ])
+
+        # Act
+        result = timetable.find_by_number("19213")
+
+        # Assert
+        assert result == [(0, ["19213", "WARSZAWA", "7:30", "RADOM", "9:00", "EN76", "1", "1 - 5 XII", ""])]
+        assert timetable.rows[0][0] == "19211/3"
+
+    # Unknown numbers return no candidates
+    def test_find_by_number_unknown(self):
+        timetable = Timetable([["19300", "RADOM", "10:00", "WARSZAWA", "11:30", "ER75", "1", "2 XII", ""]])
+        assert timetable.find_by_number("99999") == []
+
+    # A header row is skipped, a headerless CSV keeps its first row
+    def test_from_csv_skips_header_only(self, tmp_path):
+        with_header = tmp_path / "with_header.csv"
+        without_header = tmp_path / "without_header.csv"
+        write_csv(with_header, ["nr poc;z;odj.;do;przyj.;typ taboru;ilość;termin", "19300;RADOM;10:00;WARSZAWA;11:30;ER75;1;2 XII"])
+        write_csv(without_header, ["19300;RADOM;10:00;WARSZAWA;11:30;ER75;1;2 XII"])
+
+        assert len(Timetable.from_csv(with_header).rows) == 1
+        assert len(Timetable.from_csv(without_header).rows) == 1
+
+
+class TestTimetableStore:
+
+    # The timetable is reused until the CSV's mtime changes
+    def test_reloads_on_mtime_change(self, tmp_path):
+        # Arrange
+        csv_path = tmp_path / "timetable.csv"
+        write_csv(csv_path, ["19300;RADOM;10:00;WARSZAWA;11:30;ER75;1;2 XII"])
+        store = TimetableStore(str(csv_path))
+        first = store.get()
+
+        # Act
+        same = store.get()
+        write_csv(csv_path, ["19400;RADOM;10:00;WARSZAWA;11:30;ER75;1;2 XII"])
+        os.utime(csv_path, (first.source_mtime + 10, first.source_mtime + 10))
+        reloaded = store.get()
+
+        # Assert
+        assert same is first
+        assert reloaded is not first
+        assert reloaded.find_by_number("19400")
+
+
+class TestFindDepartures:
+
+    timetable = Timetable([
+        ["19201", "GRODZISK MAZ.", "7:25", "WARSZAWA ZACHODNIA", "8:05", "EN76", "1", "", ""],
+        ["19203", "GRODZISK MAZ.", "7:40", "WARSZAWA ZACHODNIA", "8:20", "ER75", "1", "", "(6)"],
+        ["19205", "GRODZISK MAZ.", "7:50", "WARSZAWA ZACHODNIA", "8:30", "ER160", "1", "", ""],
+        ["19207", "GRODZISK MAZ.", "9:30", "WARSZAWA ZACHODNIA", "10:10", "EN76", "1", "", ""],
+    ], reference=date(2025, 1, 10))
+
+    # Departures within the window are returned nearest first, skipping trains not running that day
+    def test_nearest_departures_within_window(self):
+        # Act
+        result = self.timetable.find_departures("grodzisk maz.", "WARSZAWA ZACHODNIA", 7 * 60 + 30,
+                                                date(2025, 1, 10))  # Friday
+
+        # Assert
+        assert [row[0] for _, row in result] == ["19201", "19205"]
+
+    # An unknown station pair finds nothing
+    def test_unknown_pair(self):
+        assert self.timetable.find_departures("RADOM", "WARSZAWA ZACHODNIA", 450, date(2025, 1, 10)) == []
+
+
+class TestParseTime:
+
+    def test_parse_time(self):
+        assert parse_time("7:30") == 450
+        assert parse_time("07.05") == 425
+        assert parse_time("WARSZAWA") is None
+
+
+class TestCompleteTrainNumbers:
+
+    # Numbers sharing the prefix are suggested, trains running that day first
+    def test_running_trains_first(self):
+        # Arrange
+        timetable = Timetable([
+            ["19201", "A", "7:25", "B", "8:05", "EN76", "1", "", "(6)"],
+            ["19203", "A", "7:40", "B", "8:20", "ER75", "1", "", ""],
+            ["19311", "A", "7:50", "B", "8:30", "ER160", "1", "", ""],
+        ], reference=date(2025, 1, 10))
+
+        # Act
+        result = timetable.complete_train_numbers("192", date(2025, 1, 10))  # Friday
+
+        # Assert
+        assert result == ["19203", "19201"]
@@ -0,0 +1,68 @@
+import json
+
+from tracing import Histogram, LatencyTracer, stage, traced
+
+
+class TestHistogram:
+
+    # Percentiles land in the bucket of the recorded latency (buckets are 20% wide)
+    def test_percentiles(self):
+        # Arrange
+        histogram = Histogram()
+
+        # Act
+        for _ in range(90):
+            histogram.record(0.002)
+        for _ in range(10):
+            histogram.record(0.2)
+
+        # Assert
+        assert 0.002 <= histogram.percentile(50) < 0.0025
+        assert 0.2 <= histogram.percentile(99) < 0.25
+
+
+class TestLatencyTracer:
+
+    # Stages inside a sampled trace are aggregated and written as a JSON line
+    def test_sampled_trace_is_recorded(self, tmp_path):
+        # Arrange
+        log_path = tmp_path / "traces.jsonl"
+        tracer = LatencyTracer(sample_rate=1.0, log_path=str(log_path))
+
+        @traced('lookup')
+        def lookup():
+            return 'EN76'
+
+        # Act
+        with tracer.trace(chat_type='private'):
+            with stage('parse'):
+                pass
+            lookup()
+        tracer.flush()
+
+        # Assert
+        record = json.loads(log_path.read_text(encoding='utf-8'))
+        assert set(record["stages_ms"]) == {"parse", "lookup"}
+        assert record["chat_type"] == 'private'
+        assert tracer.summary()["total"]["count"] == 1
+
+    # Lines are written by the background thread, every one of them and whole
+    def test_log_lines_are_written_in_background(self, tmp_path):
+        log_path = tmp_path / "logs" / "traces.jsonl"
+        tracer = LatencyTracer(sample_rate=1.0, log_path=str(log_path))
+
+        for number in range(200):
+            with tracer.trace(number=number):
+                pass
+        tracer.flush()
+
+        records = [json.loads(line) for line in log_path.read_text(encoding='utf-8').splitlines()]
+        assert [record["number"] for record in records] == list(range(200))
+
+    # Nothing is recorded for messages that aren't sampled
+    def test_unsampled_trace(self):
+        tracer = LatencyTracer(sample_rate=0.0)
+        with tracer.trace():
+            with stage('parse'):
+                pass
+        assert tracer.summary() == {}
@@ -0,0 +1,37 @@
+from convert_pdfs_to_csv import write_rows_to_csv
+
+
+class TestWriteRowsToCsv:
+
+    # Rows can come from a generator and no temp file is left behind
+    def test_writes_generator_rows(self, tmp_path):
+        # Arrange
+        output_csv = tmp_path / "csv" / "KM_table_current.csv"
+        rows = (["1920" + str(i), "WARSZAWA", "7:30"] for i in range(3))
+
+        # Act
+        written = write_rows_to_csv(rows, str(output_csv))
+
+        # Assert
+        assert written
+        assert output_csv.read_text(encoding='utf-8').splitlines() == [
+            "19200;WARSZAWA;7:30", "19201;WARSZAWA;7:30", "19202;WARSZAWA;7:30"]
+        assert [path.name for path in output_csv.parent.iterdir()] == ["KM_table_current.csv"]
+
+    # A failing pipeline leaves the previous CSV untouched
+    def test_previous_csv_survives_failure(self, tmp_path):
+        # Arrange
+        output_csv = tmp_path / "KM_table_current.csv"
+        output_csv.write_text("19200;WARSZAWA;7:30\n", encoding='utf-8')
+
+        def failing_rows():
+            yield ["19300", "RADOM", "8:00"]
+            raise ValueError("broken page")
+
+        # Act
+        written = write_rows_to_csv(failing_rows(), str(output_csv))
+
+        # Assert
+        assert not written
+        assert output_csv.read_text(encoding='utf-8') == "19200;WARSZAWA;7:30\n"
+        assert [path.name for path in tmp_path.iterdir()] == ["KM_table_current.csv"]
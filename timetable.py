@@ -0,0 +1,228 @@
+import csv
+import os
+from bisect import bisect_left, bisect_right
+import re
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from service_days import ServiceCalendar
+from stations import StationIndex
+
+TRAIN_NUMBER_PATTERN = re.compile(r'^\d{5}(/\d+)?$')  # (e.g. 12345 or 12345/6)
+TIME_PATTERN = re.compile(r'^(\d{1,2})[:.](\d{2})$')  # (e.g. 7:30, 07:30 or 7.30)
+
+
+def expand_train_numbers(train_nr_raw: str) -> List[str]:
+    """
+    Expands a raw train number from the timetable into the 5-digit numbers it stands for.
+
+    KM writes two trains sharing a row as "12345/6", which means trains 12345 and 12346
+    (the digits after the slash replace the end of the first number).
+
+    Parameters:
+        train_nr_raw (str): The train number as written in the first CSV column.
+
+    Returns:
+        list: The normalized 5-digit train numbers, first number first.
+    """
+    train_nr_raw = train_nr_raw.strip()
+    if '/' not in train_nr_raw:
+        return [train_nr_raw]
+
+    base, suffix = train_nr_raw.split('/', 1)
+    base = base[:5]
+    suffix = suffix.strip()
+    if not suffix or len(suffix) >= len(base):
+        return [base]
+
+    return [base, base[:len(base) - len(suffix)] + suffix]
+
+
+def parse_time(time_str: str) -> Optional[int]:
+    """Convert a departure time like "7:30" to minutes after midnight, or None if it isn't a time."""
+    match = TIME_PATTERN.match(time_str.strip())
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 24 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def read_timetable_rows(csv_path: str) -> List[List[str]]:
+    """
+    Reads all timetable rows from the CSV file, skipping the header row if there is one.
+
+    Parameters:
+        csv_path (str): The path to the timetable CSV file.
+
+    Returns:
+        list: A list of rows, where each row is a list of strings.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile, delimiter=';')
+        rows = [row for row in reader if row]
+
+    # The converter writes no header, but older CSVs start with one
+    if rows and not TRAIN_NUMBER_PATTERN.match(rows[0][0].strip()):
+        rows = rows[1:]
+
+    return rows
+
+
+class Timetable:
+    """An immutable in-memory view of the timetable CSV with lookup indexes built once at load time."""
+
+    def __init__(self, rows: List[List[str]], source_mtime: Optional[float] = None,
+                 reference: Optional[date] = None):
+        self.rows = rows
+        self.source_mtime = source_mtime
+        self.calendar = ServiceCalendar(reference)
+        self.service_days: List[int] = []
+        self.by_number: Dict[str, List[int]] = {}
+        # (departure station, arrival station) -> (sorted departure minutes, row ids in the same order)
+        self.by_station_pair: Dict[Tuple[str, str], Tuple[List[int], List[int]]] = {}
+
+        self._compile_service_days()
+        self._build_number_index()
+        self.train_numbers = sorted(self.by_number)
+        self._build_station_pair_index()
+        self.stations = StationIndex(name for departure, arrival in self.by_station_pair for name in (departure, arrival))
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> 'Timetable':
+        """Load the timetable from a CSV file and build its indexes."""
+        source_mtime = os.stat(csv_path).st_mtime
+        return cls(read_timetable_rows(csv_path), source_mtime)
+
+    def _compile_service_days(self):
+        """Compile every row's date and annotation columns into a day bitmask."""
+        compile_dates = self.calendar.compile
+        for row in self.rows:
+            dates = row[7] if len(row) > 7 else ''
+            annotation = row[8] if len(row) > 8 else None
+            self.service_days.append(compile_dates(dates, annotation))
+
+    def runs_on(self, row_id: int, day: date) -> bool:
+        """Check whether the row's train runs on the given day."""
+        return self.calendar.runs_on(self.service_days[row_id], day)
+
+    def _build_number_index(self):
+        """Map every normalized 5-digit train number to the ids of its rows, in file order."""
+        for row_id, row in enumerate(self.rows):
+            for train_nr in expand_train_numbers(row[0]):
+                self.by_number.setdefault(train_nr, []).append(row_id)
+
+    def find_by_number(self, train_nr: str) -> List[Tuple[int, List[str]]]:
+        """
+        Returns candidate rows for a train number.
+
+        Parameters:
+            train_nr (str): A 5-digit train number.
+
+        Returns:
+            list: (row_id, row) pairs in file order; the row's number column is replaced with train_nr.
+        """
+        return [(row_id, [train_nr] + self.rows[row_id][1:]) for row_id in self.by_number.get(train_nr, ())]
+
+    def complete_train_numbers(self, prefix: str, day: date, limit: int = 10, max_scanned: int = 500) -> List[str]:
+        """
+        Returns train numbers starting with the prefix, trains running on the given day first.
+
+        Parameters:
+            prefix (str): The digits typed so far.
+            day (date): The day used for ranking.
+            limit (int): The maximum number of train numbers to return.
+            max_scanned (int): How many matching numbers to check at most, to keep short prefixes fast.
+
+        Returns:
+            list: Matching 5-digit train numbers.
+        """
+        lo = bisect_left(self.train_numbers, prefix)
+        hi = min(bisect_right(self.train_numbers, prefix + '\uffff', lo), lo + max_scanned)
+
+        running, not_running = [], []
+        for train_nr in self.train_numbers[lo:hi]:
+            if any(self.runs_on(row_id, day) for row_id in self.by_number[train_nr]):
+                running.append(train_nr)
+                if len(running) == limit:
+                    break
+            elif len(not_running) < limit:
+                not_running.append(train_nr)
+
+        return (running + not_running)[:limit]
+
+    def _build_station_pair_index(self):
+        """Map every (departure, arrival) station pair to its departures sorted by time."""
+        departures: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        for row_id, row in enumerate(self.rows):
+            if len(row) < 4:
+                continue
+            minutes = parse_time(row[2])
+            if minutes is None:
+                continue
+            key = (row[1].strip().upper(), row[3].strip().upper())
+            departures.setdefault(key, []).append((minutes, row_id))
+
+        for key, pairs in departures.items():
+            pairs.sort()
+            self.by_station_pair[key] = ([minutes for minutes, _ in pairs], [row_id for _, row_id in pairs])
+
+    def find_departures(self, departure_station: str, arrival_station: str, minutes: int, day: date,
+                        window: int = 30) -> List[Tuple[int, List[str]]]:
+        """
+        Returns departures between two stations close to the given time that run on the given day.
+
+        Parameters:
+            departure_station (str): The departure station name as written in the timetable.
+            arrival_station (str): The arrival station name as written in the timetable.
+            minutes (int): The requested departure time in minutes after midnight.
+            day (date): The day the departures have to run on.
+            window (int): How many minutes before and after the requested time to search.
+
+        Returns:
+            list: (row_id, row) pairs, nearest departure first.
+        """
+        entry = self.by_station_pair.get((departure_station.upper(), arrival_station.upper()))
+        if entry is None:
+            return []
+
+        times, row_ids = entry
+        lo = bisect_left(times, minutes - window)
+        hi = bisect_right(times, minutes + window)
+
+        found = [(abs(times[i] - minutes), times[i], row_ids[i]) for i in range(lo, hi)
+                 if self.runs_on(row_ids[i], day)]
+        found.sort()
+        return [(row_id, self.rows[row_id]) for _, _, row_id in found]
+
+
+class TimetableStore:
+    """
+    Holds the current Timetable for a CSV path and reloads it when the file's mtime changes.
+
+    Lookups only pay for an os.stat() call; the CSV is parsed again only after it was replaced.
+    """
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self._timetable: Optional[Timetable] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Timetable:
+        """Return the current timetable, reloading it first if the CSV changed on disk."""
+        mtime = os.stat(self.csv_path).st_mtime
+        timetable = self._timetable
+        if timetable is not None and timetable.source_mtime == mtime:
+            return timetable
+
+        with self._lock:
+            # Another thread may have reloaded it while we were waiting for the lock
+            if self._timetable is None or self._timetable.source_mtime != mtime:
+                self._timetable = self.load()
+            return self._timetable
+
+    def load(self) -> Timetable:
+        """Load the timetable from the CSV."""
+        return Timetable.from_csv(self.csv_path)